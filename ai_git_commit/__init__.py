@@ -1,27 +1,81 @@
+from typing import Optional, Tuple
+
 import click
 
 from ai_git_commit.config import KnownError, config_parsers, get_config, set_configs
-from ai_git_commit.git import run_command_git_commit
 
 
 @click.group(invoke_without_command=True)
-@click.option("--debug/--no-debug")
+@click.option(
+    "--debug/--no-debug", help="Print the time spent in each step, as --profile."
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Do not reuse nor store generated commit messages in the cache.",
+)
+@click.option(
+    "--manual",
+    is_flag=True,
+    help="Write the commit message yourself, with the AI suggestions offered as completions of the subject. Without a valid config, e.g. without an API key, the message is always written this way, with no suggestions.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Print where the time went (git, config, prompt, model, UI) when the command exits.",
+)
+@click.option(
+    "--trace",
+    "trace_path",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write the spans of the run as Chrome trace JSON (chrome://tracing, Perfetto) to this file.",
+)
 @click.pass_context
-def main(ctx: click.Context, debug: bool) -> None:
+def main(
+    ctx: click.Context,
+    debug: bool,
+    no_cache: bool,
+    manual: bool,
+    profile: bool,
+    trace_path: Optional[str],
+) -> None:
     """
     Main command.
     """
-    ctx.obj = {"debug": debug}
+    ctx.obj = {"debug": debug, "cache": not no_cache}
+    if debug or profile or trace_path:
+        start_tracing(ctx, profile or debug, trace_path)
 
     if ctx.invoked_subcommand is None:
+        # The commit flow needs prompt_toolkit and the providers, which take most of the
+        # startup time, so they are only imported when no subcommand is given.
+        from ai_git_commit.git import run_command_ai_git_commit, run_command_git_commit
+
         try:
-            openai_key = get_config().get("OPENAI_KEY")
-            if openai_key is not None:
-                click.echo("UNDER DEVELOPMENT")
-            else:
-                run_command_git_commit()
+            config = get_config()
         except KnownError:
             run_command_git_commit()
+            return
+        if manual:
+            run_command_git_commit(config=config, cache=ctx.obj["cache"])
+        else:
+            run_command_ai_git_commit(cache=ctx.obj["cache"])
+
+
+def start_tracing(ctx: click.Context, summary: bool, trace_path: Optional[str]) -> None:
+    # The report is written when the context closes, so after the subcommands and on sys.exit too.
+    from ai_git_commit.trace import tracer
+
+    tracer.enable()
+
+    def report() -> None:
+        if summary:
+            click.echo(tracer.summary(), err=True, nl=False)
+        if trace_path:
+            with open(trace_path, "w") as output:
+                tracer.write_chrome_trace(output)
+
+    ctx.call_on_close(report)
 
 
 @main.command()
@@ -33,6 +87,204 @@ def example(ctx: dict) -> None:
     click.echo("Example subcommand")
 
 
+@main.command()
+@click.argument("rev_range")
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Number of commits to generate messages for at once.",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="Write the JSON lines to this file instead of the standard output.",
+)
+@click.pass_obj
+def batch(ctx: dict, rev_range: str, jobs: int, output) -> None:
+    """
+    Generate commit messages for the commits of REV_RANGE, as JSON lines
+    """
+    import subprocess
+
+    from ai_git_commit.daemon import DaemonError, DaemonUnavailable, request_daemon
+
+    try:
+        # A running daemon does the work, otherwise the providers are imported to run in-process.
+        for event in request_daemon(
+            "batch", rev_range=rev_range, jobs=jobs, cache=ctx["cache"]
+        ):
+            if event["event"] == "result":
+                output.write(event["line"])
+                output.flush()
+            elif event["event"] == "done":
+                click.echo(event["report"], err=True)
+        return
+    except DaemonUnavailable:
+        pass
+    except (DaemonError, ValueError) as error:
+        raise click.ClickException(str(error))
+
+    from ai_git_commit.batch import run_batch
+
+    try:
+        stats = run_batch(rev_range, output=output, jobs=jobs, cache=ctx["cache"])
+    except (KnownError, ValueError) as error:
+        raise click.ClickException(str(error))
+    except subprocess.CalledProcessError as error:
+        raise click.ClickException(error.stderr.decode(errors="replace").strip())
+    click.echo(stats.report(), err=True)
+
+
+@main.command()
+@click.argument("rev_range")
+@click.option(
+    "-p",
+    "--prompt",
+    "prompt_ids",
+    type=click.IntRange(1, 5),
+    multiple=True,
+    help="Prompt to evaluate, repeat the option to compare several (default: 4 and 5).",
+)
+@click.option(
+    "--provider",
+    type=click.Choice(["openai", "local"]),
+    help="Model backend to evaluate the prompts with, instead of the configured one.",
+)
+@click.option("--model", help="Model to evaluate the prompts with.")
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Number of requests to send at once.",
+)
+@click.option(
+    "--format",
+    "report_format",
+    type=click.Choice(["table", "json"]),
+    default="table",
+    show_default=True,
+    help="Format of the comparison report.",
+)
+@click.option(
+    "--results",
+    type=click.File("w"),
+    help="Write every generated message, with its latency and tokens, as JSON lines to this file.",
+)
+def evaluate(
+    rev_range: str,
+    prompt_ids: Tuple[int, ...],
+    provider: Optional[str],
+    model: Optional[str],
+    jobs: int,
+    report_format: str,
+    results,
+) -> None:
+    """
+    Compare prompts on the diffs of the commits of REV_RANGE
+    """
+    import subprocess
+    import sys
+
+    from ai_git_commit.evaluate import DEFAULT_PROMPT_IDS, run_evaluation, write_report
+
+    overrides = {
+        key: value
+        for key, value in (("provider", provider), ("model", model))
+        if value is not None
+    }
+    try:
+        scores = run_evaluation(
+            rev_range,
+            prompt_ids=prompt_ids or DEFAULT_PROMPT_IDS,
+            jobs=jobs,
+            overrides=overrides,
+            results=results,
+        )
+    except (KnownError, ValueError) as error:
+        raise click.ClickException(str(error))
+    except subprocess.CalledProcessError as error:
+        raise click.ClickException(error.stderr.decode(errors="replace").strip())
+    write_report(scores, sys.stdout, report_format)
+
+
+@main.group()
+def daemon():
+    """
+    Manage the daemon keeping the config, caches and connections warm
+    """
+
+
+@daemon.command("start")
+def daemon_start() -> None:
+    """
+    Start the daemon in the background
+    """
+    from ai_git_commit.daemon import DaemonUnavailable, start_daemon
+
+    try:
+        pid = start_daemon()
+    except DaemonUnavailable as error:
+        raise click.ClickException(f"The daemon did not start: {error}")
+    click.echo(f"Daemon running with pid {pid}")
+
+
+@daemon.command("run")
+@click.option(
+    "--idle-timeout",
+    type=click.FloatRange(min=0),
+    default=30 * 60,
+    show_default=True,
+    help="Exit after this many seconds without requests.",
+)
+def daemon_run(idle_timeout: float) -> None:
+    """
+    Run the daemon in the foreground
+    """
+    from ai_git_commit.daemon import run_daemon
+
+    try:
+        run_daemon(idle_timeout=idle_timeout)
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
+
+
+@daemon.command("stop")
+def daemon_stop() -> None:
+    """
+    Stop the daemon
+    """
+    from ai_git_commit.daemon import DaemonUnavailable, request_daemon
+
+    try:
+        list(request_daemon("stop"))
+    except DaemonUnavailable:
+        click.echo("Daemon not running")
+        return
+    click.echo("Daemon stopped")
+
+
+@daemon.command("status")
+def daemon_status() -> None:
+    """
+    Show if the daemon is running
+    """
+    from ai_git_commit.daemon import DaemonUnavailable, request_daemon
+
+    try:
+        pid = list(request_daemon("ping"))[-1]["pid"]
+    except DaemonUnavailable:
+        click.echo("Daemon not running")
+        return
+    click.echo(f"Daemon running with pid {pid}")
+
+
 @main.group()
 def config():
     """
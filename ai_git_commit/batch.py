@@ -0,0 +1,221 @@
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Iterator,
+    Mapping,
+    NamedTuple,
+    Optional,
+)
+
+from ai_git_commit.cache import DiskCache
+from ai_git_commit.compact import compact_diff
+from ai_git_commit.config import ICommitMessage, get_config
+from ai_git_commit.diff import parse_diff
+from ai_git_commit.openai import agenerate_commit_messages
+from ai_git_commit.providers import Provider, get_provider
+from ai_git_commit.repository import CommitDiff, GitRepository
+from ai_git_commit.retry import Retrier, get_retrier
+
+DEFAULT_JOBS = 4
+
+
+class BatchResult(NamedTuple):
+    """The commit message generated for a commit of a batch, or the error it failed with."""
+
+    commit: str
+    original_subject: str
+    message: Optional[ICommitMessage]
+    error: Optional[str]
+    seconds: float
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "commit": self.commit,
+                "original_subject": self.original_subject,
+                "subject": self.message["subject"] if self.message else None,
+                "body": self.message["body"] if self.message else None,
+                "error": self.error,
+                "seconds": round(self.seconds, 3),
+            },
+            ensure_ascii=False,
+        )
+
+
+class BatchStats(NamedTuple):
+    commits: int
+    failed: int
+    seconds: float
+
+    @property
+    def commits_per_second(self) -> float:
+        return self.commits / self.seconds if self.seconds > 0 else 0.0
+
+    def report(self) -> str:
+        return (
+            f"Generated {self.commits - self.failed} commit messages for {self.commits} commits "
+            f"({self.failed} failed) in {self.seconds:.1f}s: {self.commits_per_second:.2f} commits/s"
+        )
+
+
+async def agenerate_batch(
+    commits: Iterator[CommitDiff],
+    model: str = "text-davinci-002",
+    max_diff_tokens: int = 2000,
+    locale: str = "en",
+    jobs: int = DEFAULT_JOBS,
+    cache: Optional[DiskCache] = None,
+    provider: Optional[Provider] = None,
+    retrier: Optional[Retrier] = None,
+) -> AsyncIterator[BatchResult]:
+    """
+    The agenerate_batch function generates a commit message for every commit, with up to jobs of them at once.
+
+    The commits are read from their (blocking) iterator in a worker thread while the messages of the
+    previous ones are generated, and the results are yielded in the order of the commits. At most jobs
+    commits are in flight, so a range of any length is processed with a bounded memory, and a failed
+    commit is reported in its BatchResult instead of stopping the batch.
+
+    :param commits:Iterator[CommitDiff]: Used to Pass the commits, usually from GitRepository.iter_commit_diffs.
+    :param model:str: Used to Select the model.
+    :param max_diff_tokens:int: Used to Compact every diff to this token budget.
+    :param locale:str: Used to Select the language of the messages.
+    :param jobs:int: Used to Bound the number of commits generated concurrently.
+    :param cache:Optional[DiskCache]: Used to Reuse the messages generated for the same diffs.
+    :param provider:Optional[Provider]: Used to Select the backend completing the prompts.
+    :param retrier:Optional[Retrier]: Used to Share the retries and rate limit of all the commits.
+    :return: An async generator of BatchResult, in the order of the commits.
+
+    :doc-author: coderj001
+    """
+    # One Retrier for all the commits, so a 429 on one of them holds back the others too.
+    retrier = retrier or Retrier()
+
+    async def generate(commit: CommitDiff) -> BatchResult:
+        started = time.perf_counter()
+        message = error = None
+        try:
+            diff = compact_diff(
+                parse_diff(commit.diff.splitlines(keepends=True)), max_diff_tokens
+            )
+            candidates = agenerate_commit_messages(
+                diff,
+                variants=((5, model),),
+                locale=locale,
+                cache=cache,
+                provider=provider,
+                retrier=retrier,
+            )
+            try:
+                message = await candidates.__anext__()
+            except StopAsyncIteration:
+                error = "No commit message generated"
+            finally:
+                await candidates.aclose()
+        except Exception as exception:
+            error = str(exception) or type(exception).__name__
+        return BatchResult(
+            commit.commit,
+            commit.subject,
+            message,
+            error,
+            time.perf_counter() - started,
+        )
+
+    pending: Deque["asyncio.Future[BatchResult]"] = deque()
+    try:
+        while True:
+            commit = await asyncio.to_thread(next, commits, None)
+            if commit is None:
+                break
+            pending.append(asyncio.ensure_future(generate(commit)))
+            if len(pending) >= jobs:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+        close = getattr(commits, "close", None)
+        if close is not None:
+            close()
+
+
+async def awrite_batch(
+    repository: GitRepository,
+    rev_range: str,
+    config: Mapping[str, Any],
+    write: Callable[[str], None],
+    jobs: int = DEFAULT_JOBS,
+    cache: Optional[DiskCache] = None,
+    provider: Optional[Provider] = None,
+    retrier: Optional[Retrier] = None,
+) -> BatchStats:
+    # Shared by run_batch and the daemon, which passes its warm provider, retrier and cache.
+    started = time.perf_counter()
+    commits = failed = 0
+    async for result in agenerate_batch(
+        repository.iter_commit_diffs(rev_range),
+        model=config["model"],
+        max_diff_tokens=config["max_diff_tokens"],
+        locale=config["locale"],
+        jobs=jobs,
+        cache=cache,
+        provider=provider or get_provider(config),
+        retrier=retrier or get_retrier(config),
+    ):
+        commits += 1
+        failed += result.error is not None
+        write(result.to_json() + "\n")
+    return BatchStats(commits, failed, time.perf_counter() - started)
+
+
+def run_batch(
+    rev_range: str,
+    output: IO[str] = sys.stdout,
+    jobs: int = DEFAULT_JOBS,
+    cache: bool = True,
+    repository: Optional[GitRepository] = None,
+) -> BatchStats:
+    """
+    The run_batch function generates the commit messages of a revision range and writes them as JSON lines.
+
+    Every line is written, and flushed, as soon as the message of its commit is generated, so the output
+    can be consumed while the batch runs, e.g. by a `git rebase -x` script. The throughput is returned.
+
+    :param rev_range:str: Used to Select the commits, e.g. `main..feature`.
+    :param output:IO[str]: Used to Write the JSON lines.
+    :param jobs:int: Used to Bound the number of commits generated concurrently.
+    :param cache:bool: Used to Reuse the messages already generated for the same diffs.
+    :param repository:Optional[GitRepository]: Used to Read the commits of an existing session.
+    :return: A BatchStats with the number of commits, of failures, and the elapsed time.
+
+    :doc-author: coderj001
+    """
+    config = get_config()
+    repository = repository or GitRepository.discover()
+    if repository is None:
+        raise ValueError("Current directory is not a git repository")
+
+    def write(line: str) -> None:
+        output.write(line)
+        output.flush()
+
+    return asyncio.run(
+        awrite_batch(
+            repository,
+            rev_range,
+            config,
+            write,
+            jobs=jobs,
+            cache=DiskCache() if cache else None,
+        )
+    )
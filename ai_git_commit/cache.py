@@ -0,0 +1,158 @@
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+def get_cache_dir() -> Path:
+    """
+    The get_cache_dir function returns the directory where ai-git-commit keeps its cache.
+
+    It follows the XDG base directory specification, so `$XDG_CACHE_HOME/ai-git-commit` is used when the
+    variable is set, and `~/.cache/ai-git-commit` otherwise.
+
+    :return: The path of the cache directory.
+
+    :doc-author: coderj001
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return Path(base) / "ai-git-commit"
+
+
+def normalize_diff(diff: str) -> str:
+    """
+    The normalize_diff function removes the differences of a diff that do not change its meaning.
+
+    Line endings are unified and trailing whitespace is stripped, so the same staged changes always
+    hash to the same cache key.
+
+    :param diff:str: Used to Pass the diff to normalize.
+    :return: The normalized diff.
+
+    :doc-author: coderj001
+    """
+    return "\n".join(line.rstrip() for line in diff.splitlines()).strip("\n")
+
+
+def cache_key(*parts: object) -> str:
+    """
+    The cache_key function hashes its arguments into a content addressed cache key.
+
+    :param *parts:object: Used to Pass every value the cached entry depends on.
+    :return: The hex sha256 digest of the parts.
+
+    :doc-author: coderj001
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8", errors="replace"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    A content addressed cache of text entries stored as one file per key.
+
+    Reading an entry refreshes its modification time, which makes it the most recently used one. Entries
+    older than `max_age` seconds are dropped, and the least recently used ones are evicted whenever the
+    cache grows over `max_size` bytes. The size is scanned on the first write, then kept as a running
+    estimate, rescanned every `scan_every` writes to account for the other processes using the cache.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_size: int = 50 * 1024 * 1024,
+        max_age: float = 30 * 24 * 60 * 60,
+        scan_every: int = 256,
+    ) -> None:
+        self.path = Path(path) if path is not None else get_cache_dir()
+        self.max_size = max_size
+        self.max_age = max_age
+        self.scan_every = scan_every
+        self.size: Optional[int] = None
+        self.writes = 0
+
+    def entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / key
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.entry_path(key)
+        try:
+            stat = path.stat()
+            if time.time() - stat.st_mtime > self.max_age:
+                path.unlink()
+                return None
+            value = path.read_text(encoding="utf-8")
+            os.utime(path)
+        except OSError:
+            return None
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        path = self.entry_path(key)
+        try:
+            replaced = path.stat().st_size
+        except OSError:
+            replaced = 0
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(temp_path, path)
+        except OSError:
+            return
+        self.writes += 1
+        # Scanning the entries costs a stat per entry, so it is only done when the running size estimate
+        # goes over max_size, or every scan_every writes.
+        if self.size is None or self.writes % self.scan_every == 0:
+            self.evict()
+            return
+        self.size += len(value.encode("utf-8")) - replaced
+        if self.size > self.max_size:
+            self.evict()
+
+    def entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        if not self.path.is_dir():
+            return entries
+        for directory in self.path.iterdir():
+            if not directory.is_dir():
+                continue
+            for path in directory.iterdir():
+                if path.name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self) -> None:
+        entries = sorted(self.entries())
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if total <= self.max_size and now - mtime <= self.max_age:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+        self.size = total
+
+    def clear(self) -> None:
+        for _, _, path in self.entries():
+            try:
+                path.unlink()
+            except OSError:
+                continue
+        self.size = None
@@ -0,0 +1,367 @@
+import asyncio
+import contextlib
+import http.client
+import json
+import queue
+import socket
+import threading
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+from urllib.parse import urlsplit
+
+DEFAULT_MAX_CONNECTIONS = 10
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+# Errors meaning a kept-alive connection was closed by the server while it was idle in the pool.
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+Origin = Tuple[str, str, int]
+T = TypeVar("T")
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection of the pool becomes available in time."""
+
+
+class HTTPResponse(NamedTuple):
+    status: int
+    reason: str
+    headers: Dict[str, str]
+    data: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.data)
+
+
+class HTTPStream(NamedTuple):
+    """A response whose body is read while it arrives, e.g. server-sent events."""
+
+    status: int
+    reason: str
+    headers: Dict[str, str]
+    body: http.client.HTTPResponse
+    # The socket of the response: http.client drops it from the connection of a response that will close.
+    sock: Optional[socket.socket] = None
+
+    def lines(self) -> Iterator[bytes]:
+        yield from iter(self.body.readline, b"")
+        # readline stops at the end of a body with a Content-Length without marking it as read.
+        self.body.read()
+
+    def abort(self) -> None:
+        """Shut the connection down from another thread, which ends a read blocked on a stalled stream."""
+        if self.sock is not None:
+            with contextlib.suppress(OSError):
+                self.sock.shutdown(socket.SHUT_RDWR)
+
+
+class ConnectionPool:
+    """
+    Keep-alive connections to a single origin, shared by every thread of the process.
+
+    At most `maxsize` connections are open at once. The idle ones are reused last in, first out, so the
+    warmest connection serves the next request and the others can time out on the server side.
+    """
+
+    def __init__(
+        self,
+        origin: Origin,
+        maxsize: int = DEFAULT_MAX_CONNECTIONS,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        pool_timeout: Optional[float] = None,
+    ) -> None:
+        self.origin = origin
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_timeout = pool_timeout
+        self.idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(maxsize)
+        self.created = 0
+
+    def connect(self) -> http.client.HTTPConnection:
+        scheme, host, port = self.origin
+        factory = (
+            http.client.HTTPSConnection
+            if scheme == "https"
+            else http.client.HTTPConnection
+        )
+        connection = factory(host, port, timeout=self.connect_timeout)
+        connection.connect()
+        # The connect timeout only applies to the handshake, reads wait up to the request timeout.
+        if connection.sock is not None:
+            connection.sock.settimeout(self.timeout)
+        self.created += 1
+        return connection
+
+    def acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        if not self.slots.acquire(timeout=self.pool_timeout):
+            raise PoolTimeout(f"No connection to {self.origin[1]} available")
+        try:
+            return self.idle.get_nowait(), True
+        except queue.Empty:
+            pass
+        try:
+            return self.connect(), False
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, connection: http.client.HTTPConnection, reusable: bool) -> None:
+        if reusable:
+            self.idle.put(connection)
+        else:
+            connection.close()
+        self.slots.release()
+
+    def send(
+        self, method: str, path: str, body: Optional[bytes], headers: Mapping[str, str]
+    ) -> Tuple[
+        http.client.HTTPConnection, http.client.HTTPResponse, Optional[socket.socket]
+    ]:
+        while True:
+            connection, reused = self.acquire()
+            try:
+                connection.request(method, path, body=body, headers=dict(headers))
+                sock = connection.sock
+                return connection, connection.getresponse(), sock
+            except STALE_CONNECTION_ERRORS:
+                self.release(connection, False)
+                # The server dropped an idle connection before reading the request, so it is safe to
+                # send it again on another connection. A fresh connection failing the same way is an error.
+                if not reused:
+                    raise
+            except BaseException:
+                self.release(connection, False)
+                raise
+
+    def request(
+        self, method: str, path: str, body: Optional[bytes], headers: Mapping[str, str]
+    ) -> HTTPResponse:
+        connection, response, _ = self.send(method, path, body, headers)
+        reusable = False
+        try:
+            data = response.read()
+            reusable = not response.will_close
+            return HTTPResponse(
+                response.status, response.reason, response_headers(response), data
+            )
+        finally:
+            self.release(connection, reusable)
+
+    @contextlib.contextmanager
+    def stream(
+        self, method: str, path: str, body: Optional[bytes], headers: Mapping[str, str]
+    ) -> Iterator[HTTPStream]:
+        connection, response, sock = self.send(method, path, body, headers)
+        reusable = False
+        try:
+            yield HTTPStream(
+                response.status,
+                response.reason,
+                response_headers(response),
+                response,
+                sock,
+            )
+            # The connection goes back to the pool only if the body was read to its end, otherwise the
+            # rest of it would be read as the response of the next request.
+            reusable = response.isclosed() and not response.will_close
+        finally:
+            self.release(connection, reusable)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def response_headers(response: http.client.HTTPResponse) -> Dict[str, str]:
+    return {key.lower(): value for key, value in response.getheaders()}
+
+
+class HTTPClient:
+    """
+    A session of pooled keep-alive HTTP connections, with one ConnectionPool per origin.
+
+    The client is thread-safe, and coroutines use it through `arequest`, which runs the request in a worker
+    thread, so a single client can serve all the in-flight requests of a run.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        pool_timeout: Optional[float] = None,
+    ) -> None:
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_timeout = pool_timeout
+        self.pools: Dict[Origin, ConnectionPool] = {}
+        self.lock = threading.Lock()
+
+    def pool(self, origin: Origin) -> ConnectionPool:
+        with self.lock:
+            if origin not in self.pools:
+                self.pools[origin] = ConnectionPool(
+                    origin,
+                    maxsize=self.max_connections,
+                    timeout=self.timeout,
+                    connect_timeout=self.connect_timeout,
+                    pool_timeout=self.pool_timeout,
+                )
+            return self.pools[origin]
+
+    def resolve(self, url: str) -> Tuple[ConnectionPool, str]:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported URL: {url}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+        return self.pool((parts.scheme, parts.hostname, port)), path
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> HTTPResponse:
+        pool, path = self.resolve(url)
+        return pool.request(method, path, body, headers or {})
+
+    def stream(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> "contextlib.AbstractContextManager[HTTPStream]":
+        pool, path = self.resolve(url)
+        return pool.stream(method, path, body, headers or {})
+
+    async def arequest(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> HTTPResponse:
+        return await asyncio.to_thread(self.request, method, url, body, headers)
+
+    def close(self) -> None:
+        with self.lock:
+            for pool in self.pools.values():
+                pool.close()
+
+    def __enter__(self) -> "HTTPClient":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+_shared_clients: Dict[Tuple[int, float], HTTPClient] = {}
+_shared_client_lock = threading.Lock()
+
+
+def shared_client(
+    max_connections: int = DEFAULT_MAX_CONNECTIONS, timeout: float = DEFAULT_TIMEOUT
+) -> HTTPClient:
+    """
+    The shared_client function returns the HTTPClient of the process for these settings, creating it on first use.
+
+    Providers built without a client, and the ones built by get_provider, use it, so the calls of a batch
+    job, an evaluation or a prefetch share one pool of connections even when every call builds its own provider.
+
+    :param max_connections:int: Used to Bound the connections of the pool.
+    :param timeout:float: Used to Set the read timeout of the requests.
+    :return: The shared HTTPClient.
+
+    :doc-author: coderj001
+    """
+    key = (max_connections, timeout)
+    with _shared_client_lock:
+        if key not in _shared_clients:
+            _shared_clients[key] = HTTPClient(max_connections, timeout)
+        return _shared_clients[key]
+
+
+async def aiter_thread(
+    factory: Callable[[], Iterator[T]], abort: Optional[Callable[[], None]] = None
+) -> AsyncIterator[T]:
+    """
+    The aiter_thread function iterates a blocking iterator in a worker thread, for coroutines.
+
+    Every item is handed to the event loop as soon as the thread reads it. The thread is a daemon, so a
+    consumer that stops early is not held back by a blocking read: the thread notices it at its next item,
+    closes the iterator (and the connection it reads from) and exits. A read that may block for long, like
+    a stalled stream, is ended right away by `abort`, which the consumer calls when it stops early.
+
+    :param factory:Callable[[], Iterator[T]]: Used to Build the iterator, in the worker thread.
+    :param abort:Optional[Callable[[], None]]: Used to Unblock the thread, e.g. by closing its connection.
+    :return: An async generator of the items.
+
+    :doc-author: coderj001
+    """
+    loop = asyncio.get_running_loop()
+    items: "asyncio.Queue[Tuple[bool, Any]]" = asyncio.Queue()
+    stopped = threading.Event()
+
+    def put(done: bool, item: Any) -> None:
+        # The loop is closed if the consumer is gone and the program is exiting.
+        with contextlib.suppress(RuntimeError):
+            loop.call_soon_threadsafe(items.put_nowait, (done, item))
+
+    def produce() -> None:
+        try:
+            iterator = factory()
+            try:
+                for item in iterator:
+                    if stopped.is_set():
+                        return
+                    put(False, item)
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+        except BaseException as error:
+            put(True, error)
+        else:
+            put(True, None)
+
+    threading.Thread(target=produce, daemon=True).start()
+    finished = False
+    try:
+        while True:
+            done, item = await items.get()
+            if done:
+                finished = True
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stopped.set()
+        if abort is not None and not finished:
+            abort()
@@ -0,0 +1,255 @@
+import re
+from fnmatch import fnmatch
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ai_git_commit.diff import DiffFile, DiffHunk, parse_diff
+
+IGNORED_FILE_PATTERNS = (
+    "*.lock",
+    "*-lock.json",
+    "*-lock.yaml",
+    "*.lockb",
+    "go.sum",
+    "*.min.js",
+    "*.min.css",
+    "*.map",
+    "*_pb2.py",
+    "*_pb2_grpc.py",
+    "*.pb.go",
+    "*.generated.*",
+    "*.snap",
+    "*.svg",
+)
+IGNORED_DIRECTORIES = ("node_modules/", "vendor/", "dist/", "build/", "__pycache__/")
+
+CHARS_PER_TOKEN = 4
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$", re.S)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    The estimate_tokens function estimates the number of tokens of a text without running a tokenizer.
+
+    BPE tokenizers average about four characters per token on source code, which is close enough to keep
+    the prompt under budget while costing a single len() call.
+
+    :param text:str: Used to Pass the text to estimate.
+    :return: The estimated number of tokens.
+
+    :doc-author: coderj001
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def is_ignored_file(file: DiffFile) -> bool:
+    """
+    The is_ignored_file function checks if a file of the diff is binary, generated or a lockfile.
+
+    :param file:DiffFile: Used to Pass the file to check.
+    :return: True if the file should not be sent to the model.
+
+    :doc-author: coderj001
+    """
+    if file.binary:
+        return True
+    name = file.path.rsplit("/", 1)[-1]
+    if any(fnmatch(name, pattern) for pattern in IGNORED_FILE_PATTERNS):
+        return True
+    path = f"/{file.path}"
+    return any(f"/{directory}" in path for directory in IGNORED_DIRECTORIES)
+
+
+def is_whitespace_only(hunk: DiffHunk) -> bool:
+    """
+    The is_whitespace_only function checks if the removed and added lines of a hunk only differ by whitespace.
+
+    :param hunk:DiffHunk: Used to Pass the hunk to check.
+    :return: True if the hunk only changes whitespace.
+
+    :doc-author: coderj001
+    """
+    lines = hunk.lines
+    removed = "".join("".join(line[1:].split()) for line in lines if line[:1] == "-")
+    added = "".join("".join(line[1:].split()) for line in lines if line[:1] == "+")
+    return removed == added
+
+
+def trim_context(hunk: DiffHunk, context: int = 1) -> List[DiffHunk]:
+    """
+    The trim_context function drops the context lines of a hunk that are further than `context` lines from a change.
+
+    When trimming leaves gaps, the hunk is split in several hunks with recomputed `@@` headers, so the
+    result is still a valid unified diff.
+
+    :param hunk:DiffHunk: Used to Pass the hunk to trim.
+    :param context:int: Used to Set how many unchanged lines to keep around each change.
+    :return: A list of hunks.
+
+    :doc-author: coderj001
+    """
+    match = HUNK_HEADER.match(hunk.header)
+    if match is None:
+        return [hunk]
+    old_line, new_line = int(match.group(1)), int(match.group(3))
+    section = match.group(5).rstrip("\n")
+
+    hunk_lines = hunk.lines
+    changed = [index for index, line in enumerate(hunk_lines) if line[:1] in ("-", "+")]
+    keep = set()
+    for index in changed:
+        keep.update(range(max(index - context, 0), index + context + 1))
+    for index, line in enumerate(hunk_lines):
+        if line[:1] == "\\" and index - 1 in keep:
+            keep.add(index)
+
+    hunks: List[DiffHunk] = []
+    lines: List[str] = []
+    start: Optional[Tuple[int, int]] = None
+    counts = [0, 0]
+
+    def flush() -> None:
+        if start is not None and lines:
+            header = f"@@ -{start[0]},{counts[0]} +{start[1]},{counts[1]} @@{section}\n"
+            hunks.append(DiffHunk(header, list(lines)))
+
+    for index, line in enumerate(hunk_lines):
+        kind = line[:1]
+        if index in keep:
+            if start is None or not lines:
+                start = (old_line, new_line)
+                counts = [0, 0]
+            lines.append(line)
+            counts[0] += kind != "+" and kind != "\\"
+            counts[1] += kind != "-" and kind != "\\"
+        elif lines:
+            flush()
+            lines = []
+        old_line += kind != "+" and kind != "\\"
+        new_line += kind != "-" and kind != "\\"
+    flush()
+    return hunks
+
+
+def hunk_score(file: DiffFile, hunk: DiffHunk) -> float:
+    """
+    The hunk_score function ranks a hunk by how much it tells about the intent of the change.
+
+    Hunks with more changed lines score higher, added lines weigh more than removed ones, and hunks of
+    tests or documentation rank below the hunks of source files.
+
+    :param file:DiffFile: Used to Pass the file the hunk belongs to.
+    :param hunk:DiffHunk: Used to Pass the hunk to score.
+    :return: The score of the hunk, higher is more important.
+
+    :doc-author: coderj001
+    """
+    added, removed = hunk.stats()
+    score = added * 1.0 + removed * 0.5
+    path = file.path.lower()
+    if "test" in path or path.endswith((".md", ".rst", ".txt")):
+        score *= 0.5
+    return score / (1 + estimate_tokens(hunk.text()) / 200)
+
+
+def compact_diff(
+    files: Iterable[DiffFile],
+    token_budget: int,
+    context: int = 1,
+) -> str:
+    """
+    The compact_diff function shrinks a diff until its estimated size fits in the token budget.
+
+    Binary, generated and lockfile changes are replaced by a one line note, the context lines of every hunk
+    are trimmed and whitespace only hunks are collapsed. If the diff is still too large, the hunks are ranked
+    by hunk_score and the most important ones are kept, in their original order, until the budget is met.
+
+    :param files:Iterable[DiffFile]: Used to Pass the parsed diff, usually streamed from GitRepository.iter_staged_diff.
+    :param token_budget:int: Used to Set the maximum number of estimated tokens of the result.
+    :param context:int: Used to Set how many unchanged lines to keep around each change.
+    :return: The compacted diff.
+
+    :doc-author: coderj001
+    """
+    notes: List[str] = []
+    entries: List[Tuple[int, DiffFile, List[DiffHunk]]] = []
+    for file in files:
+        if is_ignored_file(file):
+            notes.append(f"# {file.path}: binary or generated file changed\n")
+            continue
+        hunks: List[DiffHunk] = []
+        for hunk in file.hunks:
+            if is_whitespace_only(hunk):
+                hunks.append(DiffHunk(hunk.header, [" (whitespace only changes)\n"]))
+            else:
+                hunks.extend(trim_context(hunk, context))
+        entries.append((len(entries), file, hunks))
+
+    used = sum(estimate_tokens(note) for note in notes)
+    used += sum(estimate_tokens("".join(file.header)) for _, file, _ in entries)
+    ranked = sorted(
+        (
+            (-hunk_score(file, hunk), position, index)
+            for position, file, hunks in entries
+            for index, hunk in enumerate(hunks)
+        )
+    )
+    selected = set()
+    for _, position, index in ranked:
+        cost = estimate_tokens(entries[position][2][index].text())
+        if used + cost > token_budget:
+            continue
+        used += cost
+        selected.add((position, index))
+
+    output: List[str] = []
+    for position, file, hunks in entries:
+        kept = [
+            hunk for index, hunk in enumerate(hunks) if (position, index) in selected
+        ]
+        if hunks and not kept:
+            notes.append(f"# {file.path}: {len(hunks)} hunks omitted\n")
+            continue
+        output.extend(file.header)
+        output.extend(hunk.text() for hunk in kept)
+        if len(kept) < len(hunks):
+            output.append(f"# {len(hunks) - len(kept)} hunks omitted\n")
+    return "".join(output + notes)
+
+
+def split_diff(
+    files: Iterable[DiffFile],
+    group_by: str = "file",
+    max_chunk_tokens: int = 1500,
+) -> List[Tuple[str, str]]:
+    """
+    The split_diff function splits a diff in chunks that can be summarized independently.
+
+    Every file is compacted to `max_chunk_tokens` as soon as it is read, so only the compacted chunks are
+    kept in memory. With `group_by="directory"`, the files of a same directory are merged in one chunk, which
+    is compacted again if it grows over the budget.
+
+    :param files:Iterable[DiffFile]: Used to Pass the parsed diff, usually streamed from GitRepository.iter_staged_diff.
+    :param group_by:str: Used to Choose between one chunk per "file" or per "directory".
+    :param max_chunk_tokens:int: Used to Set the maximum number of estimated tokens of a chunk.
+    :return: A list of (name, diff) tuples, in the order of the diff.
+
+    :doc-author: coderj001
+    """
+    if group_by not in ("file", "directory"):
+        raise ValueError(f"Invalid group_by: {group_by}")
+    chunks: Dict[str, List[str]] = {}
+    for file in files:
+        name = file.path
+        if group_by == "directory":
+            name = f"{file.path.rsplit('/', 1)[0]}/" if "/" in file.path else "./"
+        chunks.setdefault(name, []).append(compact_diff([file], max_chunk_tokens))
+
+    result = []
+    for name, texts in chunks.items():
+        text = "".join(texts)
+        if len(texts) > 1 and estimate_tokens(text) > max_chunk_tokens:
+            text = compact_diff(
+                parse_diff(text.splitlines(keepends=True)), max_chunk_tokens
+            )
+        result.append((name, text))
+    return result
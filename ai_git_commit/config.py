@@ -1,10 +1,15 @@
+import contextlib
 import os
 import re
+import tempfile
+import threading
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import ini
 
+from ai_git_commit.trace import tracer
+
 
 def file_exists(path: str) -> bool:
     """Check is file exists or not"""
@@ -40,9 +45,137 @@ def locale(locale: Optional[str]) -> str:
     return locale
 
 
-config_parsers = {"OPENAI_KEY": openai_key, "locale": locale}
+def max_diff_tokens(value: Optional[Union[str, int]]) -> int:
+    if not value:
+        return 3000
+    parse_assert(
+        "max_diff_tokens",
+        str(value).isdigit() and int(value) > 0,
+        "Must be a positive integer",
+    )
+    return int(value)
+
+
+def provider(provider: Optional[str]) -> str:
+    if not provider:
+        return "openai"
+    parse_assert(
+        "provider", provider in ("openai", "local"), 'Must be "openai" or "local"'
+    )
+    return provider
+
+
+def model(model: Optional[str]) -> str:
+    if not model:
+        return "text-davinci-002"
+    return model
+
+
+def api_base(api_base: Optional[str]) -> str:
+    if not api_base:
+        return "https://api.openai.com/v1"
+    parse_assert(
+        "api_base",
+        api_base.startswith(("http://", "https://")),
+        'Must start with "http://" or "https://"',
+    )
+    return api_base
+
+
+def max_connections(value: Optional[Union[str, int]]) -> int:
+    if not value:
+        return 10
+    parse_assert(
+        "max_connections",
+        str(value).isdigit() and int(value) > 0,
+        "Must be a positive integer",
+    )
+    return int(value)
+
+
+def request_timeout(value: Optional[Union[str, int, float]]) -> float:
+    if not value:
+        return 60.0
+    parse_assert(
+        "request_timeout",
+        str(value).replace(".", "", 1).isdigit() and float(value) > 0,
+        "Must be a positive number of seconds",
+    )
+    return float(value)
+
+
+def max_retries(value: Optional[Union[str, int]]) -> int:
+    if value is None or value == "":
+        return 3
+    parse_assert("max_retries", str(value).isdigit(), "Must be a non-negative integer")
+    return int(value)
+
+
+def requests_per_minute(value: Optional[Union[str, int]]) -> int:
+    if not value:
+        return 0
+    parse_assert(
+        "requests_per_minute",
+        str(value).isdigit(),
+        "Must be a non-negative integer, 0 for no limit",
+    )
+    return int(value)
+
+
+def attempt_timeout(value: Optional[Union[str, int, float]]) -> float:
+    if not value:
+        return 0.0
+    parse_assert(
+        "attempt_timeout",
+        str(value).replace(".", "", 1).isdigit(),
+        "Must be a non-negative number of seconds, 0 for no deadline",
+    )
+    return float(value)
+
+
+def max_requests(value: Optional[Union[str, int]]) -> int:
+    if not value:
+        return 0
+    parse_assert(
+        "max_requests",
+        str(value).isdigit(),
+        "Must be a non-negative integer, 0 for no limit",
+    )
+    return int(value)
+
+
+def git_backend(git_backend: Optional[str]) -> str:
+    if not git_backend:
+        return "git"
+    parse_assert(
+        "git_backend",
+        git_backend in ("git", "native"),
+        'Must be "git" or "native"',
+    )
+    return git_backend
+
+
+config_parsers = {
+    "OPENAI_KEY": openai_key,
+    "locale": locale,
+    "max_diff_tokens": max_diff_tokens,
+    "provider": provider,
+    "model": model,
+    "api_base": api_base,
+    "max_connections": max_connections,
+    "request_timeout": request_timeout,
+    "max_retries": max_retries,
+    "requests_per_minute": requests_per_minute,
+    "attempt_timeout": attempt_timeout,
+    "max_requests": max_requests,
+    "git_backend": git_backend,
+}
 
 ConfigKeys = Tuple[str, ...]
+# Every key can be overridden by an environment variable, e.g. AI_GIT_COMMIT_MAX_DIFF_TOKENS.
+ENV_PREFIX = "AI_GIT_COMMIT_"
+# The mtime, size and inode of a config file, None if it does not exist.
+FileSignature = Optional[Tuple[int, int, int]]
 
 
 class RawConfig(Dict[str, Optional[str]]):
@@ -53,26 +186,150 @@ class ValidConfig(Dict[str, str]):
     pass
 
 
-def read_config_file() -> RawConfig:
+def get_config_path(directory: Optional[str] = None) -> str:
+    """
+    The get_config_path function returns the path of the configuration file used in a directory.
+
+    :param directory:Optional[str]: Used to Look for a `.env` file in another directory than the current one.
+    :return: The path of the `.env` file of the directory if there is one, of `~/.ai-git-commit` otherwise.
+
+    :doc-author: coderj001
+    """
+    env_path = os.path.join(directory or os.getcwd(), ".env")
+    return (
+        env_path
+        if file_exists(env_path)
+        else os.path.join(os.path.expanduser("~"), ".ai-git-commit")
+    )
+
+
+def file_signature(path: str) -> FileSignature:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class ConfigStore:
+    """
+    The configuration of the process, parsed once and parsed again only when a config file changes.
+
+    A config file is cached with its mtime, size and inode, so a lookup costs a single stat() while the
+    file is unchanged. `get` resolves every key from, in order, the CLI overrides, the `AI_GIT_COMMIT_<KEY>`
+    environment variables, the config file and the defaults of the parsers, and caches the validated
+    config of each combination. `write` replaces the file atomically, so concurrent invocations, e.g. from
+    parallel hooks, never read or leave a partially written file.
+    """
+
+    def __init__(self) -> None:
+        self.files: Dict[str, Tuple[FileSignature, RawConfig]] = {}
+        self.configs: Dict[Tuple[Any, ...], ValidConfig] = {}
+        self.lock = threading.Lock()
+
+    def load(self, path: str) -> Tuple[FileSignature, RawConfig]:
+        signature = file_signature(path)
+        with self.lock:
+            cached = self.files.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached
+        raw_config = RawConfig()
+        if signature is not None:
+            with open(path, "r") as f:
+                raw_config = RawConfig(ini.parse(f.read()))
+        with self.lock:
+            self.files[path] = signature, raw_config
+        return signature, raw_config
+
+    def read(self, path: str) -> RawConfig:
+        return RawConfig(self.load(path)[1])
+
+    def get(
+        self, cli_config: Optional[RawConfig] = None, directory: Optional[str] = None
+    ) -> ValidConfig:
+        path = get_config_path(directory)
+        with tracer.span("config.load", "config", path=path) as span:
+            signature, file_config = self.load(path)
+            env_config = {
+                key: os.environ[ENV_PREFIX + key.upper()]
+                for key in config_parsers
+                if ENV_PREFIX + key.upper() in os.environ
+            }
+            overrides = dict(cli_config or {})
+            cache_key = (
+                path,
+                signature,
+                tuple(sorted(env_config.items())),
+                tuple(sorted(overrides.items(), key=lambda item: item[0])),
+            )
+            with self.lock:
+                cached = self.configs.get(cache_key)
+            if cached is not None:
+                span["cached"] = True
+                return ValidConfig(cached)
+
+            def lookup(key: str) -> Optional[str]:
+                for layer in (overrides, env_config, file_config):
+                    if key in layer:
+                        return layer[key]
+                return None
+
+            parsed_config = {}
+            for key, parser in config_parsers.items():
+                value = lookup(key)
+                if (
+                    key == "OPENAI_KEY"
+                    and not value
+                    and provider(lookup("provider")) == "local"
+                ):
+                    # The local provider runs offline, so it does not need an API key.
+                    parsed_config[key] = ""
+                    continue
+                parsed_config[key] = parser(value)
+            config = ValidConfig(parsed_config)
+            with self.lock:
+                # The configs of a previous version of the file will not be looked up anymore.
+                self.configs = {
+                    key: value
+                    for key, value in self.configs.items()
+                    if key[0] != path or key[1] == signature
+                }
+                self.configs[cache_key] = config
+            return ValidConfig(config)
+
+    def write(self, path: str, config: RawConfig) -> None:
+        # The file is written next to its destination and renamed over it, which is atomic. mkstemp
+        # creates it readable by its owner only, as it holds the API key.
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", prefix=".ai-git-commit-"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(ini.stringify(config))
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+        with self.lock:
+            self.files.pop(path, None)
+
+
+config_store = ConfigStore()
+
+
+def read_config_file(directory: Optional[str] = None) -> RawConfig:
     """
     The read_config_file function reads the configuration file and returns a RawConfig object.
 
-    The config_path is set to ~/.ai-git-commit if there is no .env file in the current directory, otherwise it's set to ./env. If there isn't a config_path, an empty RawConfig object is returned. Otherwise, we open the config_path for reading and parse it with ini (which returns a dictionary). We then return that dictionary as part of our RawConfig object.
+    The config_path is set to ~/.ai-git-commit if there is no .env file in the current directory, otherwise it's set to ./env. If there isn't a config_path, an empty RawConfig object is returned. Otherwise, the file is parsed with ini through the config_store, which only parses it again once it changed.
 
+    :param directory:Optional[str]: Used to Read the config of another directory than the current one.
     :return: A rawconfig object.
 
     :doc-author: coderj001
     """
-    config_path = (
-        os.path.join(os.path.expanduser("~"), ".ai-git-commit")
-        if not file_exists(".env")
-        else os.path.join(os.getcwd(), ".env")
-    )
-    if not file_exists(config_path):
-        return RawConfig()
-    with open(config_path, "r") as f:
-        raw_config = ini.parse(f.read())
-        return RawConfig(raw_config)
+    return config_store.read(get_config_path(directory))
 
 
 def set_configs(key_values: Tuple[Tuple[str, str], ...]):
@@ -80,7 +337,7 @@ def set_configs(key_values: Tuple[Tuple[str, str], ...]):
     The set_configs function takes a list of tuples, where each tuple is a key-value pair.
     The keys are the names of config properties, and the values are strings that will be parsed
     into whatever type is appropriate for that property. The function then writes these new values
-    to the user's config file.
+    to the user's config file, atomically, with the config_store.
 
     :param key_values:Tuple[Tuple[str: Used to Specify the type of the key_values parameter.
     :param str]: Used to Specify the type of the value.
@@ -89,37 +346,34 @@ def set_configs(key_values: Tuple[Tuple[str, str], ...]):
 
     :doc-author: coderj001
     """
-    config = read_config_file()
+    config_path = os.path.join(os.path.expanduser("~"), ".ai-git-commit")
+    config = config_store.read(config_path)
     for key, value in key_values:
         if key not in config_parsers:
             raise KnownError(f"Invalid config property: {key}")
         parsed = config_parsers[key](value)
         config[key] = parsed
-    config_path = os.path.join(os.path.expanduser("~"), ".ai-git-commit")
-    with open(config_path, "w") as f:
-        f.write(ini.stringify(config))
+    config_store.write(config_path, config)
 
 
-def get_config(cli_config: Optional[RawConfig] = None) -> ValidConfig:
+def get_config(
+    cli_config: Optional[RawConfig] = None, directory: Optional[str] = None
+) -> ValidConfig:
     """
     The get_config function is responsible for reading the configuration file and
     parsing it into a dictionary of values. It also takes in an optional cli_config
     parameter, which is used to override any config values that are passed in via the CLI.
+    The `AI_GIT_COMMIT_<KEY>` environment variables override the file too, and the result is
+    cached by the config_store until the file or the overrides change.
     The function returns a ValidConfig object, which is just a namedtuple containing all of the parsed config values.
 
     :param cli_config:Optional[RawConfig]=None: Used to Pass in the config.
+    :param directory:Optional[str]: Used to Read the config of another directory than the current one.
     :return: A dictionary with the keys and values from the config file.
 
     :doc-author: coderj001
     """
-    config = read_config_file()
-    parsed_config = {}
-    for key, parser in config_parsers.items():
-        value = (
-            cli_config.get(key) if cli_config and key in cli_config else config.get(key)
-        )
-        parsed_config[key] = parser(value)
-    return ValidConfig(parsed_config)
+    return config_store.get(cli_config, directory)
 
 
 class ICommitMessage(Dict):
@@ -0,0 +1,462 @@
+"""
+An optional background process keeping the config, the caches and the HTTP connections warm.
+
+The daemon listens on a Unix socket only its user can connect to. A request is a JSON line naming a command
+and the directory it runs in, and the daemon answers with JSON lines of events until a `done` or `error`
+event. The client side of this module only imports the standard library, so a CLI talking to the daemon
+starts as fast as `ai-git-commit config get`, and falls back to running in-process when no daemon answers.
+"""
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from ai_git_commit.config import (
+    ENV_PREFIX,
+    ICommitMessage,
+    RawConfig,
+    ValidConfig,
+    config_parsers,
+    get_config,
+)
+
+if TYPE_CHECKING:
+    import asyncio
+
+    from ai_git_commit.providers import Provider
+    from ai_git_commit.retry import Retrier
+
+# Bumped whenever the requests or events change, so a daemon left running by an older version is not used.
+PROTOCOL_VERSION = 1
+IDLE_TIMEOUT = 30 * 60
+CONNECT_TIMEOUT = 0.5
+START_TIMEOUT = 5.0
+
+Event = Dict[str, Any]
+Send = Callable[[Event], None]
+
+
+class DaemonUnavailable(Exception):
+    """Raised when no compatible daemon answers on the socket, so the command runs in-process."""
+
+
+class DaemonError(Exception):
+    """An error the daemon reported while it ran a command."""
+
+
+def get_socket_path() -> Path:
+    """
+    The get_socket_path function returns the path of the Unix socket of the daemon.
+
+    :return: A path in `$XDG_RUNTIME_DIR` when it is set, in the temporary directory otherwise.
+
+    :doc-author: coderj001
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "ai-git-commit.sock"
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return Path(tempfile.gettempdir()) / f"ai-git-commit-{uid}.sock"
+
+
+def encode_request(command: str, arguments: Mapping[str, Any]) -> bytes:
+    request = {
+        "version": PROTOCOL_VERSION,
+        "command": command,
+        "cwd": os.getcwd(),
+        "env": {
+            name: value
+            for name, value in os.environ.items()
+            if name.startswith(ENV_PREFIX)
+        },
+        **arguments,
+    }
+    return (json.dumps(request) + "\n").encode("utf-8")
+
+
+def decode_event(line: bytes) -> Event:
+    if not line:
+        raise DaemonError("The daemon closed the connection")
+    event = json.loads(line)
+    if event["event"] == "unsupported":
+        raise DaemonUnavailable(f"The daemon speaks protocol {event['version']}")
+    if event["event"] == "error":
+        # Usage errors, like an empty staging area, are reported as they would be in-process.
+        if event.get("type") == "ValueError":
+            raise ValueError(event["error"])
+        raise DaemonError(event["error"])
+    return event
+
+
+def connect(path: Optional[Path] = None) -> socket.socket:
+    # GIT_DIR and friends are not forwarded to the daemon, so such commands run in-process.
+    if not hasattr(socket, "AF_UNIX") or "GIT_DIR" in os.environ:
+        raise DaemonUnavailable("Unix sockets are not available")
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(CONNECT_TIMEOUT)
+    try:
+        client.connect(str(path or get_socket_path()))
+    except OSError as error:
+        client.close()
+        raise DaemonUnavailable(str(error)) from error
+    client.settimeout(None)
+    return client
+
+
+def request_daemon(
+    command: str, path: Optional[Path] = None, **arguments: Any
+) -> Iterator[Event]:
+    """
+    The request_daemon function sends a command to the daemon and yields the events it answers.
+
+    :param command:str: Used to Name the command, e.g. `ping` or `batch`.
+    :param path:Optional[Path]: Used to Connect to another socket than get_socket_path.
+    :param **arguments:Any: Used to Pass the arguments of the command.
+    :return: A generator of the events, the last one being the `done` event.
+
+    :doc-author: coderj001
+    """
+    client = connect(path)
+    with client, client.makefile("rwb") as stream:
+        stream.write(encode_request(command, arguments))
+        stream.flush()
+        while True:
+            event = decode_event(stream.readline())
+            yield event
+            if event["event"] == "done":
+                return
+
+
+async def arequest_daemon(
+    command: str, path: Optional[Path] = None, **arguments: Any
+) -> AsyncIterator[Event]:
+    # The coroutine version of request_daemon. Closing the generator closes the connection, which
+    # cancels the command in the daemon.
+    import asyncio
+
+    client = connect(path)
+    reader, writer = await asyncio.open_unix_connection(sock=client)
+    try:
+        writer.write(encode_request(command, arguments))
+        await writer.drain()
+        while True:
+            event = decode_event(await reader.readline())
+            yield event
+            if event["event"] == "done":
+                return
+    finally:
+        writer.close()
+
+
+async def adaemon_commit_candidates(
+    cache: bool = True,
+    partials: Optional[Dict[int, str]] = None,
+    path: Optional[Path] = None,
+) -> AsyncIterator[ICommitMessage]:
+    """
+    The adaemon_commit_candidates function asks the daemon for the commit messages of the staged changes.
+
+    It returns once the daemon read the staged diff, so an empty staging area is reported (as a ValueError)
+    before the user is prompted.
+
+    :param cache:bool: Used to Reuse the suggestions already generated for the same staged diff.
+    :param partials:Optional[Dict[int, str]]: Used to Receive the subjects while they are streamed.
+    :param path:Optional[Path]: Used to Connect to another socket than get_socket_path.
+    :return: An async generator of the candidates.
+
+    :doc-author: coderj001
+    """
+    events = arequest_daemon("generate", path, cache=cache)
+    try:
+        await events.__anext__()
+    except StopAsyncIteration:
+        raise DaemonError("The daemon closed the connection")
+    except BaseException:
+        await events.aclose()
+        raise
+
+    async def candidates() -> AsyncIterator[ICommitMessage]:
+        try:
+            async for event in events:
+                if event["event"] == "partial" and partials is not None:
+                    partials[event["index"]] = event["subject"]
+                elif event["event"] == "message":
+                    yield ICommitMessage(event["message"])
+        finally:
+            await events.aclose()
+
+    return candidates()
+
+
+class Daemon:
+    """
+    The server side: runs the commands sent on the socket with process-wide warm state.
+
+    The config files are parsed once by the config store of the process, and the providers (with their
+    pools of keep-alive connections), the retriers (with their shared rate limits) and the disk cache are
+    reused by every request. The daemon exits once it was idle for idle_timeout seconds.
+    """
+
+    def __init__(
+        self, path: Optional[Path] = None, idle_timeout: float = IDLE_TIMEOUT
+    ) -> None:
+        from ai_git_commit.cache import DiskCache
+
+        self.path = path or get_socket_path()
+        self.idle_timeout = idle_timeout
+        self.providers: Dict[Tuple[Any, ...], "Provider"] = {}
+        self.retriers: Dict[Tuple[Any, ...], "Retrier"] = {}
+        self.disk_cache = DiskCache()
+        self.active = 0
+        self.last_request = time.monotonic()
+        self.stopped: Optional["asyncio.Event"] = None
+
+    def config(self, request: Event) -> ValidConfig:
+        # The config store of the daemon parses every config file once. The overrides of the client's
+        # environment are applied on top of the daemon's.
+        env = request.get("env", {})
+        overrides = RawConfig(
+            {
+                key: env[ENV_PREFIX + key.upper()]
+                for key in config_parsers
+                if ENV_PREFIX + key.upper() in env
+            }
+        )
+        return get_config(overrides, directory=request["cwd"])
+
+    def provider(self, config: Mapping[str, Any]) -> "Provider":
+        from ai_git_commit.providers import get_provider
+
+        key = tuple(
+            config[name]
+            for name in (
+                "provider",
+                "OPENAI_KEY",
+                "api_base",
+                "max_connections",
+                "request_timeout",
+            )
+        )
+        if key not in self.providers:
+            self.providers[key] = get_provider(config)
+        return self.providers[key]
+
+    def retrier(self, config: Mapping[str, Any]) -> "Retrier":
+        from ai_git_commit.retry import RequestBudget, Retrier, get_retrier
+
+        key = (
+            config["max_retries"],
+            config["requests_per_minute"],
+            config["attempt_timeout"],
+        )
+        if key not in self.retriers:
+            self.retriers[key] = get_retrier(config)
+        shared = self.retriers[key]
+        # The rate limiter is shared by the runs, while the request budget is the one of a single run.
+        max_requests = config["max_requests"]
+        return Retrier(
+            shared.policy,
+            shared.limiter,
+            RequestBudget(max_requests) if max_requests else None,
+        )
+
+    def repository(self, request: Event, config: Mapping[str, Any]) -> Any:
+        from ai_git_commit.repository import GitRepository
+
+        repository = GitRepository.discover(
+            request["cwd"], native=config["git_backend"] == "native"
+        )
+        if repository is None:
+            raise ValueError("Current directory is not a git repository")
+        return repository
+
+    async def command_ping(self, request: Event, send: Send) -> None:
+        send({"event": "done", "pid": os.getpid()})
+
+    async def command_stop(self, request: Event, send: Send) -> None:
+        assert self.stopped is not None
+        self.stopped.set()
+        send({"event": "done"})
+
+    async def command_generate(self, request: Event, send: Send) -> None:
+        import asyncio
+
+        from ai_git_commit.openai import staged_commit_candidates
+
+        config = self.config(request)
+        repository = self.repository(request, config)
+        candidates = await asyncio.to_thread(
+            staged_commit_candidates,
+            repository,
+            config,
+            cache=self.disk_cache if request.get("cache", True) else None,
+            provider=self.provider(config),
+            retrier=self.retrier(config),
+            on_partial=lambda index, subject: send(
+                {"event": "partial", "index": index, "subject": subject}
+            ),
+        )
+        send({"event": "started"})
+        try:
+            async for candidate in candidates:
+                send({"event": "message", "message": candidate})
+        finally:
+            await candidates.aclose()  # type: ignore[attr-defined]
+        send({"event": "done"})
+
+    async def command_batch(self, request: Event, send: Send) -> None:
+        from ai_git_commit.batch import awrite_batch
+
+        config = self.config(request)
+        stats = await awrite_batch(
+            self.repository(request, config),
+            request["rev_range"],
+            config,
+            lambda line: send({"event": "result", "line": line}),
+            jobs=request.get("jobs", 4),
+            cache=self.disk_cache if request.get("cache", True) else None,
+            provider=self.provider(config),
+            retrier=self.retrier(config),
+        )
+        send({"event": "done", "report": stats.report()})
+
+    async def handle(
+        self, reader: "asyncio.StreamReader", writer: "asyncio.StreamWriter"
+    ) -> None:
+        import asyncio
+
+        self.active += 1
+
+        def send(event: Event) -> None:
+            # The events are small, so they are written without waiting for the client to read them.
+            if not writer.is_closing():
+                writer.write((json.dumps(event) + "\n").encode("utf-8"))
+
+        try:
+            request = json.loads(await reader.readline() or b"{}")
+            if request.get("version") != PROTOCOL_VERSION:
+                send({"event": "unsupported", "version": PROTOCOL_VERSION})
+                return
+            command = getattr(self, f"command_{request.get('command')}", None)
+            if command is None:
+                raise ValueError(f"Unknown command: {request.get('command')}")
+            task = asyncio.ensure_future(command(request, send))
+            # The client sends nothing after its request, so the end of its stream means it is gone.
+            disconnected = asyncio.ensure_future(reader.read())
+            await asyncio.wait(
+                {task, disconnected}, return_when=asyncio.FIRST_COMPLETED
+            )
+            disconnected.cancel()
+            if not task.done():
+                task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        except Exception as error:
+            send(
+                {
+                    "event": "error",
+                    "error": str(error) or type(error).__name__,
+                    "type": type(error).__name__,
+                }
+            )
+        finally:
+            with contextlib.suppress(Exception):
+                await writer.drain()
+            writer.close()
+            self.active -= 1
+            self.last_request = time.monotonic()
+
+    async def serve(self) -> None:
+        import asyncio
+
+        if self.path.exists():
+            try:
+                list(request_daemon("ping", self.path))
+            except (DaemonUnavailable, DaemonError, OSError):
+                # A socket left behind by a daemon that was killed.
+                self.path.unlink()
+            else:
+                raise RuntimeError(f"A daemon is already listening on {self.path}")
+        self.stopped = asyncio.Event()
+        # The socket is created without any permission for the group and the others.
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.handle, path=str(self.path))
+        finally:
+            os.umask(umask)
+        try:
+            async with server:
+                while not self.stopped.is_set():
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(
+                            self.stopped.wait(), min(self.idle_timeout, 60)
+                        )
+                    idle = time.monotonic() - self.last_request
+                    if self.active == 0 and idle >= self.idle_timeout:
+                        break
+        finally:
+            with contextlib.suppress(OSError):
+                self.path.unlink()
+
+
+def run_daemon(path: Optional[Path] = None, idle_timeout: float = IDLE_TIMEOUT) -> None:
+    """
+    The run_daemon function runs the daemon in the foreground until it is stopped or idle.
+
+    :param path:Optional[Path]: Used to Listen on another socket than get_socket_path.
+    :param idle_timeout:float: Used to Exit after this many seconds without requests.
+    :return: None.
+
+    :doc-author: coderj001
+    """
+    import asyncio
+
+    asyncio.run(Daemon(path, idle_timeout).serve())
+
+
+def start_daemon(path: Optional[Path] = None) -> int:
+    """
+    The start_daemon function starts the daemon in a detached process and waits until it answers.
+
+    :param path:Optional[Path]: Used to Listen on another socket than get_socket_path.
+    :return: The pid of the daemon.
+
+    :doc-author: coderj001
+    """
+    with contextlib.suppress(DaemonUnavailable, DaemonError):
+        return list(request_daemon("ping", path))[-1]["pid"]
+    subprocess.Popen(
+        [sys.executable, "-m", "ai_git_commit.daemon", *([str(path)] if path else [])],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + START_TIMEOUT
+    while True:
+        try:
+            return list(request_daemon("ping", path))[-1]["pid"]
+        except DaemonUnavailable:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+if __name__ == "__main__":
+    run_daemon(Path(sys.argv[1]) if len(sys.argv) > 1 else None)
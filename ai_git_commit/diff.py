@@ -0,0 +1,234 @@
+import mmap
+import re
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+FILE_OR_HUNK = rb"(?:(?P<file>diff --git )|@@)[^\n]*\n?"
+FILE_OR_HUNK_LINE = re.compile(rb"^" + FILE_OR_HUNK, re.M)
+# `^` does not match at the position a search starts from, so the first line is matched separately.
+FIRST_FILE_OR_HUNK_LINE = re.compile(FILE_OR_HUNK)
+BINARY_MARKER = re.compile(rb"^(?:Binary files |GIT binary patch)", re.M)
+ADDED_LINE = re.compile(rb"^\+", re.M)
+REMOVED_LINE = re.compile(rb"^-", re.M)
+
+
+class DiffHunk:
+    """A single `@@ ... @@` hunk of a unified diff."""
+
+    __slots__ = ("header", "lines")
+
+    def __init__(self, header: str, lines: Optional[List[str]] = None) -> None:
+        self.header = header
+        self.lines: List[str] = lines if lines is not None else []
+
+    def text(self) -> str:
+        return self.header + "".join(self.lines)
+
+    def stats(self) -> Tuple[int, int]:
+        """Return the number of added and removed lines of the hunk."""
+        added = removed = 0
+        for line in self.lines:
+            if line[:1] == "+":
+                added += 1
+            elif line[:1] == "-":
+                removed += 1
+        return added, removed
+
+    def __repr__(self) -> str:
+        return f"DiffHunk({self.header.strip()!r}, {len(self.lines)} lines)"
+
+
+class DiffFile:
+    """All the hunks of a single file in a `git diff` output."""
+
+    __slots__ = ("path", "header", "hunks", "binary")
+
+    def __init__(self, path: str, header: Optional[List[str]] = None) -> None:
+        self.path = path
+        self.header: List[str] = header if header is not None else []
+        self.hunks: List[DiffHunk] = []
+        self.binary = False
+
+    def text(self) -> str:
+        return "".join(self.header) + "".join(hunk.text() for hunk in self.hunks)
+
+    def blob_ids(self) -> Optional[Tuple[str, str]]:
+        """Return the (old, new) blob ids of the `index <old>..<new>` header line."""
+        for line in self.header:
+            if line.startswith("index ") and ".." in line:
+                old, new = line.split()[1].split("..", 1)
+                return old, new
+        return None
+
+    def __repr__(self) -> str:
+        return f"DiffFile({self.path!r}, {len(self.hunks)} hunks)"
+
+
+def parse_diff_path(line: str) -> str:
+    """
+    The parse_diff_path function extracts the destination path from a `diff --git a/<path> b/<path>` line.
+
+    :param line:str: Used to Pass the `diff --git` header line.
+    :return: The path of the file on the `b/` side of the diff.
+
+    :doc-author: coderj001
+    """
+    line = line.rstrip("\n")
+    marker = line.rfind(" b/")
+    if marker == -1:
+        return line[len("diff --git ") :]
+    return line[marker + len(" b/") :]
+
+
+def parse_diff(lines: Iterable[str]) -> Iterator[DiffFile]:
+    """
+    The parse_diff function turns the lines of a `git diff` output into DiffFile records.
+
+    The lines are consumed lazily, and each DiffFile is yielded as soon as the next `diff --git` line
+    (or the end of the input) is reached, so only one file is held in memory at a time.
+
+    :param lines:Iterable[str]: Used to Pass the diff lines, each one keeping its trailing newline.
+    :return: A generator of DiffFile objects.
+
+    :doc-author: coderj001
+    """
+    current: Optional[DiffFile] = None
+    hunk: Optional[DiffHunk] = None
+    for line in lines:
+        if line.startswith("diff --git "):
+            if current is not None:
+                yield current
+            current = DiffFile(parse_diff_path(line), [line])
+            hunk = None
+        elif current is None:
+            continue
+        elif line.startswith("@@"):
+            hunk = DiffHunk(line)
+            current.hunks.append(hunk)
+        elif hunk is not None:
+            hunk.lines.append(line)
+        else:
+            if line.startswith("Binary files ") or line.startswith("GIT binary patch"):
+                current.binary = True
+            current.header.append(line)
+    if current is not None:
+        yield current
+
+
+def decode(buffer: Buffer, start: int, end: int) -> str:
+    return str(buffer[start:end], "utf-8", errors="replace")
+
+
+class DiffHunkView(DiffHunk):
+    """
+    A hunk of a diff held in a buffer, stored as offsets into it.
+
+    The header and the lines are only decoded when they are read, so a hunk costs a few integers until then.
+    """
+
+    __slots__ = ("buffer", "start", "body", "end")
+
+    def __init__(self, buffer: Buffer, start: int, body: int, end: int) -> None:
+        self.buffer = buffer
+        self.start = start
+        self.body = body
+        self.end = end
+
+    @property  # type: ignore[override]
+    def header(self) -> str:
+        return decode(self.buffer, self.start, self.body)
+
+    @property  # type: ignore[override]
+    def lines(self) -> List[str]:
+        return decode(self.buffer, self.body, self.end).splitlines(keepends=True)
+
+    def text(self) -> str:
+        return decode(self.buffer, self.start, self.end)
+
+    def stats(self) -> Tuple[int, int]:
+        added = sum(1 for _ in ADDED_LINE.finditer(self.buffer, self.body, self.end))
+        removed = sum(
+            1 for _ in REMOVED_LINE.finditer(self.buffer, self.body, self.end)
+        )
+        return added, removed
+
+    def __repr__(self) -> str:
+        return f"DiffHunkView({self.start}:{self.end})"
+
+
+class DiffFileView(DiffFile):
+    """A file of a diff held in a buffer: its header is decoded on access and its hunks are DiffHunkView."""
+
+    __slots__ = ("buffer", "start", "header_end", "end")
+
+    def __init__(self, buffer: Buffer, start: int, path: str) -> None:
+        self.buffer = buffer
+        self.start = self.header_end = self.end = start
+        self.path = path
+        self.hunks: List[DiffHunk] = []
+        self.binary = False
+
+    @property  # type: ignore[override]
+    def header(self) -> List[str]:
+        return decode(self.buffer, self.start, self.header_end).splitlines(
+            keepends=True
+        )
+
+    def text(self) -> str:
+        return decode(self.buffer, self.start, self.end)
+
+    def __repr__(self) -> str:
+        return f"DiffFileView({self.path!r}, {len(self.hunks)} hunks)"
+
+
+def parse_diff_buffer(buffer: Buffer, start: int = 0) -> Iterator[DiffFile]:
+    """
+    The parse_diff_buffer function parses a `git diff` output held in a buffer without copying it.
+
+    The buffer can be bytes, a memoryview or the mmap of a file the diff was written to. The start of the
+    files and hunks are found with a regular expression scanning the buffer in place, and every record only
+    keeps offsets into it, so the buffer must stay open while the records are used.
+
+    :param buffer:Buffer: Used to Pass the diff, encoded as UTF-8.
+    :param start:int: Used to Skip what precedes the diff in the buffer, e.g. a `--raw` listing.
+    :return: A generator of DiffFileView objects, in the order of the diff.
+
+    :doc-author: coderj001
+    """
+    size = len(buffer)
+    current: Optional[DiffFileView] = None
+    hunk: Optional[DiffHunkView] = None
+
+    def close(end: int) -> None:
+        if current is None:
+            return
+        if hunk is None:
+            current.header_end = end
+            current.binary = (
+                BINARY_MARKER.search(buffer, current.start, end) is not None
+            )
+        else:
+            hunk.end = end
+        current.end = end
+
+    first = FIRST_FILE_OR_HUNK_LINE.match(buffer, start)
+    matches = FILE_OR_HUNK_LINE.finditer(buffer, first.end() if first else start)
+    for match in chain([first] if first else [], matches):
+        position, line_end = match.span()
+        if match.start("file") != -1:
+            close(position)
+            if current is not None:
+                yield current
+            current = DiffFileView(
+                buffer, position, parse_diff_path(decode(buffer, position, line_end))
+            )
+            hunk = None
+        elif current is not None:
+            close(position)
+            hunk = DiffHunkView(buffer, position, line_end, line_end)
+            current.hunks.append(hunk)
+    close(size)
+    if current is not None:
+        yield current
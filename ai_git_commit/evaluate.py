@@ -0,0 +1,348 @@
+import asyncio
+import json
+import math
+import re
+import sys
+import time
+from collections import deque
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+)
+
+from ai_git_commit.compact import compact_diff, estimate_tokens
+from ai_git_commit.config import ICommitMessage, RawConfig, get_config
+from ai_git_commit.diff import parse_diff
+from ai_git_commit.openai import parse_commit_messages
+from ai_git_commit.prompts import get_prompt
+from ai_git_commit.providers import Provider, get_provider
+from ai_git_commit.repository import CommitDiff, GitRepository
+from ai_git_commit.retry import Retrier, get_retrier
+
+DEFAULT_PROMPT_IDS = (4, 5)
+MAX_SUBJECT_LENGTH = 72
+CONVENTIONAL_TYPES = (
+    "feat",
+    "fix",
+    "docs",
+    "style",
+    "refactor",
+    "perf",
+    "test",
+    "build",
+    "ci",
+    "chore",
+    "revert",
+)
+CONVENTIONAL_SUBJECT = re.compile(
+    rf"^(?:{'|'.join(CONVENTIONAL_TYPES)})(?:\([\w./-]+\))?!?: \S.*[^.]$"
+)
+WORD = re.compile(r"[a-z0-9]+")
+
+
+class Evaluation(NamedTuple):
+    """The messages one prompt generated for one commit, with what it cost."""
+
+    prompt_id: int
+    commit: str
+    original_subject: str
+    messages: List[ICommitMessage]
+    error: Optional[str]
+    seconds: float
+    prompt_tokens: int
+    completion_tokens: int
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "prompt_id": self.prompt_id,
+                "commit": self.commit,
+                "original_subject": self.original_subject,
+                "subjects": [message["subject"] for message in self.messages],
+                "error": self.error,
+                "seconds": round(self.seconds, 3),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            },
+            ensure_ascii=False,
+        )
+
+
+class PromptScore(NamedTuple):
+    """The scores of a prompt over the corpus, the rates being fractions of its messages."""
+
+    prompt_id: int
+    commits: int
+    failed: int
+    messages: int
+    conventional_rate: float
+    subject_length: float
+    within_limit_rate: float
+    overlap: float
+    latency_p50: float
+    latency_p90: float
+    prompt_tokens: float
+    completion_tokens: float
+    tokens_per_valid_message: Optional[float]
+
+
+def is_conventional(subject: str) -> bool:
+    """
+    The is_conventional function checks a subject against the conventional commit format.
+
+    The subject must start with a known type, an optional scope and `!`, then `: ` and a description
+    which does not end with a period.
+
+    :param subject:str: Used to Pass the subject line to check.
+    :return: True if the subject is a valid conventional commit subject.
+
+    :doc-author: coderj001
+    """
+    return bool(CONVENTIONAL_SUBJECT.match(subject))
+
+
+def subject_overlap(subject: str, original: str) -> float:
+    # The share of words of both subjects found in each, as a cheap offline proxy for the relevance of the
+    # generated subject to what its author wrote. The type prefixes are not words of the description.
+    words = set(WORD.findall(subject.split(": ", 1)[-1].lower()))
+    original_words = set(WORD.findall(original.split(": ", 1)[-1].lower()))
+    if not words or not original_words:
+        return 0.0
+    return len(words & original_words) / len(words | original_words)
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def score_evaluations(evaluations: Sequence[Evaluation]) -> List[PromptScore]:
+    """
+    The score_evaluations function aggregates the evaluations of every prompt into a PromptScore.
+
+    :param evaluations:Sequence[Evaluation]: Used to Pass the evaluations, of any number of prompts.
+    :return: The scores, in the order of the prompts.
+
+    :doc-author: coderj001
+    """
+    by_prompt: Dict[int, List[Evaluation]] = {}
+    for evaluation in evaluations:
+        by_prompt.setdefault(evaluation.prompt_id, []).append(evaluation)
+    scores = []
+    for prompt_id, runs in by_prompt.items():
+        pairs = [(run, message) for run in runs for message in run.messages]
+        subjects = [message["subject"] for _, message in pairs]
+        valid = sum(is_conventional(subject) for subject in subjects)
+        tokens = sum(run.prompt_tokens + run.completion_tokens for run in runs)
+        latencies = [run.seconds for run in runs if run.error is None]
+        count = len(subjects) or 1
+        scores.append(
+            PromptScore(
+                prompt_id=prompt_id,
+                commits=len(runs),
+                failed=sum(run.error is not None for run in runs),
+                messages=len(subjects),
+                conventional_rate=valid / count,
+                subject_length=sum(map(len, subjects)) / count,
+                within_limit_rate=sum(
+                    len(subject) <= MAX_SUBJECT_LENGTH for subject in subjects
+                )
+                / count,
+                overlap=sum(
+                    subject_overlap(message["subject"], run.original_subject)
+                    for run, message in pairs
+                )
+                / count,
+                latency_p50=percentile(latencies, 0.5),
+                latency_p90=percentile(latencies, 0.9),
+                prompt_tokens=sum(run.prompt_tokens for run in runs) / len(runs),
+                completion_tokens=sum(run.completion_tokens for run in runs)
+                / len(runs),
+                tokens_per_valid_message=tokens / valid if valid else None,
+            )
+        )
+    return scores
+
+
+def format_scores(scores: Sequence[PromptScore]) -> str:
+    lines = [
+        f"{'prompt':>6} {'commits':>7} {'failed':>6} {'msgs':>5} {'conv %':>6} {'len':>5} "
+        f"{'<=72 %':>6} {'overlap':>7} {'p50 s':>6} {'p90 s':>6} {'in tok':>7} {'out tok':>7} {'tok/valid':>9}"
+    ]
+    for score in scores:
+        per_valid = (
+            f"{score.tokens_per_valid_message:>9.0f}"
+            if score.tokens_per_valid_message is not None
+            else f"{'-':>9}"
+        )
+        lines.append(
+            f"{score.prompt_id:>6} {score.commits:>7} {score.failed:>6} {score.messages:>5} "
+            f"{score.conventional_rate * 100:>6.1f} {score.subject_length:>5.1f} "
+            f"{score.within_limit_rate * 100:>6.1f} {score.overlap:>7.2f} "
+            f"{score.latency_p50:>6.2f} {score.latency_p90:>6.2f} "
+            f"{score.prompt_tokens:>7.0f} {score.completion_tokens:>7.0f} {per_valid}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+async def aevaluate_prompts(
+    commits: Iterator[CommitDiff],
+    prompt_ids: Sequence[int] = DEFAULT_PROMPT_IDS,
+    model: str = "text-davinci-002",
+    max_diff_tokens: int = 2000,
+    locale: str = "en",
+    num_of_commit_messages: int = 1,
+    max_tokens: int = 1024,
+    jobs: int = 4,
+    provider: Optional[Provider] = None,
+    retrier: Optional[Retrier] = None,
+) -> AsyncIterator[Evaluation]:
+    """
+    The aevaluate_prompts function replays the diffs of commits against prompts and yields what each one generated.
+
+    Every commit is compacted as for a commit run, then sent with every prompt, with up to jobs requests in
+    flight. The cache is not used, so the latencies and the token counts are the ones of the model. The
+    evaluations are yielded in the order of the commits and of the prompts, a failure being reported in its
+    Evaluation instead of stopping the run.
+
+    :param commits:Iterator[CommitDiff]: Used to Pass the corpus, usually from GitRepository.iter_commit_diffs.
+    :param prompt_ids:Sequence[int]: Used to Select the prompts to compare.
+    :param model:str: Used to Select the model.
+    :param max_diff_tokens:int: Used to Compact every diff to this token budget.
+    :param locale:str: Used to Select the language of the messages.
+    :param num_of_commit_messages:int: Used to Set the number of messages asked to each prompt.
+    :param max_tokens:int: Used to Limit the tokens of each completion.
+    :param jobs:int: Used to Bound the number of requests sent concurrently.
+    :param provider:Optional[Provider]: Used to Select the model backend, e.g. LocalProvider for a dry run.
+    :param retrier:Optional[Retrier]: Used to Share the retries and rate limit of all the requests.
+    :return: An async generator of Evaluation.
+
+    :doc-author: coderj001
+    """
+    completer = provider or get_provider({})
+    retrier = retrier or Retrier()
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def evaluate(commit: CommitDiff, diff: str, prompt_id: int) -> Evaluation:
+        prompt = get_prompt(prompt_id, locale).render(diff, num_of_commit_messages)
+        messages: List[ICommitMessage] = []
+        error = None
+        text = ""
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                text = await retrier.acall(
+                    lambda: completer.acomplete(prompt, model, max_tokens)
+                )
+                messages = parse_commit_messages(text)
+                if not messages:
+                    error = "No commit message parsed"
+            except Exception as exception:
+                error = str(exception) or type(exception).__name__
+            seconds = time.perf_counter() - started
+        return Evaluation(
+            prompt_id,
+            commit.commit,
+            commit.subject,
+            messages,
+            error,
+            seconds,
+            estimate_tokens(prompt),
+            estimate_tokens(text),
+        )
+
+    # A window of a few commits bounds the memory, while the semaphore bounds the requests.
+    pending: Deque["asyncio.Future[Evaluation]"] = deque()
+    try:
+        while True:
+            commit = await asyncio.to_thread(next, commits, None)
+            if commit is None:
+                break
+            diff = compact_diff(
+                parse_diff(commit.diff.splitlines(keepends=True)), max_diff_tokens
+            )
+            if not diff:
+                continue
+            for prompt_id in prompt_ids:
+                pending.append(asyncio.ensure_future(evaluate(commit, diff, prompt_id)))
+            while len(pending) >= jobs * len(prompt_ids):
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+        close = getattr(commits, "close", None)
+        if close is not None:
+            close()
+
+
+def run_evaluation(
+    rev_range: str,
+    prompt_ids: Sequence[int] = DEFAULT_PROMPT_IDS,
+    jobs: int = 4,
+    overrides: Optional[Mapping[str, str]] = None,
+    results: Optional[IO[str]] = None,
+    repository: Optional[GitRepository] = None,
+) -> List[PromptScore]:
+    """
+    The run_evaluation function compares prompts on the commits of a revision range.
+
+    :param rev_range:str: Used to Select the commits of the corpus, e.g. `HEAD~200..HEAD`.
+    :param prompt_ids:Sequence[int]: Used to Select the prompts to compare.
+    :param jobs:int: Used to Bound the number of requests sent concurrently.
+    :param overrides:Optional[Mapping[str, str]]: Used to Override the config, e.g. the provider and the model.
+    :param results:Optional[IO[str]]: Used to Write every evaluation as a JSON line, for a closer look.
+    :param repository:Optional[GitRepository]: Used to Read the commits of an existing session.
+    :return: The PromptScore of every prompt.
+
+    :doc-author: coderj001
+    """
+    for prompt_id in prompt_ids:
+        get_prompt(prompt_id)
+    config = get_config(RawConfig(overrides or {}))
+    repository = repository or GitRepository.discover()
+    if repository is None:
+        raise ValueError("Current directory is not a git repository")
+
+    async def collect() -> List[Evaluation]:
+        evaluations = []
+        async for evaluation in aevaluate_prompts(
+            repository.iter_commit_diffs(rev_range),
+            prompt_ids=prompt_ids,
+            model=config["model"],
+            max_diff_tokens=config["max_diff_tokens"],
+            locale=config["locale"],
+            jobs=jobs,
+            provider=get_provider(config),
+            retrier=get_retrier(config),
+        ):
+            evaluations.append(evaluation)
+            if results is not None:
+                results.write(evaluation.to_json() + "\n")
+                results.flush()
+        return evaluations
+
+    return score_evaluations(asyncio.run(collect()))
+
+
+def write_report(
+    scores: Sequence[PromptScore], output: IO[str] = sys.stdout, format: str = "table"
+) -> None:
+    if format == "json":
+        json.dump([score._asdict() for score in scores], output, indent=2)
+        output.write("\n")
+    else:
+        output.write(format_scores(scores))
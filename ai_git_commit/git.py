@@ -1,29 +1,199 @@
+import asyncio
+import contextlib
+import functools
+import re
 import subprocess
 import sys
+from bisect import bisect_left, bisect_right
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from prompt_toolkit import HTML, PromptSession, print_formatted_text, prompt
-from prompt_toolkit.completion import Completion, WordCompleter
+from prompt_toolkit.application import get_app_session
+from prompt_toolkit.completion import Completer, Completion
 from prompt_toolkit.lexers import PygmentsLexer
+from prompt_toolkit.patch_stdout import patch_stdout
 from prompt_toolkit.styles import Style
 from pygments_markdown_lexer.lexer import MarkdownLexer
 
+from ai_git_commit.compact import compact_diff
 from ai_git_commit.config import ICommitMessage
+from ai_git_commit.diff import DiffFile, parse_diff
+from ai_git_commit.prefetch import Prefetch
+from ai_git_commit.repository import GitRepository
+from ai_git_commit.trace import tracer
 
+# The `type(scope)!: ` prefix of a conventional commit subject.
+SUBJECT_TYPE_PREFIX = re.compile(r"^[\w-]+(?:\([^)]*\))?!?:\s*")
 
-def git_user_commit_message() -> ICommitMessage:
-    """
-    The git_user_commit_message function is a function that prompts the user to enter a commit message.
-    The function uses prompt_toolkit to create an interactive command line interface for the user.
-    The first prompt asks the user to select from one of several options, each with their own label and hint text.
-    Once selected, this option is used as part of the commit subject (e.g., "feat: Add new feature"). The second prompt asks
-    the user for a brief description of what they are committing (e.g., "Add new feature"). Finally, there is an optional
-    prompt where users can add more detailed information about their changes in markdown format.
 
-    :return: A icommitmessage object.
+class SuggestionCompleter(Completer):
+    """Completes the subject with the suggestions generated so far, without their type prefix."""
 
-    :doc-author: coderj001
+    def __init__(self, suggestions: Callable[[], List[ICommitMessage]]) -> None:
+        self.suggestions = suggestions
+
+    def get_completions(self, document, complete_event):
+        text = document.text_before_cursor.lower()
+        for suggestion in self.suggestions():
+            subject = SUBJECT_TYPE_PREFIX.sub("", suggestion["subject"])
+            if subject.lower().startswith(text):
+                yield Completion(
+                    subject,
+                    start_position=-len(document.text_before_cursor),
+                    display_meta=suggestion["subject"],
+                )
+
+
+class CommitType(NamedTuple):
+    value: str
+    label: str
+    hint: str
+
+
+COMMIT_TYPES = (
+    CommitType("feat", "✨ Features", "A new feature"),
+    CommitType("fix", "🐞 Bug Fixes", "A bug fix"),
+    CommitType("docs", "📝 Documentation", "Documentation only changes"),
+    CommitType(
+        "style", "💄 Styles", "Changes related to code styling, formatting, or linting"
+    ),
+    CommitType(
+        "refactor",
+        "♻️ Code Refactoring",
+        "Code refactoring or restructuring without changing the external behavior",
+    ),
+    CommitType("test", "🧪 Tests", "Adding or updating tests"),
+    CommitType(
+        "chore", "🔧 Maintenance", "Maintenance tasks or non-code related changes"
+    ),
+    CommitType("perf", "🚀 Performance", "Performance improvements or optimizations"),
+    CommitType(
+        "security",
+        "🔒 Security",
+        "Fixes or enhancements related to security vulnerabilities",
+    ),
+    CommitType(
+        "ci",
+        "🤖 CI",
+        "Changes related to Continuous Integration (CI) configuration or scripts",
+    ),
+    CommitType(
+        "i18n",
+        "🌍 Internationalization",
+        "Internationalization and localization updates",
+    ),
+    CommitType(
+        "ui", "🖌️ User Interface", "User Interface (UI) changes or enhancements"
+    ),
+    CommitType(
+        "ux", "👍 User Experience", "User Experience (UX) improvements or updates"
+    ),
+    CommitType("build", "🏗️ Build", "Changes related to build systems or dependencies"),
+    CommitType("config", "⚙️ Configuration", "Configuration updates or changes"),
+    CommitType("deps", "📦 Dependencies", "Dependency updates or changes"),
+    CommitType("revert", "↩️ Revert", "Reverting a previous commit or change"),
+    CommitType("lint", "🔍 Linting", "Linting-related updates or improvements"),
+    CommitType("release", "🚀 Release", "Commits related to a new release or version"),
+    CommitType(
+        "infra",
+        "🖥️ Infrastructure",
+        "Infrastructure updates or changes, such as server configurations",
+    ),
+    CommitType(
+        "animations", "🎬 Animations", "Changes related to animations or transitions"
+    ),
+    CommitType(
+        "examples",
+        "📚 Examples",
+        "Updates or additions to example projects or code samples",
+    ),
+    CommitType("logging", "🔍 Logging", "Logging-related changes or improvements"),
+    CommitType(
+        "monitoring",
+        "🔬 Monitoring",
+        "Updates or additions to monitoring tools and configurations",
+    ),
+)
+COMMIT_TYPE_LABELS = {option.value: option.label for option in COMMIT_TYPES}
+
+
+def fuzzy_span(word: str, value: str) -> Optional[Tuple[int, int]]:
+    # The letters of word found in order in value: the length of the shortest such span, and where it
+    # starts, so that the types where the letters are closest together, like "perf" for "rf", come first.
+    best = None
+    for first in range(len(value)):
+        if value[first] != word[0]:
+            continue
+        position = first
+        for char in word[1:]:
+            position = value.find(char, position + 1)
+            if position == -1:
+                return best
+        span = (position - first + 1, first)
+        if best is None or span < best:
+            best = span
+    return best
+
+
+class TypeCompleter(Completer):
+    """
+    Completes the commit type from an index built once.
+
+    The types starting with the word are found by bisection in the sorted values, and listed in the order
+    of COMMIT_TYPES. The types containing the letters of the word in order come next, the closest first,
+    so a typo or an abbreviation like "rfc" still completes.
     """
-    style = Style.from_dict(
+
+    def __init__(self, options: Sequence[CommitType] = COMMIT_TYPES) -> None:
+        self.rank = {option.value: rank for rank, option in enumerate(options)}
+        self.options = sorted(options, key=lambda option: option.value)
+        self.values = [option.value for option in self.options]
+        self.letters = {option.value: frozenset(option.value) for option in options}
+
+    def matches(self, word: str) -> List[CommitType]:
+        word = word.lower()
+        start = bisect_left(self.values, word)
+        end = bisect_right(self.values, word + "\uffff")
+        prefixed = sorted(
+            self.options[start:end], key=lambda option: self.rank[option.value]
+        )
+        if not word:
+            return prefixed
+        fuzzy = []
+        letters = frozenset(word)
+        for option in self.options[:start] + self.options[end:]:
+            if not letters <= self.letters[option.value]:
+                continue
+            span = fuzzy_span(word, option.value)
+            if span is not None:
+                fuzzy.append((span, self.rank[option.value], option))
+        return prefixed + [option for *_, option in sorted(fuzzy)]
+
+    def get_completions(self, document, complete_event):
+        word = document.get_word_before_cursor()
+        for option in self.matches(word):
+            yield Completion(
+                option.value,
+                start_position=-len(word),
+                display=option.value,
+                display_meta=option.hint,
+            )
+
+
+@functools.lru_cache(maxsize=None)
+def get_style() -> Style:
+    return Style.from_dict(
         {
             "completion-menu.completion": "bg:#008888 #ffffff",
             "completion-menu.completion.current": "bg:#00aaaa #000000",
@@ -32,179 +202,104 @@ def git_user_commit_message() -> ICommitMessage:
         }
     )
 
-    type_options = [
-        {"value": "feat", "label": "✨ Features", "hint": "A new feature"},
-        {"value": "fix", "label": "🐞 Bug Fixes", "hint": "A bug fix"},
-        {
-            "value": "docs",
-            "label": "📝 Documentation",
-            "hint": "Documentation only changes",
-        },
-        {
-            "value": "style",
-            "label": "💄 Styles",
-            "hint": "Changes related to code styling, formatting, or linting",
-        },
-        {
-            "value": "refactor",
-            "label": "♻️ Code Refactoring",
-            "hint": "Code refactoring or restructuring without changing the external behavior",
-        },
-        {"value": "test", "label": "🧪 Tests", "hint": "Adding or updating tests"},
-        {
-            "value": "chore",
-            "label": "🔧 Maintenance",
-            "hint": "Maintenance tasks or non-code related changes",
-        },
-        {
-            "value": "perf",
-            "label": "🚀 Performance",
-            "hint": "Performance improvements or optimizations",
-        },
-        {
-            "value": "security",
-            "label": "🔒 Security",
-            "hint": "Fixes or enhancements related to security vulnerabilities",
-        },
-        {
-            "value": "ci",
-            "label": "🤖 CI",
-            "hint": "Changes related to Continuous Integration (CI) configuration or scripts",
-        },
-        {
-            "value": "i18n",
-            "label": "🌍 Internationalization",
-            "hint": "Internationalization and localization updates",
-        },
-        {
-            "value": "ui",
-            "label": "🖌️ User Interface",
-            "hint": "User Interface (UI) changes or enhancements",
-        },
-        {
-            "value": "ux",
-            "label": "👍 User Experience",
-            "hint": "User Experience (UX) improvements or updates",
-        },
-        {
-            "value": "build",
-            "label": "🏗️ Build",
-            "hint": "Changes related to build systems or dependencies",
-        },
-        {
-            "value": "config",
-            "label": "⚙️ Configuration",
-            "hint": "Configuration updates or changes",
-        },
-        {
-            "value": "deps",
-            "label": "📦 Dependencies",
-            "hint": "Dependency updates or changes",
-        },
-        {
-            "value": "revert",
-            "label": "↩️ Revert",
-            "hint": "Reverting a previous commit or change",
-        },
-        {
-            "value": "lint",
-            "label": "🔍 Linting",
-            "hint": "Linting-related updates or improvements",
-        },
-        {
-            "value": "release",
-            "label": "🚀 Release",
-            "hint": "Commits related to a new release or version",
-        },
-        {
-            "value": "infra",
-            "label": "🖥️ Infrastructure",
-            "hint": "Infrastructure updates or changes, such as server configurations",
-        },
-        {
-            "value": "animations",
-            "label": "🎬 Animations",
-            "hint": "Changes related to animations or transitions",
-        },
-        {
-            "value": "examples",
-            "label": "📚 Examples",
-            "hint": "Updates or additions to example projects or code samples",
-        },
-        {
-            "value": "logging",
-            "label": "🔍 Logging",
-            "hint": "Logging-related changes or improvements",
-        },
-        {
-            "value": "monitoring",
-            "label": "🔬 Monitoring",
-            "hint": "Updates or additions to monitoring tools and configurations",
-        },
-    ]
-
-    type_completer = WordCompleter([option["value"] for option in type_options])
-    prompt_session = PromptSession(
-        completer=type_completer, style=style, lexer=PygmentsLexer(MarkdownLexer)
-    )
 
-    def get_completions(document, complete_event):
-        """
-        The get_completions function is called when the user presses TAB.
-        It should return a list of completions, each completion being a Completion object.
-        The Completion object has three attributes: text, start_position and display_meta.
-        text is the actual text that will be inserted into the document if this completion is selected by the user.
-        start_position indicates where in the document to insert this completion (0 means right after current word).
-        display_meta can be used to show extra information about this option in your UI.
-
-        :param document: Used to Get the word before the cursor.
-        :param complete_event: Used to Get the current line and column of the cursor.
-        :return: A generator.
-
-        :doc-author: coderj001
-        """
-        word_before_cursor = document.get_word_before_cursor()
-        for option in type_options:
-            if option["value"].startswith(word_before_cursor):
-                yield Completion(
-                    option["value"],
-                    start_position=-len(word_before_cursor),
-                    display=option["value"],
-                    display_meta=option["hint"],
-                )
+@functools.lru_cache(maxsize=None)
+def get_type_completer() -> TypeCompleter:
+    return TypeCompleter()
+
+
+shared_session: Optional[PromptSession] = None
 
-    prompt_session.completer.get_completions = get_completions
 
-    selected_type = prompt_session.prompt(
+def get_prompt_session() -> PromptSession:
+    """
+    The get_prompt_session function returns the PromptSession shared by all the prompts of a run.
+
+    The session, its style and its Markdown lexer are built on the first prompt only. A session is bound
+    to the input and output it was created with, so a new one is built when they change, e.g. in tests.
+
+    :return: The shared PromptSession.
+
+    :doc-author: coderj001
+    """
+    global shared_session
+    app_session = get_app_session()
+    if (
+        shared_session is None
+        or shared_session.app.input is not app_session.input
+        or shared_session.app.output is not app_session.output
+    ):
+        shared_session = PromptSession(
+            style=get_style(), lexer=PygmentsLexer(MarkdownLexer)
+        )
+    return shared_session
+
+
+def configure_session(
+    completer: Optional[Completer] = None,
+    bottom_toolbar: Any = None,
+    refresh_interval: float = 0,
+) -> PromptSession:
+    # The options given to PromptSession.prompt stick to the session, and None there means "unchanged",
+    # so every prompt sets all of them on the shared session instead.
+    session = get_prompt_session()
+    session.completer = completer
+    session.bottom_toolbar = bottom_toolbar
+    session.refresh_interval = refresh_interval
+    return session
+
+
+def git_user_commit_message(
+    suggestions: Optional[Callable[[], List[ICommitMessage]]] = None
+) -> ICommitMessage:
+    """
+    The git_user_commit_message function is a function that prompts the user to enter a commit message.
+    The function uses prompt_toolkit to create an interactive command line interface for the user.
+    The first prompt asks the user to select from one of several options, each with their own label and hint text.
+    Once selected, this option is used as part of the commit subject (e.g., "feat: Add new feature"). The second prompt asks
+    the user for a brief description of what they are committing (e.g., "Add new feature"). Finally, there is an optional
+    prompt where users can add more detailed information about their changes in markdown format.
+    All the prompts share one PromptSession, built with its completion index on the first call.
+
+    :return: A icommitmessage object.
+
+    :doc-author: coderj001
+    """
+    selected_type = configure_session(completer=get_type_completer()).prompt(
         HTML(
             "<b>Select the commit type <style fg='ansiwhite' bg='#00ff44'>[TAB]</style>:</b> "
         )
     )
 
-    commit_type = next(
-        (
-            option["label"]
-            for option in type_options
-            if option["value"] == selected_type
-        ),
-        None,
-    )
+    commit_type = COMMIT_TYPE_LABELS.get(selected_type)
 
-    prompt_session = PromptSession(
-        style=style,
-        lexer=PygmentsLexer(MarkdownLexer),
-    )
+    subject_options: Dict[str, Any] = {}
+    if suggestions is not None:
+
+        def toolbar() -> HTML:
+            ready = len(suggestions())
+            return HTML(
+                "<b>{}</b> AI suggestions ready <style fg='ansiwhite' bg='#00ff44'>[TAB]</style>"
+            ).format(ready)
+
+        # The toolbar is redrawn while the suggestions are generated in the background.
+        subject_options = dict(
+            completer=SuggestionCompleter(suggestions),
+            bottom_toolbar=toolbar,
+            refresh_interval=0.5,
+        )
 
-    commit_subject = prompt_session.prompt(
+    commit_subject = configure_session(**subject_options).prompt(
         HTML(f"<style fg='ansiwhite' bg='#00ff44'>{commit_type}:</style> ")
         if commit_type
-        else "Write a brief title description for commit: "
+        else "Write a brief title description for commit: ",
     )
 
     commit_messages = []
     print_formatted_text(
         HTML("<ansiblue>Description [ENTER to exit or skip]</ansiblue>")
     )
+    prompt_session = configure_session()
     while True:
         msg = prompt_session.prompt(" - ")
         if not msg:
@@ -234,35 +329,150 @@ def get_git_diff_output() -> str:
     return result.stdout
 
 
+def iter_git_diff_lines(args: Optional[List[str]] = None) -> Iterator[str]:
+    """
+    The iter_git_diff_lines function streams the output of a git diff command line by line.
+
+    Instead of buffering the whole diff in memory like get_git_diff_output, the command is started with
+    subprocess.Popen and its stdout pipe is read incrementally. If the consumer stops early, the git process
+    is killed. If git exits with a non zero return code, a CalledProcessError is raised once the output is drained.
+
+    :param args:Optional[List[str]]: Used to Pass extra arguments to `git diff`, defaults to `--staged`.
+    :return: A generator of diff lines.
+
+    :doc-author: coderj001
+    """
+    command = ["git", "diff", *(args if args is not None else ["--staged"])]
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    completed = False
+    try:
+        assert process.stdout is not None
+        yield from process.stdout
+        completed = True
+    finally:
+        if not completed:
+            process.kill()
+        stderr = process.stderr.read() if process.stderr is not None else ""
+        process.wait()
+        if process.stdout is not None:
+            process.stdout.close()
+        if process.stderr is not None:
+            process.stderr.close()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+
+
+def iter_git_diff(args: Optional[List[str]] = None) -> Iterator[DiffFile]:
+    """
+    The iter_git_diff function streams the staged diff as DiffFile records.
+
+    Only one file of the diff is kept in memory at a time, so consumers like the prompt builder can
+    process diffs of any size with a bounded peak memory. The staged diff is read by
+    GitRepository.iter_staged_diff; other diffs are parsed from iter_git_diff_lines.
+
+    :param args:Optional[List[str]]: Used to Pass extra arguments to `git diff`, defaults to `--staged`.
+    :return: A generator of DiffFile objects.
+
+    :doc-author: coderj001
+    """
+    repository = GitRepository.discover() if args is None else None
+    if repository is not None:
+        return repository.iter_staged_diff()
+    return parse_diff(iter_git_diff_lines(args))
+
+
+def read_git_diff(max_length: Optional[int] = None) -> str:
+    """
+    The read_git_diff function reads the staged diff from the stream, stopping once max_length characters are read.
+
+    When the limit is reached the git process is terminated, so the rest of the diff is never read nor decoded.
+
+    :param max_length:Optional[int]: Used to Limit the number of characters returned.
+    :return: The staged diff, truncated to max_length characters.
+
+    :doc-author: coderj001
+    """
+    chunks = []
+    length = 0
+    lines = iter_git_diff_lines()
+    try:
+        for line in lines:
+            if max_length is not None and length + len(line) > max_length:
+                chunks.append(line[: max_length - length])
+                break
+            chunks.append(line)
+            length += len(line)
+    finally:
+        lines.close()
+    return "".join(chunks)
+
+
+def get_compact_git_diff(token_budget: int) -> str:
+    """
+    The get_compact_git_diff function streams the staged diff through compact_diff.
+
+    The diff is never materialized as a whole: lockfiles, generated and binary files are dropped while
+    they are read, and only the trimmed hunks are kept until the token budget is met.
+
+    :param token_budget:int: Used to Set the maximum number of estimated tokens of the diff.
+    :return: The compacted staged diff.
+
+    :doc-author: coderj001
+    """
+    return compact_diff(iter_git_diff(), token_budget)
+
+
+def get_staged_tree_key() -> Optional[str]:
+    """
+    The get_staged_tree_key function identifies the staged changes with the object ids git already computed.
+
+    See GitRepository.staged_tree_key, which this function calls for the repository of the current directory.
+
+    :return: A key of the form `<HEAD tree>..<index tree>`, or None outside a repository or if the index can not be written as a tree.
+
+    :doc-author: coderj001
+    """
+    repository = GitRepository.discover()
+    return repository.staged_tree_key() if repository is not None else None
+
+
 def is_init_git_repository() -> bool:
     """
     The is_init_git_repository function checks if the current directory is a git repository.
-    It does this by calling the `git rev-parse --is-inside-work-tree` command and checking its output.
-    If it returns 0, then we are in a git repository; otherwise, we are not.
+    It does this by looking for the `.git` directory (or file, for worktrees) of the current directory
+    and of its parents with GitRepository.discover, so no git process is started.
 
     :return: True if the current directory is a git repository.
 
     :doc-author: coderj001
     """
-    try:
-        subprocess.check_output(
-            ["git", "rev-parse", "--is-inside-work-tree"], stderr=subprocess.DEVNULL
-        )
-        return True
-    except:
-        return False
+    return GitRepository.discover() is not None
 
 
-def exec_git_commit(commitMessage: ICommitMessage) -> None:
+def exec_git_commit(
+    commitMessage: ICommitMessage, repository: Optional[GitRepository] = None
+) -> None:
     """
     The exec_git_commit function takes a commit message as an argument and writes it to the COMMIT_EDITMSG file.
     It then executes the git commit command with the -F flag, which tells git to use that file as its commit message.
 
     :param commitMessage:ICommitMessage: Used to Specify the type of the parameter.
+    :param repository:Optional[GitRepository]: Used to Commit in the git directory of an existing session.
     :return: Nothing.
 
     :doc-author: coderj001
     """
+    if repository is not None:
+        repository.commit(commitMessage)
+        return
+
     with open("./.git/COMMIT_EDITMSG", "w") as f:
         f.write(f"{commitMessage['subject']}\n\n")
         for i in commitMessage["body"]:
@@ -271,58 +481,263 @@ def exec_git_commit(commitMessage: ICommitMessage) -> None:
     subprocess.check_output(["git", "commit", "-F", "./.git/COMMIT_EDITMSG"])
 
 
-def get_git_status_short_output() -> None:
+def get_git_status_short_output(repository: Optional[GitRepository] = None) -> None:
     """
     The get_git_status_short_output function runs the git status command with the --short and --untracked-files=no flags.
     The output is printed to stdout in a green color.
 
+    :param repository:Optional[GitRepository]: Used to Reuse the status of an existing session.
     :return: The following:.
 
     :doc-author: coderj001
     """
-    result = subprocess.run(
-        ["git", "status", "--short", "--untracked-files=no"],
-        capture_output=True,
-        text=True,
+    if repository is not None:
+        stdout = repository.status_short()
+    else:
+        result = subprocess.run(
+            ["git", "status", "--short", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, result.stderr)
+        stdout = result.stdout
+    print_formatted_text(
+        HTML(
+            "<style fg='ansiwhite' bg='#00ff44'><b>Checking Git Status</b></style>\n<style fg='#42f566'>{}</style>"
+        ).format(stdout)
     )
-    if result.returncode != 0:
-        raise subprocess.CalledProcessError(result.returncode, result.stderr)
+
+
+def confirm_git_commit(
+    commit_message: ICommitMessage, repository: Optional[GitRepository] = None
+) -> None:
+    """
+    The confirm_git_commit function asks the user to confirm the commit before running it.
+
+    :param commit_message:ICommitMessage: Used to Pass the commit message to commit with.
+    :param repository:Optional[GitRepository]: Used to Commit in the repository of an existing session.
+    :return: None.
+
+    :doc-author: coderj001
+    """
+    with tracer.span("ui.confirm", "ui"):
+        checked = prompt(HTML("<b>Want to continue?</b> [y/n]: ")).lower()
+    if checked.startswith("y") or checked == "":
+        exec_git_commit(commit_message, repository)
+    else:
+        print_formatted_text(
+            HTML(
+                "<style fg='ansiwhite' bg='#ff0000'><b>Aborted:</b></style> canceled the commit ."
+            )
+        )
+
+
+def exit_not_git_repository() -> None:
     print_formatted_text(
         HTML(
-            f"<style fg='ansiwhite' bg='#00ff44'><b>Checking Git Status</b></style>\n<style fg='#42f566'>{result.stdout}</style>"
+            "<style fg='ansiwhite' bg='#ff0000'><b>Error:</b></style> Current directory is not a git repository."
         )
     )
 
+    sys.exit(1)
+
 
-def run_command_git_commit() -> None:
+async def aselect_commit_message(
+    candidates: AsyncIterator[ICommitMessage],
+    partials: Optional[Dict[int, str]] = None,
+) -> Optional[ICommitMessage]:
+    """
+    The aselect_commit_message function lets the user pick a commit message while the candidates are still generated.
+
+    Each candidate is printed above the prompt as soon as it arrives, and can be selected by its number right
+    away. The subjects still being streamed are rendered in the bottom toolbar while the model writes them.
+    Once the user answers, the generation of the remaining candidates is cancelled.
+
+    :param candidates:AsyncIterator[ICommitMessage]: Used to Pass the candidates, usually from agenerate_commit_messages.
+    :param partials:Optional[Dict[int, str]]: Used to Read the partial subjects, filled by the on_partial callback.
+    :return: The selected commit message, or None if the user wants to write their own.
+
+    :doc-author: coderj001
+    """
+    received: List[ICommitMessage] = []
+
+    async def consume() -> None:
+        try:
+            async for candidate in candidates:
+                received.append(candidate)
+                print_formatted_text(
+                    HTML("<b>[{}]</b> <ansigreen>{}</ansigreen>").format(
+                        len(received), candidate["subject"]
+                    )
+                )
+                for line in candidate["body"]:
+                    print_formatted_text(HTML("     - {}").format(line))
+        except Exception as error:
+            print_formatted_text(
+                HTML(
+                    "<style fg='ansiwhite' bg='#ff0000'><b>Error:</b></style> {}"
+                ).format(str(error))
+            )
+
+    def toolbar() -> Optional[HTML]:
+        writing = [subject for subject in (partials or {}).values() if subject]
+        if not writing:
+            return None
+        return HTML("<b>Writing:</b> {}").format(" | ".join(writing))
+
+    consumer = asyncio.ensure_future(consume())
+    # The toolbar is redrawn every 100ms, so the subjects are rendered while they are streamed.
+    session = (
+        configure_session(bottom_toolbar=toolbar, refresh_interval=0.1)
+        if partials is not None
+        else configure_session()
+    )
+    try:
+        with patch_stdout(), tracer.span("ui.select", "ui"):
+            while True:
+                answer = (
+                    await session.prompt_async(
+                        HTML(
+                            "<b>Pick a commit message</b> [number, ENTER to write your own]: "
+                        )
+                    )
+                ).strip()
+                if not answer:
+                    return None
+                if answer.isdigit() and 1 <= int(answer) <= len(received):
+                    return received[int(answer) - 1]
+                print_formatted_text(
+                    HTML("<ansired>No suggestion numbered {}</ansired>").format(answer)
+                )
+    finally:
+        consumer.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await consumer
+        aclose = getattr(candidates, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def run_command_ai_git_commit(cache: bool = True) -> None:
+    """
+    The run_command_ai_git_commit function commits the staged changes with a message suggested by the AI.
+        The suggestions are generated by the daemon when one is running, which keeps the config, the caches
+        and the connections warm between runs, and in-process otherwise (see staged_commit_candidates).
+        They are listed as they arrive, and the user can pick one of them or fall back to writing the
+        commit message with git_user_commit_message.
+
+    :param cache:bool: Used to Reuse the suggestions already generated for the same staged diff.
+    :return: None.
+
+    :doc-author: coderj001
+    """
+    from ai_git_commit.config import get_config
+    from ai_git_commit.daemon import DaemonUnavailable, adaemon_commit_candidates
+
+    config = get_config()
+    repository = GitRepository.discover(native=config["git_backend"] == "native")
+    if repository is None:
+        exit_not_git_repository()
+        return
+
+    get_git_status_short_output(repository)
+    partials: Dict[int, str] = {}
+
+    async def select() -> Optional[ICommitMessage]:
+        try:
+            candidates = await adaemon_commit_candidates(cache, partials)
+        except DaemonUnavailable:
+            candidates = local_commit_candidates(repository, config, cache, partials)
+        return await aselect_commit_message(candidates, partials)
+
+    try:
+        commit_message = asyncio.run(select())
+    except ValueError as error:
+        print_formatted_text(
+            HTML("<style fg='ansiwhite' bg='#ff0000'><b>Error:</b></style> {}").format(
+                str(error)
+            )
+        )
+        sys.exit(1)
+    if commit_message is None:
+        with tracer.span("ui.write_message", "ui"):
+            commit_message = git_user_commit_message()
+    confirm_git_commit(commit_message, repository)
+
+
+def local_commit_candidates(
+    repository: GitRepository,
+    config: Dict,
+    cache: bool,
+    partials: Dict[int, str],
+) -> AsyncIterator[ICommitMessage]:
+    # The in-process fallback of the daemon: the providers are only imported when no daemon answers.
+    from ai_git_commit.cache import DiskCache
+    from ai_git_commit.openai import staged_commit_candidates
+    from ai_git_commit.providers import get_provider
+    from ai_git_commit.retry import get_retrier
+
+    return staged_commit_candidates(
+        repository,
+        config,
+        cache=DiskCache() if cache else None,
+        provider=get_provider(config),
+        retrier=get_retrier(config),
+        on_partial=partials.__setitem__,
+    )
+
+
+def run_command_git_commit(
+    config: Optional[Dict] = None, cache: bool = True, prefetch: bool = True
+) -> None:
     """
     The run_command_git_commit function is used to commit the changes in the current directory.
         It first checks if there is a git repository initialized in the current directory, and then it gets
         all of the files that have been modified or added since last commit. Then it asks for a user inputted
         message to be used as a commit message, and finally commits all of those changes with that message.
+        When a valid config is given, the AI suggestions are generated in the background while the user is
+        prompted, and offered as completions of the subject. The generation is cancelled once the message
+        is written, or if the user aborts.
 
+    :param config:Optional[Dict]: Used to Select the provider of the suggestions, none being generated without it.
+    :param cache:bool: Used to Reuse the suggestions already generated for the same staged diff.
+    :param prefetch:bool: Used to Generate the AI suggestions while the user is prompted.
     :return: None.
 
     :doc-author: coderj001
     """
-    if is_init_git_repository():
-        get_git_status_short_output()
-        commit_message = git_user_commit_message()
-
-        checked = prompt(HTML("<b>Want to continue?</b> [y/n]: ")).lower()
-        if checked.startswith("y") or checked == "":
-            exec_git_commit(commit_message)
-        else:
-            print_formatted_text(
-                HTML(
-                    "<style fg='ansiwhite' bg='#ff0000'><b>Aborted:</b></style> canceled the commit ."
+    repository = GitRepository.discover()
+    if repository is not None:
+        suggestions = (
+            start_prefetch(repository, config, cache)
+            if prefetch and config is not None
+            else None
+        )
+        get_git_status_short_output(repository)
+        try:
+            with tracer.span("ui.write_message", "ui"):
+                commit_message = git_user_commit_message(
+                    suggestions.ready if suggestions is not None else None
                 )
-            )
+        finally:
+            if suggestions is not None:
+                suggestions.cancel()
+        confirm_git_commit(commit_message, repository)
     else:
-        print_formatted_text(
-            HTML(
-                "<style fg='ansiwhite' bg='#ff0000'><b>Error:</b></style> Current directory is not a git repository."
-            )
-        )
+        exit_not_git_repository()
 
-        sys.exit(1)
+
+def start_prefetch(
+    repository: GitRepository, config: Dict, cache: bool = True
+) -> Prefetch:
+    # Speculatively start the generation, from the daemon if one is running.
+    from ai_git_commit.daemon import DaemonUnavailable, adaemon_commit_candidates
+
+    async def start() -> AsyncIterator[ICommitMessage]:
+        try:
+            return await adaemon_commit_candidates(cache)
+        except DaemonUnavailable:
+            return local_commit_candidates(repository, config, cache, {})
+
+    return Prefetch(start)
@@ -0,0 +1,772 @@
+import difflib
+import hashlib
+import mmap
+import os
+import stat
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from ai_git_commit.repository import EMPTY_TREE, FileStatus, StagedFile
+
+NULL_ID = "0" * 40
+OBJECT_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+OFS_DELTA = 6
+REF_DELTA = 7
+GITLINK_MODE = 0o160000
+BINARY_CHECK_SIZE = 8000
+FUNCNAME_SIZE = 80
+# ctime and dev/ino/uid/gid are skipped: only the mtime, mode, size, id and flags of an entry are used.
+INDEX_ENTRY = struct.Struct(">8xII8xI8xI20sH")
+# Config keys and attributes changing the output of `git diff` or how files are compared to the work tree.
+DIFF_CONFIG_PREFIXES = ("diff.",)
+FILTER_CONFIG_PREFIXES = ("filter.", "core.autocrlf", "core.eol", "core.safecrlf")
+DIFF_ATTRIBUTES = (b"diff", b"binary")
+FILTER_ATTRIBUTES = (b"text", b"eol", b"crlf", b"filter", b"ident", b"binary")
+
+
+class UnsupportedRepository(Exception):
+    """Raised when the repository uses a feature the pure-Python reader does not implement."""
+
+
+class IndexEntry(NamedTuple):
+    """An entry of `.git/index`: the staged blob of a path and the stat data of its work tree file."""
+
+    path: str
+    mode: int
+    sha: str
+    size: int
+    mtime: int
+    flags: int
+
+
+def read_index(path: Path) -> Tuple[List[IndexEntry], int]:
+    """
+    The read_index function reads the entries of a version 2 or 3 `.git/index` file.
+
+    :param path:Path: Used to Pass the path of the index file.
+    :return: The entries, sorted by path, and the modification time of the index file in nanoseconds.
+
+    :doc-author: coderj001
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+    except FileNotFoundError:
+        return [], 0
+    if data[:4] != b"DIRC":
+        raise UnsupportedRepository("Invalid index signature")
+    version, count = struct.unpack_from(">II", data, 4)
+    if version not in (2, 3):
+        raise UnsupportedRepository(f"Index version {version}")
+
+    entries = []
+    offset = 12
+    for _ in range(count):
+        (mtime_s, mtime_ns, mode, size, sha, flags) = INDEX_ENTRY.unpack_from(
+            data, offset
+        )
+        name_offset = offset + 62
+        if flags & 0x4000:
+            (extended,) = struct.unpack_from(">H", data, name_offset)
+            if extended & 0x2000:
+                raise UnsupportedRepository("Intent-to-add entries")
+            name_offset += 2
+        if flags & 0x3000:
+            raise UnsupportedRepository("Unmerged entries")
+        end = data.index(b"\0", name_offset)
+        entries.append(
+            IndexEntry(
+                data[name_offset:end].decode("utf-8", errors="surrogateescape"),
+                mode,
+                sha.hex(),
+                size,
+                mtime_s * 1_000_000_000 + mtime_ns,
+                flags,
+            )
+        )
+        # Entries are padded with 1 to 8 NUL bytes to a multiple of 8 bytes.
+        offset += (end - offset + 8) & ~7
+
+    while offset + 8 <= len(data) - 20:
+        signature = data[offset : offset + 4]
+        (length,) = struct.unpack_from(">I", data, offset + 4)
+        if signature in (b"link", b"sdir"):
+            raise UnsupportedRepository("Split or sparse index")
+        offset += 8 + length
+    return entries, mtime
+
+
+def read_git_config(paths: Iterable[Path]) -> Dict[str, str]:
+    """
+    The read_git_config function reads the `key = value` pairs of git config files.
+
+    The keys are returned as `section.key` (or `section.subsection.key`), lowercased like git does, and
+    the files listed later override the earlier ones. Include directives are not followed.
+
+    :param paths:Iterable[Path]: Used to Pass the config files, from the least to the most specific.
+    :return: A dictionary of config values.
+
+    :doc-author: coderj001
+    """
+    config: Dict[str, str] = {}
+    for path in paths:
+        try:
+            lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
+        except OSError:
+            continue
+        section = ""
+        for line in lines:
+            line = line.strip()
+            if not line or line[0] in "#;":
+                continue
+            if line.startswith("["):
+                name, _, subsection = line[1 : line.index("]")].partition(" ")
+                section = name.lower()
+                if subsection:
+                    section += "." + subsection.strip('"')
+                continue
+            key, _, value = line.partition("=")
+            config[f"{section}.{key.strip().lower()}"] = value.strip().strip('"')
+    return config
+
+
+def object_id(type_: str, data: bytes) -> str:
+    return hashlib.sha1(b"%s %d\0" % (type_.encode(), len(data)) + data).hexdigest()
+
+
+def tree_ids(entries: Iterable[Tuple[str, int, str]]) -> Dict[str, str]:
+    """
+    The tree_ids function computes the ids `git write-tree` would give to the trees of the given entries.
+
+    :param entries:Iterable[Tuple[str, int, str]]: Used to Pass the (path, mode, blob id) of each file.
+    :return: A dictionary of the tree ids by directory, `""` being the root and `"src/"` a subdirectory.
+
+    :doc-author: coderj001
+    """
+    root: Dict[str, object] = {}
+    for path, mode, sha in entries:
+        node = root
+        *directories, name = path.split("/")
+        for directory in directories:
+            node = node.setdefault(directory, {})  # type: ignore[assignment]
+        node[name] = (mode, sha)
+
+    ids: Dict[str, str] = {}
+
+    def hash_tree(node: Dict[str, object], prefix: str) -> str:
+        items = []
+        for name, value in node.items():
+            if isinstance(value, dict):
+                subtree = hash_tree(value, f"{prefix}{name}/")
+                items.append((name + "/", b"40000", name, subtree))
+            else:
+                mode, sha = value  # type: ignore[misc]
+                items.append((name, b"%o" % mode, name, sha))
+        # Trees sort their subtrees as if their names ended with a slash.
+        items.sort(key=lambda item: item[0].encode("utf-8", "surrogateescape"))
+        ids[prefix] = object_id(
+            "tree",
+            b"".join(
+                mode
+                + b" "
+                + name.encode("utf-8", "surrogateescape")
+                + b"\0"
+                + bytes.fromhex(sha)
+                for _, mode, name, sha in items
+            ),
+        )
+        return ids[prefix]
+
+    hash_tree(root, "")
+    return ids
+
+
+def tree_id(entries: Iterable[Tuple[str, int, str]]) -> str:
+    return tree_ids(entries)[""]
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    def varint(position: int) -> Tuple[int, int]:
+        value = shift = 0
+        while True:
+            byte = delta[position]
+            position += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                return value, position
+
+    _, position = varint(0)
+    size, position = varint(position)
+    result = bytearray()
+    while position < len(delta):
+        opcode = delta[position]
+        position += 1
+        if opcode & 0x80:
+            offset = length = 0
+            for bit in range(4):
+                if opcode & (1 << bit):
+                    offset |= delta[position] << (8 * bit)
+                    position += 1
+            for bit in range(3):
+                if opcode & (0x10 << bit):
+                    length |= delta[position] << (8 * bit)
+                    position += 1
+            result += base[offset : offset + (length or 0x10000)]
+        elif opcode:
+            result += delta[position : position + opcode]
+            position += opcode
+        else:
+            raise UnsupportedRepository("Invalid delta opcode")
+    if len(result) != size:
+        raise UnsupportedRepository("Invalid delta size")
+    return bytes(result)
+
+
+class PackFile:
+    """A `.pack` file and its version 2 `.idx`, both mapped in memory."""
+
+    def __init__(self, idx_path: Path) -> None:
+        self.idx_path = idx_path
+        with open(idx_path, "rb") as f:
+            self.idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(idx_path.with_suffix(".pack"), "rb") as f:
+            self.pack = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.idx[:8] != b"\377tOc\0\0\0\2":
+            self.close()
+            raise UnsupportedRepository(f"Pack index version of {idx_path.name}")
+        self.count = struct.unpack_from(">I", self.idx, 8 + 255 * 4)[0]
+
+    def find(self, sha: bytes) -> Optional[int]:
+        first = sha[0]
+        low = struct.unpack_from(">I", self.idx, 8 + (first - 1) * 4)[0] if first else 0
+        high = struct.unpack_from(">I", self.idx, 8 + first * 4)[0]
+        names = 8 + 256 * 4
+        while low < high:
+            middle = (low + high) // 2
+            name = self.idx[names + middle * 20 : names + middle * 20 + 20]
+            if name < sha:
+                low = middle + 1
+            elif name > sha:
+                high = middle
+            else:
+                offsets = names + self.count * 24
+                (offset,) = struct.unpack_from(">I", self.idx, offsets + middle * 4)
+                if offset & 0x80000000:
+                    large = offsets + self.count * 4 + (offset & 0x7FFFFFFF) * 8
+                    (offset,) = struct.unpack_from(">Q", self.idx, large)
+                return offset
+        return None
+
+    def read(self, offset: int, store: "ObjectStore") -> Tuple[str, bytes]:
+        byte = self.pack[offset]
+        type_ = (byte >> 4) & 7
+        position = offset + 1
+        while byte & 0x80:
+            byte = self.pack[position]
+            position += 1
+
+        if type_ == OFS_DELTA:
+            byte = self.pack[position]
+            position += 1
+            distance = byte & 0x7F
+            while byte & 0x80:
+                byte = self.pack[position]
+                position += 1
+                distance = ((distance + 1) << 7) | (byte & 0x7F)
+            base_type, base = self.read(offset - distance, store)
+            return base_type, apply_delta(base, self.inflate(position))
+        if type_ == REF_DELTA:
+            base_id = self.pack[position : position + 20].hex()
+            base_type, base = store.read(base_id)
+            return base_type, apply_delta(base, self.inflate(position + 20))
+        if type_ not in OBJECT_TYPES:
+            raise UnsupportedRepository(f"Pack object type {type_}")
+        return OBJECT_TYPES[type_], self.inflate(position)
+
+    def inflate(self, position: int) -> bytes:
+        # The compressed size is not stored, so the stream is fed through the mapping until it ends.
+        decompressor = zlib.decompressobj()
+        view = memoryview(self.pack)
+        chunks = []
+        try:
+            while not decompressor.eof and position < len(view):
+                chunks.append(
+                    decompressor.decompress(view[position : position + 65536])
+                )
+                position += 65536
+        finally:
+            view.release()
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        self.idx.close()
+        self.pack.close()
+
+
+class ObjectStore:
+    """The loose and packed objects of an `objects` directory."""
+
+    def __init__(self, objects_dir: Path) -> None:
+        self.objects_dir = objects_dir
+        if (objects_dir / "info" / "alternates").exists():
+            raise UnsupportedRepository("Alternate object directories")
+        self.packs = [
+            PackFile(path) for path in sorted((objects_dir / "pack").glob("*.idx"))
+        ]
+
+    def read(self, sha: str) -> Tuple[str, bytes]:
+        path = self.objects_dir / sha[:2] / sha[2:]
+        try:
+            with open(path, "rb") as f:
+                raw = zlib.decompress(f.read())
+        except FileNotFoundError:
+            pass
+        else:
+            header, _, data = raw.partition(b"\0")
+            return header.split(b" ", 1)[0].decode(), data
+
+        binary = bytes.fromhex(sha)
+        for pack in self.packs:
+            offset = pack.find(binary)
+            if offset is not None:
+                return pack.read(offset, self)
+        raise UnsupportedRepository(f"Object {sha} not found")
+
+    def close(self) -> None:
+        for pack in self.packs:
+            pack.close()
+        self.packs = []
+
+
+def split_lines(data: bytes) -> List[str]:
+    lines = [line + "\n" for line in data.decode("utf-8", errors="replace").split("\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def funcname(lines: List[str], start: int) -> str:
+    # Like git without a diff driver: the closest line above the hunk starting with a letter, `_` or `$`.
+    for line in reversed(lines[:start]):
+        if line[:1].isalpha() or line[:1] in "_$":
+            return " " + line.rstrip()[:FUNCNAME_SIZE].rstrip()
+    return ""
+
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def diff_opcodes(a: List[str], b: List[str]) -> List[Opcode]:
+    # Like xdiff in git, the common head and tail are skipped before matching the lines in between,
+    # which keeps SequenceMatcher away from the unchanged bulk of the file.
+    limit = min(len(a), len(b))
+    prefix = 0
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    opcodes: List[Opcode] = [("equal", 0, prefix, 0, prefix)] if prefix else []
+    matcher = difflib.SequenceMatcher(
+        None, a[prefix : len(a) - suffix], b[prefix : len(b) - suffix], autojunk=False
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if i1 != i2 or j1 != j2:
+            opcodes.append((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix))
+    if suffix:
+        opcodes.append(("equal", len(a) - suffix, len(a), len(b) - suffix, len(b)))
+    return opcodes
+
+
+def group_opcodes(opcodes: List[Opcode], context: int) -> Iterator[List[Opcode]]:
+    # The grouping of SequenceMatcher.get_grouped_opcodes, for opcodes computed by diff_opcodes.
+    if not any(opcode[0] != "equal" for opcode in opcodes):
+        return
+    codes = list(opcodes)
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context and group:
+            group.append((tag, i1, i1 + context, j1, j1 + context))
+            yield group
+            group = []
+            i1, j1 = i2 - context, j2 - context
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def unified_diff(old: bytes, new: bytes, context: int = 3) -> Iterator[str]:
+    """
+    The unified_diff function yields the hunks of the diff between two blobs, in the format of `git diff`.
+
+    :param old:bytes: Used to Pass the content of the blob before the change.
+    :param new:bytes: Used to Pass the content of the blob after the change.
+    :param context:int: Used to Set the number of unchanged lines around each change.
+    :return: A generator of hunk header and hunk lines.
+
+    :doc-author: coderj001
+    """
+    a, b = split_lines(old), split_lines(new)
+    for group in group_opcodes(diff_opcodes(a, b), context):
+        first, last = group[0], group[-1]
+        old_start, old_length = first[1], last[2] - first[1]
+        new_start, new_length = first[3], last[4] - first[3]
+        yield (
+            f"@@ -{hunk_range(old_start, old_length)} "
+            f"+{hunk_range(new_start, new_length)} @@{funcname(a, old_start)}\n"
+        )
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                yield from diff_lines(" ", a[i1:i2])
+                continue
+            yield from diff_lines("-", a[i1:i2])
+            yield from diff_lines("+", b[j1:j2])
+
+
+def hunk_range(start: int, length: int) -> str:
+    if length == 1:
+        return str(start + 1)
+    return f"{start + 1 if length else start},{length}"
+
+
+def diff_lines(prefix: str, lines: List[str]) -> Iterator[str]:
+    for line in lines:
+        if line.endswith("\n"):
+            yield prefix + line
+        else:
+            yield prefix + line + "\n\\ No newline at end of file\n"
+
+
+def is_binary(data: bytes) -> bool:
+    return b"\0" in data[:BINARY_CHECK_SIZE]
+
+
+def needs_quoting(path: str) -> bool:
+    return any(not " " <= char <= "~" or char in '"\\' for char in path)
+
+
+class NativeRepository:
+    """
+    Reads the staged changes of a repository from `.git/index` and the object database, without running git.
+
+    Every method raises UnsupportedRepository when the repository relies on a feature it does not implement
+    (index version 4, split or sparse index, conflicts, submodules, alternates, diff or filter attributes,
+    inexact renames, ...), so that the caller can fall back to running git.
+    """
+
+    def __init__(self, worktree: Path, git_dir: Path) -> None:
+        self.worktree = worktree
+        self.git_dir = git_dir
+        self.root = os.path.join(worktree, "")
+        common = git_dir / "commondir"
+        self.common_dir = (
+            (git_dir / common.read_text().strip()).resolve()
+            if common.is_file()
+            else git_dir
+        )
+        self.config = read_git_config(
+            [
+                Path("/etc/gitconfig"),
+                Path(
+                    os.environ.get("XDG_CONFIG_HOME")
+                    or os.path.join(os.path.expanduser("~"), ".config")
+                )
+                / "git"
+                / "config",
+                Path(os.path.expanduser("~")) / ".gitconfig",
+                self.common_dir / "config",
+            ]
+        )
+        if self.config.get("extensions.objectformat", "sha1") != "sha1":
+            raise UnsupportedRepository("Object format")
+        self.filemode = self.config.get("core.filemode", "true").lower() != "false"
+        self.store = ObjectStore(self.common_dir / "objects")
+        self._index: Optional[Tuple[List[IndexEntry], int]] = None
+        self._head: Optional[Dict[str, Tuple[int, str]]] = None
+        self._trees: Optional[Dict[str, str]] = None
+        self._head_tree: Optional[str] = None
+        self._skipped: Set[str] = set()
+        self._staged: Optional[List[StagedFile]] = None
+
+    def close(self) -> None:
+        self.store.close()
+
+    def index(self) -> List[IndexEntry]:
+        if self._index is None:
+            self._index = read_index(self.git_dir / "index")
+            if any(entry.mode == GITLINK_MODE for entry in self._index[0]):
+                raise UnsupportedRepository("Submodules")
+        return self._index[0]
+
+    def resolve_ref(self, ref: str) -> Optional[str]:
+        for _ in range(5):
+            if not ref.startswith("ref:"):
+                return ref
+            name = ref[4:].strip()
+            for directory in (self.git_dir, self.common_dir):
+                path = directory / name
+                if path.is_file():
+                    ref = path.read_text().strip()
+                    break
+            else:
+                return self.packed_ref(name)
+        raise UnsupportedRepository("Too many symbolic refs")
+
+    def packed_ref(self, name: str) -> Optional[str]:
+        try:
+            lines = (self.common_dir / "packed-refs").read_text().splitlines()
+        except FileNotFoundError:
+            return None
+        for line in lines:
+            sha, _, ref = line.partition(" ")
+            if ref == name:
+                return sha
+        return None
+
+    def head_tree(self) -> Optional[str]:
+        if self._head_tree is None:
+            commit = self.resolve_ref((self.git_dir / "HEAD").read_text().strip())
+            if commit is None:
+                return None
+            type_, data = self.store.read(commit)
+            if type_ != "commit" or not data.startswith(b"tree "):
+                raise UnsupportedRepository("HEAD is not a commit")
+            self._head_tree = data[5:45].decode()
+        return self._head_tree
+
+    def index_trees(self) -> Dict[str, str]:
+        if self._trees is None:
+            self._trees = tree_ids(
+                (entry.path, entry.mode, entry.sha) for entry in self.index()
+            )
+        return self._trees
+
+    def read_tree(
+        self, sha: str, prefix: str = "", skip: Optional[Dict[str, str]] = None
+    ) -> Iterator[Tuple[str, int, str]]:
+        _, data = self.store.read(sha)
+        position = 0
+        while position < len(data):
+            space = data.index(b" ", position)
+            nul = data.index(b"\0", space)
+            mode = int(data[position:space], 8)
+            name = data[space + 1 : nul].decode("utf-8", errors="surrogateescape")
+            entry_id = data[nul + 1 : nul + 21].hex()
+            position = nul + 21
+            if mode != 0o40000:
+                yield f"{prefix}{name}", mode, entry_id
+            elif skip is not None and skip.get(f"{prefix}{name}/") == entry_id:
+                self._skipped.add(f"{prefix}{name}/")
+            else:
+                yield from self.read_tree(entry_id, f"{prefix}{name}/", skip)
+
+    def head(self) -> Dict[str, Tuple[int, str]]:
+        # A subtree with the same id in HEAD and in the index holds the same files, so it is not read
+        # and its directory is added to _skipped instead.
+        if self._head is None:
+            tree = self.head_tree()
+            trees = self.index_trees()
+            if tree == trees[""]:
+                self._skipped.add("")
+            self._head = {
+                path: (mode, sha)
+                for path, mode, sha in (
+                    self.read_tree(tree, skip=trees)
+                    if tree and tree != trees[""]
+                    else ()
+                )
+            }
+        return self._head
+
+    def is_skipped(self, path: str) -> bool:
+        if "" in self._skipped:
+            return True
+        position = path.find("/")
+        while position != -1:
+            if path[: position + 1] in self._skipped:
+                return True
+            position = path.find("/", position + 1)
+        return False
+
+    def staged_files(self) -> List[StagedFile]:
+        """Compare the HEAD tree with the index, like `git diff --staged --raw`."""
+        if self._staged is not None:
+            return self._staged
+        head = self.head()
+        index = {
+            entry.path: entry
+            for entry in self.index()
+            if entry.path in head or not self.is_skipped(entry.path)
+        }
+        changes: Dict[str, StagedFile] = {}
+        for path in sorted(head.keys() | index.keys()):
+            old_mode, old_sha = head.get(path, (0, NULL_ID))
+            entry = index.get(path)
+            new_mode, new_sha = (entry.mode, entry.sha) if entry else (0, NULL_ID)
+            if (old_mode, old_sha) == (new_mode, new_sha):
+                continue
+            if old_mode == GITLINK_MODE:
+                raise UnsupportedRepository("Submodules")
+            status = "A" if not old_mode else "D" if not new_mode else "M"
+            if old_mode and new_mode and (old_mode ^ new_mode) & 0o170000:
+                status = "T"
+            changes[path] = StagedFile(
+                status, path, f"{old_mode:06o}", f"{new_mode:06o}", old_sha, new_sha
+            )
+
+        # Pair the deleted and added paths with the same content as exact renames, and leave the
+        # similarity based rename detection to git.
+        deleted = {
+            change.old_blob: change
+            for change in changes.values()
+            if change.status == "D"
+        }
+        for change in list(changes.values()):
+            source = (
+                deleted.pop(change.new_blob, None) if change.status == "A" else None
+            )
+            if source is not None:
+                del changes[source.path]
+                changes[change.path] = change._replace(
+                    status="R",
+                    old_mode=source.old_mode,
+                    old_blob=source.old_blob,
+                    old_path=source.path,
+                )
+        statuses = {change.status for change in changes.values()}
+        if "A" in statuses and "D" in statuses:
+            raise UnsupportedRepository("Possible inexact renames")
+        if any(needs_quoting(path) for path in changes):
+            raise UnsupportedRepository("Paths quoted by git")
+        self._staged = [changes[path] for path in sorted(changes)]
+        return self._staged
+
+    def attributes(self) -> bytes:
+        paths = [self.common_dir / "info" / "attributes"]
+        paths += [
+            self.worktree / entry.path
+            for entry in self.index()
+            if entry.path.rsplit("/", 1)[-1] == ".gitattributes"
+        ]
+        attributes_file = self.config.get("core.attributesfile")
+        if attributes_file:
+            paths.append(Path(os.path.expanduser(attributes_file)))
+        content = b""
+        for path in paths:
+            try:
+                content += path.read_bytes()
+            except OSError:
+                continue
+        return content
+
+    def check_diff_options(self) -> None:
+        if any(key.startswith(DIFF_CONFIG_PREFIXES) for key in self.config):
+            raise UnsupportedRepository("Diff config")
+        if any(attribute in self.attributes() for attribute in DIFF_ATTRIBUTES):
+            raise UnsupportedRepository("Diff attributes")
+
+    def iter_staged_diff_lines(self) -> Iterator[str]:
+        """Yield the lines of `git diff --staged --full-index` for the staged files."""
+        self.check_diff_options()
+        for change in self.staged_files():
+            yield from self.diff_file(change)
+
+    def blob(self, sha: str) -> bytes:
+        return b"" if sha == NULL_ID else self.store.read(sha)[1]
+
+    def diff_file(self, change: StagedFile) -> Iterator[str]:
+        old_path = change.old_path or change.path
+        yield f"diff --git a/{old_path} b/{change.path}\n"
+        if change.status == "A":
+            yield f"new file mode {change.new_mode}\n"
+        elif change.status == "D":
+            yield f"deleted file mode {change.old_mode}\n"
+        elif change.old_mode != change.new_mode:
+            yield f"old mode {change.old_mode}\nnew mode {change.new_mode}\n"
+        if change.status == "R":
+            yield f"similarity index 100%\nrename from {old_path}\nrename to {change.path}\n"
+            if change.old_blob == change.new_blob:
+                return
+        mode = f" {change.new_mode}" if change.old_mode == change.new_mode else ""
+        yield f"index {change.old_blob}..{change.new_blob}{mode}\n"
+
+        old, new = self.blob(change.old_blob), self.blob(change.new_blob)
+        source = "/dev/null" if change.status == "A" else f"a/{old_path}"
+        target = "/dev/null" if change.status == "D" else f"b/{change.path}"
+        if is_binary(old) or is_binary(new):
+            yield f"Binary files {source} and {target} differ\n"
+            return
+        if not old and not new:
+            return
+        yield f"--- {source}\n+++ {target}\n"
+        yield from unified_diff(old, new)
+
+    def staged_tree_key(self) -> str:
+        return f"{self.head_tree() or EMPTY_TREE}..{self.index_trees()['']}"
+
+    def status(self) -> List[FileStatus]:
+        """Compare HEAD, the index and the work tree, like `git status --porcelain --untracked-files=no`."""
+        staged = {change.path: change for change in self.staged_files()}
+        entries, index_mtime = self._index or (self.index(), 0)
+        modified = {}
+        for entry in entries:
+            worktree_status = self.worktree_status(entry, index_mtime)
+            if worktree_status != " ":
+                modified[entry.path] = worktree_status
+
+        statuses = []
+        for path in sorted(staged.keys() | modified.keys()):
+            change = staged.get(path)
+            statuses.append(
+                FileStatus(
+                    change.status if change else " ",
+                    modified.get(path, " "),
+                    path,
+                    change.old_path if change else None,
+                )
+            )
+        return statuses
+
+    def worktree_status(self, entry: IndexEntry, index_mtime: int) -> str:
+        if entry.flags & 0x8000:
+            # Entries marked with `git update-index --assume-unchanged` are never compared.
+            return " "
+        try:
+            info = os.lstat(self.root + entry.path)
+        except FileNotFoundError:
+            return "D"
+        if stat.S_IFMT(info.st_mode) != stat.S_IFMT(entry.mode):
+            return "T"
+        if self.filemode and stat.S_ISREG(info.st_mode):
+            if bool(info.st_mode & stat.S_IXUSR) != bool(entry.mode & stat.S_IXUSR):
+                return "M"
+        if info.st_size != entry.size:
+            return "M"
+        # A file written in the same instant as the index may have changed after it was staged.
+        if info.st_mtime_ns == entry.mtime and entry.mtime < index_mtime:
+            return " "
+        self.check_filters()
+        path = self.root + entry.path
+        if stat.S_ISLNK(info.st_mode):
+            data = os.fsencode(os.readlink(path))
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+        return " " if object_id("blob", data) == entry.sha else "M"
+
+    def check_filters(self) -> None:
+        if any(key.startswith(FILTER_CONFIG_PREFIXES) for key in self.config):
+            raise UnsupportedRepository("Filter config")
+        if any(attribute in self.attributes() for attribute in FILTER_ATTRIBUTES):
+            raise UnsupportedRepository("Filter attributes")
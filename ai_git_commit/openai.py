@@ -1,11 +1,42 @@
-from typing import List
-
-import openai
+import asyncio
+import json
+import re
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
+from ai_git_commit.cache import DiskCache, cache_key, normalize_diff
+from ai_git_commit.compact import compact_diff, estimate_tokens, split_diff
 from ai_git_commit.config import ICommitMessage
-from ai_git_commit.prompts import prompts
+from ai_git_commit.diff import parse_diff
+from ai_git_commit.prompts import (
+    DEFAULT_PROMPT_ID,
+    get_prompt,
+    reduce_prompt,
+    summarize_prompt,
+)
+from ai_git_commit.providers import OpenAIProvider, Provider
+from ai_git_commit.repository import GitRepository
+from ai_git_commit.retry import Retrier, RetryPolicy
+from ai_git_commit.trace import tracer
 
-openai.api_key = ""
+PromptVariant = Tuple[int, str]
+# Called with the index of a variant and the subject it is writing, or "" once the variant is done.
+PartialCallback = Callable[[int, str], None]
+# The value of a "subject" key, possibly cut by the end of the streamed text so far.
+PARTIAL_SUBJECT = re.compile(r'"subject"\s*:\s*"((?:[^"\\]|\\.)*)')
+INCOMPLETE_ESCAPE = re.compile(r"\\(u[0-9a-fA-F]{0,3})?$")
+# An array of messages, as opposed to the brackets of the prose some models write before the JSON.
+JSON_START = re.compile(r'\[\s*[{"]')
 
 
 def generate_commit_messages(
@@ -15,17 +46,658 @@ def generate_commit_messages(
     max_tokens: int = 1024,
     max_retries: int = 3,
     retry_delay: int = 500,
-):
+    max_diff_tokens: Optional[int] = None,
+    locale: str = "en",
+    cache: Optional[DiskCache] = None,
+    provider: Optional[Provider] = None,
+    retrier: Optional[Retrier] = None,
+    prompt_id: int = DEFAULT_PROMPT_ID,
+) -> str:
     if len(diff) == 0:
         raise ValueError("No diff provided")
 
-    selected_prompt = prompts[5]
-    prompt = selected_prompt["prompt"](
-        diff=diff, num_of_commit_messages=num_of_commit_messages
+    provider = provider or OpenAIProvider()
+    selected_prompt = get_prompt(prompt_id, locale)
+    key = cache_key(
+        normalize_diff(diff),
+        selected_prompt.id,
+        provider.name,
+        model,
+        locale,
+        num_of_commit_messages,
+        max_diff_tokens,
     )
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    if max_diff_tokens is not None:
+        diff = compact_diff(parse_diff(diff.splitlines(keepends=True)), max_diff_tokens)
 
-    for current_retry in range(max_retries, 0, -1):
-        response = openai.Completion.create(
-            engine=model, prompt=prompt, max_tokens=max_tokens, temperature=0.35
+    with tracer.span("prompt.build", "prompt", prompt_id=selected_prompt.id):
+        prompt = selected_prompt.render(
+            diff=diff, num_of_commit_message=num_of_commit_messages
         )
-        return response
+
+    retrier = retrier or Retrier(
+        RetryPolicy(max_attempts=1 + max_retries, base_delay=retry_delay / 1000)
+    )
+
+    def attempt() -> str:
+        with tracer.span(
+            "model.attempt", "model", model=model, prompt_tokens=estimate_tokens(prompt)
+        ) as span:
+            text = provider.complete(prompt, model, max_tokens)
+            span["completion_tokens"] = estimate_tokens(text)
+        return text
+
+    text = retrier.call(attempt)
+    if cache is not None:
+        cache.set(key, text)
+    return text
+
+
+def to_commit_message(index: int, message: Any) -> Optional[ICommitMessage]:
+    if isinstance(message, str):
+        return ICommitMessage(id=index, subject=message, body=[])
+    if not isinstance(message, dict) or not message.get("subject"):
+        return None
+    body = message.get("body") or []
+    if isinstance(body, str):
+        body = [line.strip(" -") for line in body.splitlines() if line.strip(" -")]
+    return ICommitMessage(
+        id=index,
+        subject=str(message["subject"]).strip(),
+        body=[str(line) for line in body],
+    )
+
+
+def repair_json(text: str) -> str:
+    """
+    The repair_json function turns the JSON of a model response into valid JSON, in a single pass.
+
+    The models do not always answer with the bare JSON the prompts ask for: the prose and Markdown fences
+    around the first object or array are dropped, the trailing commas the prompt examples show are removed,
+    and raw newlines in strings are escaped. A truncated response, e.g. cut by max_tokens, is cut back to
+    its last complete value and closed, so a message whose subject was cut is not returned half written.
+
+    :param text:str: Used to Pass the response of the model.
+    :return: The repaired JSON, or an empty string if the response has no object nor array.
+
+    :doc-author: coderj001
+    """
+    array = JSON_START.search(text)
+    starts = [
+        index
+        for index in (text.find("{"), array.start() if array else -1)
+        if index != -1
+    ]
+    if not starts:
+        return ""
+    out: List[str] = []
+    closers: List[str] = []
+    # Where to cut a truncated response: the end of the last complete value, and what is open there.
+    safe: Tuple[int, List[str]] = (0, [])
+    in_string = escaped = False
+    for char in text[min(starts) :]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            out.append(char)
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+            out.append(char)
+        elif char in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            out.append(closers.pop())
+            if not closers:
+                return "".join(out)
+            safe = (len(out), list(closers))
+        elif char == ",":
+            safe = (len(out), list(closers))
+            out.append(char)
+        else:
+            if char == '"':
+                in_string = True
+            out.append(char)
+    length, open_closers = safe
+    return "".join(out[:length]) + "".join(reversed(open_closers))
+
+
+def parse_commit_messages(text: str) -> List[ICommitMessage]:
+    try:
+        data = json.loads(text)
+    except ValueError:
+        try:
+            data = json.loads(repair_json(text))
+        except ValueError:
+            return []
+    if isinstance(data, list):
+        messages = data
+    else:
+        messages = data.get("commit_messages", []) if isinstance(data, dict) else []
+
+    commit_messages = []
+    for index, message in enumerate(messages, 1):
+        commit_message = to_commit_message(index, message)
+        if commit_message is not None:
+            commit_messages.append(commit_message)
+    return commit_messages
+
+
+class CommitMessageParser:
+    """
+    Parses the `commit_messages` JSON requested by the prompt 5 while it is streamed.
+
+    `feed` scans only the new text, keeping track of the strings and of the open brackets, and returns the
+    commit messages whose object (or string) was closed by it, so each one can be shown before the
+    completion ends. The prose before the JSON is skipped, and a message with trailing commas is repaired
+    with repair_json. `partial_subject` is the subject of the message being written.
+    """
+
+    # {"commit_messages": [{...}, ...]}: the messages are the objects, or the strings, at depth 3.
+    MESSAGE_DEPTH = 3
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.containers: List[str] = []
+        self.in_string = False
+        self.escaped = False
+        self.started = False
+        self.start: Optional[int] = None
+        self.string_start: Optional[int] = None
+        self.messages: List[ICommitMessage] = []
+
+    def feed(self, chunk: str) -> List[ICommitMessage]:
+        position = len(self.text)
+        self.text += chunk
+        if not self.started:
+            position = self.text.find("{", position)
+            if position == -1:
+                return []
+            self.started = True
+        completed = []
+        for index in range(position, len(self.text)):
+            char = self.text[index]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.string_start is not None:
+                        text = self.text[self.string_start : index + 1]
+                        self.add_message(text, completed)
+                        self.string_start = None
+            elif char == '"':
+                self.in_string = True
+                if self.containers[-1:] == ["["] and (
+                    len(self.containers) == self.MESSAGE_DEPTH - 1
+                ):
+                    self.string_start = index
+            elif char in "{[":
+                self.containers.append(char)
+                if char == "{" and len(self.containers) == self.MESSAGE_DEPTH:
+                    self.start = index
+            elif char in "}]":
+                if (
+                    self.start is not None
+                    and len(self.containers) == self.MESSAGE_DEPTH
+                ):
+                    self.add_message(self.text[self.start : index + 1], completed)
+                    self.start = None
+                if self.containers:
+                    self.containers.pop()
+        return completed
+
+    def add_message(self, text: str, completed: List[ICommitMessage]) -> None:
+        message = self.parse_message(text)
+        if message is not None:
+            self.messages.append(message)
+            completed.append(message)
+
+    def parse_message(self, text: str) -> Optional[ICommitMessage]:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            try:
+                data = json.loads(repair_json(text))
+            except ValueError:
+                return None
+        return to_commit_message(len(self.messages) + 1, data)
+
+    def partial_subject(self) -> str:
+        if self.start is None:
+            return ""
+        match = PARTIAL_SUBJECT.search(self.text, self.start)
+        if match is None:
+            return ""
+        value = INCOMPLETE_ESCAPE.sub("", match.group(1))
+        try:
+            return json.loads(f'"{value}"')
+        except ValueError:
+            return value
+
+
+async def astream_commit_messages(
+    provider: Provider,
+    prompt: str,
+    model: str,
+    max_tokens: int,
+    retrier: Retrier,
+    emit: Callable[[ICommitMessage], None],
+    on_partial: Optional[Callable[[str], None]] = None,
+) -> str:
+    # Streams a completion, emitting every commit message as soon as its JSON object is complete. A retried
+    # attempt is a new sample, so its messages are matched by subject against the ones already emitted, not
+    # by position. The returned text lists the messages actually emitted, for the cache.
+    emitted: List[ICommitMessage] = []
+    subjects = set()
+    attempts = 0
+    prompt_tokens = estimate_tokens(prompt)
+
+    def emit_new(messages: Sequence[ICommitMessage]) -> None:
+        for message in messages:
+            if message["subject"] not in subjects:
+                subjects.add(message["subject"])
+                emitted.append(message)
+                emit(message)
+
+    async def attempt() -> str:
+        nonlocal attempts
+        attempts += 1
+        parser = CommitMessageParser()
+        parts = []
+        subject = ""
+        parsed = 0
+        with tracer.span(
+            "model.attempt",
+            "model",
+            model=model,
+            attempt=attempts,
+            prompt_tokens=prompt_tokens,
+        ) as span:
+            started = time.perf_counter()
+            async for part in provider.astream(prompt, model, max_tokens):
+                if not parts:
+                    span["first_token_ms"] = round(
+                        (time.perf_counter() - started) * 1000, 1
+                    )
+                parts.append(part)
+                parser.feed(part)
+                emit_new(parser.messages[parsed:])
+                parsed = len(parser.messages)
+                if on_partial is not None and parser.partial_subject() != subject:
+                    subject = parser.partial_subject()
+                    on_partial(subject)
+            text = "".join(parts)
+            span["completion_tokens"] = estimate_tokens(text)
+        # The whole text has the last word, e.g. for messages written as plain strings.
+        emit_new(parse_commit_messages(text))
+        return text
+
+    await retrier.acall(attempt)
+    return json.dumps(
+        {
+            "commit_messages": [
+                {"subject": message["subject"], "body": message["body"]}
+                for message in emitted
+            ]
+        },
+        ensure_ascii=False,
+    )
+
+
+def variant_cache_key(
+    diff_key: str,
+    prompt_id: int,
+    provider: Provider,
+    model: str,
+    locale: str,
+    num_of_commit_messages: int,
+) -> str:
+    return cache_key(
+        diff_key, prompt_id, provider.name, model, locale, num_of_commit_messages, None
+    )
+
+
+def reduced_cache_key(
+    diff_key: str,
+    provider: Provider,
+    model: str,
+    locale: str,
+    num_of_commit_messages: int,
+) -> str:
+    return cache_key(
+        reduce_prompt.id, diff_key, provider.name, model, locale, num_of_commit_messages
+    )
+
+
+async def acached_commit_messages(
+    texts: Sequence[str],
+) -> AsyncIterator[ICommitMessage]:
+    count = 0
+    for text in texts:
+        for commit_message in parse_commit_messages(text):
+            count += 1
+            commit_message["id"] = count
+            yield commit_message
+
+
+async def agenerate_commit_messages(
+    diff: str,
+    variants: Sequence[PromptVariant] = ((5, "text-davinci-002"),),
+    num_of_commit_messages: int = 1,
+    max_tokens: int = 1024,
+    concurrency: int = 4,
+    locale: str = "en",
+    cache: Optional[DiskCache] = None,
+    provider: Optional[Provider] = None,
+    retrier: Optional[Retrier] = None,
+    on_partial: Optional[PartialCallback] = None,
+    diff_key: Optional[str] = None,
+) -> AsyncIterator[ICommitMessage]:
+    if len(diff) == 0:
+        raise ValueError("No diff provided")
+
+    completer = provider or OpenAIProvider()
+    # The cache entries are keyed by the hash of the diff, unless the caller identifies it more cheaply.
+    diff_key = diff_key if diff_key is not None else normalize_diff(diff)
+    # One Retrier for all the variants, so a 429 on one of them holds back the others too.
+    retrier = retrier or Retrier()
+    semaphore = asyncio.Semaphore(concurrency)
+    # The variants put their messages here as soon as they are parsed, then None, or their error.
+    results: "asyncio.Queue[Union[ICommitMessage, BaseException, None]]" = (
+        asyncio.Queue()
+    )
+
+    async def generate(index: int, variant: PromptVariant) -> None:
+        prompt_id, model = variant
+        key = variant_cache_key(
+            diff_key, prompt_id, completer, model, locale, num_of_commit_messages
+        )
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            for commit_message in parse_commit_messages(cached):
+                results.put_nowait(commit_message)
+            return
+        with tracer.span("prompt.build", "prompt", prompt_id=prompt_id):
+            prompt = get_prompt(prompt_id, locale).render(diff, num_of_commit_messages)
+        async with semaphore:
+            text = await astream_commit_messages(
+                completer,
+                prompt,
+                model,
+                max_tokens,
+                retrier,
+                results.put_nowait,
+                (lambda subject: on_partial(index, subject)) if on_partial else None,
+            )
+        if cache is not None:
+            cache.set(key, text)
+
+    async def run(index: int, variant: PromptVariant) -> None:
+        try:
+            await generate(index, variant)
+        except Exception as error:
+            results.put_nowait(error)
+        else:
+            results.put_nowait(None)
+        finally:
+            if on_partial is not None:
+                on_partial(index, "")
+
+    # Candidates are yielded as soon as they are streamed, whatever their variant, and the variants still
+    # running are cancelled when the consumer closes the generator, e.g. once the user picked a message.
+    tasks = [
+        asyncio.ensure_future(run(index, variant))
+        for index, variant in enumerate(variants)
+    ]
+    errors: List[BaseException] = []
+    count = 0
+    running = len(tasks)
+    try:
+        while running:
+            result = await results.get()
+            if result is None or isinstance(result, BaseException):
+                running -= 1
+                if result is not None:
+                    errors.append(result)
+                continue
+            count += 1
+            result["id"] = count
+            yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Wait for the cancelled variants to unwind, so their streams are closed before returning.
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if count == 0 and errors:
+        raise errors[0]
+
+
+async def acomplete_traced(
+    provider: Provider, prompt: str, model: str, max_tokens: int
+) -> str:
+    with tracer.span(
+        "model.attempt", "model", model=model, prompt_tokens=estimate_tokens(prompt)
+    ) as span:
+        text = await provider.acomplete(prompt, model, max_tokens)
+        span["completion_tokens"] = estimate_tokens(text)
+    return text
+
+
+def summary_cache_key(chunk: str, provider: Provider, model: str) -> str:
+    # A single file chunk is identified by its path and blob ids, so its summary is reused as long as
+    # the file is staged with the same content, whatever else is staged or how the diff was compacted.
+    files = list(parse_diff(chunk.splitlines(keepends=True)))
+    if len(files) == 1:
+        blob_ids = files[0].blob_ids()
+        if blob_ids is not None:
+            return cache_key(
+                summarize_prompt.id, files[0].path, *blob_ids, provider.name, model
+            )
+    return cache_key(summarize_prompt.id, normalize_diff(chunk), provider.name, model)
+
+
+def summarize_without_model(chunk: str) -> Optional[str]:
+    # Chunks without hunks (binary, generated or renamed files) are described by their notes.
+    if any(file.hunks for file in parse_diff(chunk.splitlines(keepends=True))):
+        return None
+    notes = [line.strip("# \n") for line in chunk.splitlines() if line.startswith("#")]
+    return "\n".join(f"- {note}" for note in notes) if notes else None
+
+
+async def asummarize_diff_chunks(
+    chunks: Sequence[Tuple[str, str]],
+    model: str = "text-davinci-002",
+    max_tokens: int = 256,
+    concurrency: int = 8,
+    cache: Optional[DiskCache] = None,
+    provider: Optional[Provider] = None,
+    retrier: Optional[Retrier] = None,
+) -> List[Tuple[str, str]]:
+    completer = provider or OpenAIProvider()
+    retrier = retrier or Retrier()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def summarize(name: str, chunk: str) -> Tuple[str, str]:
+        local = summarize_without_model(chunk)
+        if local is not None:
+            return name, local
+        key = summary_cache_key(chunk, completer, model)
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            return name, cached
+        async with semaphore:
+            summary = await retrier.acall(
+                lambda: acomplete_traced(
+                    completer,
+                    summarize_prompt.render(name, chunk),
+                    model,
+                    max_tokens,
+                )
+            )
+        summary = summary.strip()
+        if cache is not None:
+            cache.set(key, summary)
+        return name, summary
+
+    return list(await asyncio.gather(*(summarize(*chunk) for chunk in chunks)))
+
+
+async def agenerate_hierarchical_commit_messages(
+    chunks: Sequence[Tuple[str, str]],
+    model: str = "text-davinci-002",
+    num_of_commit_messages: int = 1,
+    max_tokens: int = 1024,
+    concurrency: int = 8,
+    locale: str = "en",
+    cache: Optional[DiskCache] = None,
+    provider: Optional[Provider] = None,
+    retrier: Optional[Retrier] = None,
+    diff_key: Optional[str] = None,
+) -> AsyncIterator[ICommitMessage]:
+    if len(chunks) == 0:
+        raise ValueError("No diff provided")
+
+    completer = provider or OpenAIProvider()
+    retrier = retrier or Retrier()
+    # With a key of the whole diff, e.g. the staged tree ids, the reduced messages are cached under it, so
+    # a hit skips the summaries too.
+    key = (
+        reduced_cache_key(diff_key, completer, model, locale, num_of_commit_messages)
+        if diff_key is not None
+        else None
+    )
+    reduced = cache.get(key) if cache is not None and key is not None else None
+    if reduced is not None:
+        for commit_message in parse_commit_messages(reduced):
+            yield commit_message
+        return
+
+    summaries = await asummarize_diff_chunks(
+        chunks,
+        model=model,
+        concurrency=concurrency,
+        cache=cache,
+        provider=completer,
+        retrier=retrier,
+    )
+    text = "\n".join(f"{name}:\n{summary}" for name, summary in summaries)
+    if key is None:
+        key = cache_key(
+            reduce_prompt.id,
+            text,
+            completer.name,
+            model,
+            locale,
+            num_of_commit_messages,
+        )
+    reduced = cache.get(key) if cache is not None else None
+    if reduced is None:
+        reduced = await retrier.acall(
+            lambda: acomplete_traced(
+                completer,
+                get_prompt(reduce_prompt.id, locale).render(
+                    text, num_of_commit_messages
+                ),
+                model,
+                max_tokens,
+            )
+        )
+        if cache is not None:
+            cache.set(key, reduced)
+    for commit_message in parse_commit_messages(reduced):
+        yield commit_message
+
+
+def staged_commit_candidates(
+    repository: GitRepository,
+    config: Mapping[str, Any],
+    cache: Optional[DiskCache] = None,
+    provider: Optional[Provider] = None,
+    retrier: Optional[Retrier] = None,
+    on_partial: Optional[PartialCallback] = None,
+) -> AsyncIterator[ICommitMessage]:
+    """
+    The staged_commit_candidates function starts the generation of the commit messages of the staged changes.
+
+    The staged diff is read and split in chunks right away, unless the suggestions of the staged tree are
+    in the cache: the tree ids identify the diff, so a cache hit skips `git diff --staged`. When the diff
+    fits in the `max_diff_tokens` budget once compacted, two prompt variants are sent concurrently.
+    Otherwise every file is summarized in parallel and the summaries are reduced to the suggestions.
+    Both paths cache their suggestions under the tree ids.
+
+    :param repository:GitRepository: Used to Read the staged diff.
+    :param config:Mapping[str, Any]: Used to Pass the parsed config, usually from get_config.
+    :param cache:Optional[DiskCache]: Used to Reuse the suggestions already generated for the same staged diff.
+    :param provider:Optional[Provider]: Used to Select the backend completing the prompts.
+    :param retrier:Optional[Retrier]: Used to Share the retries and the rate limit.
+    :param on_partial:Optional[PartialCallback]: Used to Follow the subjects while they are streamed.
+    :return: An async generator of the candidates, in the order they are generated.
+
+    :doc-author: coderj001
+    """
+    provider = provider or OpenAIProvider()
+    model = config["model"]
+    locale = config["locale"]
+    max_diff_tokens = config["max_diff_tokens"]
+    variants = ((5, model), (4, model))
+    tree_key = repository.staged_tree_key() if cache is not None else None
+    diff_key = cache_key(tree_key, max_diff_tokens) if tree_key is not None else None
+    if cache is not None and diff_key is not None:
+        reduced = cache.get(reduced_cache_key(diff_key, provider, model, locale, 3))
+        if reduced is not None:
+            return acached_commit_messages([reduced])
+        cached = [
+            cache.get(
+                variant_cache_key(
+                    diff_key, prompt_id, provider, variant_model, locale, 2
+                )
+            )
+            for prompt_id, variant_model in variants
+        ]
+        if all(text is not None for text in cached):
+            return acached_commit_messages(cached)
+
+    with repository.map_staged_diff() as files:
+        chunks = split_diff(files, max_chunk_tokens=max(max_diff_tokens // 4, 500))
+    if not chunks:
+        raise ValueError("No staged changes to commit.")
+
+    diff = "".join(chunk for _, chunk in chunks)
+    if len(chunks) > 1 and estimate_tokens(diff) > max_diff_tokens:
+        # Too large for a single prompt: summarize every file, then reduce the summaries.
+        return agenerate_hierarchical_commit_messages(
+            chunks,
+            model=model,
+            num_of_commit_messages=3,
+            locale=locale,
+            cache=cache,
+            provider=provider,
+            retrier=retrier,
+            diff_key=diff_key,
+        )
+    return agenerate_commit_messages(
+        compact_diff(parse_diff(diff.splitlines(keepends=True)), max_diff_tokens),
+        variants=variants,
+        num_of_commit_messages=2,
+        locale=locale,
+        cache=cache,
+        provider=provider,
+        retrier=retrier,
+        on_partial=on_partial,
+        diff_key=diff_key,
+    )
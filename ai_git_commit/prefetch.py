@@ -0,0 +1,64 @@
+import asyncio
+import contextlib
+import threading
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from ai_git_commit.config import ICommitMessage
+
+CandidatesFactory = Callable[[], Awaitable[AsyncIterator[ICommitMessage]]]
+
+
+class Prefetch:
+    """
+    Generates commit message candidates in a background thread, speculatively, while the user is prompted.
+
+    The thread runs its own event loop, so the interactive prompts of the main thread are not slowed down,
+    and `cancel` stops the generation (shutting down the connections of the streamed requests) when the user
+    aborts or does not need the candidates anymore. `candidates` grows as they are generated.
+    """
+
+    def __init__(self, start: CandidatesFactory) -> None:
+        self.start = start
+        self.candidates: List[ICommitMessage] = []
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        self.task: "asyncio.Future[None]" = self.loop.create_task(self.collect())
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    async def collect(self) -> None:
+        candidates = await self.start()
+        try:
+            async for candidate in candidates:
+                self.candidates.append(candidate)
+        finally:
+            aclose = getattr(candidates, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as error:
+            self.error = error
+        finally:
+            self.loop.close()
+            self.done.set()
+
+    def ready(self) -> List[ICommitMessage]:
+        return list(self.candidates)
+
+    def wait(self, timeout: Optional[float] = None) -> List[ICommitMessage]:
+        self.done.wait(timeout)
+        return self.ready()
+
+    def cancel(self) -> None:
+        if self.done.is_set():
+            return
+        # The loop is closed by the thread once the task is done, which may happen meanwhile.
+        with contextlib.suppress(RuntimeError):
+            self.loop.call_soon_threadsafe(self.task.cancel)
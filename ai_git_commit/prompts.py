@@ -1,8 +1,162 @@
-prompts = [
-    {},
-    {
-        "id": 1,
-        "prompt": lambda diff, num_of_commit_message: f"""
+import string
+import textwrap
+import threading
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from ai_git_commit.compact import estimate_tokens
+
+PromptId = Union[int, str]
+
+DEFAULT_PROMPT_ID = 5
+DEFAULT_LOCALE = "en"
+# Appended to the prompts of the locales which have no variant of their own.
+LOCALE_INSTRUCTION = (
+    "Write the subjects and the bodies of the commit messages in the language of the locale `{locale}`, "
+    "keeping the <type> and <scope> of the subjects in English.\n"
+)
+
+
+class PromptTemplate:
+    """
+    A prompt compiled once: dedented, validated, and split in static segments around its fields.
+
+    Rendering joins the precomputed segments with the values, so the diff is copied once into the prompt,
+    and the tokens of the static text are counted at build time for the cost estimates.
+    """
+
+    def __init__(
+        self,
+        id: PromptId,
+        params: Sequence[str],
+        text: str,
+        locale: str = DEFAULT_LOCALE,
+    ) -> None:
+        self.id = id
+        self.params = tuple(params)
+        self.locale = locale
+        self.text = textwrap.dedent(text).strip("\n") + "\n"
+        self.segments: List[str] = [""]
+        self.fields: List[str] = []
+        for literal, field, spec, conversion in string.Formatter().parse(self.text):
+            self.segments[-1] += literal
+            if field is None:
+                continue
+            if field not in self.params or spec or conversion:
+                raise ValueError(f"Invalid field {{{field}}} in the prompt {id}")
+            self.fields.append(field)
+            self.segments.append("")
+        missing = [param for param in self.params if param not in self.fields]
+        if missing:
+            raise ValueError(f"Missing fields {missing} in the prompt {id}")
+        self.static_tokens = estimate_tokens("".join(self.segments))
+
+    def render(self, *args: Any, **kwargs: Any) -> str:
+        values = {**dict(zip(self.params, args)), **kwargs}
+        parts = [self.segments[0]]
+        for field, segment in zip(self.fields, self.segments[1:]):
+            parts.append(str(values[field]))
+            parts.append(segment)
+        return "".join(parts)
+
+    def estimate_tokens(self, *args: Any, **kwargs: Any) -> int:
+        """Estimate the tokens of the rendered prompt without rendering it."""
+        values = {**dict(zip(self.params, args)), **kwargs}
+        return self.static_tokens + sum(
+            estimate_tokens(str(values[field])) for field in self.fields
+        )
+
+    def with_locale(self, locale: str) -> "PromptTemplate":
+        instruction = LOCALE_INSTRUCTION.format(locale=locale)
+        escaped = instruction.replace("{", "{{").replace("}", "}}")
+        return PromptTemplate(self.id, self.params, self.text + escaped, locale)
+
+
+class PromptRegistry:
+    """
+    The prompt templates by id and locale.
+
+    A locale without a template of its own gets the default one with LOCALE_INSTRUCTION, compiled on its
+    first use and kept for the next ones.
+    """
+
+    def __init__(self) -> None:
+        self.templates: Dict[Tuple[PromptId, str], PromptTemplate] = {}
+        self.lock = threading.Lock()
+
+    def register(self, template: PromptTemplate) -> PromptTemplate:
+        key = (template.id, template.locale)
+        with self.lock:
+            if key in self.templates:
+                raise ValueError(
+                    f"The prompt {template.id} is already registered for {template.locale}"
+                )
+            self.templates[key] = template
+        return template
+
+    def get(self, prompt_id: PromptId, locale: str = DEFAULT_LOCALE) -> PromptTemplate:
+        with self.lock:
+            template = self.templates.get((prompt_id, locale))
+            if template is not None:
+                return template
+            default = self.templates.get((prompt_id, DEFAULT_LOCALE))
+            if default is None:
+                raise ValueError(f"Unknown prompt {prompt_id}")
+            if locale.split("-")[0] == DEFAULT_LOCALE:
+                return default
+            template = self.templates[(prompt_id, locale)] = default.with_locale(locale)
+            return template
+
+    def ids(self) -> List[PromptId]:
+        return list(
+            dict.fromkeys(
+                prompt_id
+                for prompt_id, locale in self.templates
+                if locale == DEFAULT_LOCALE
+            )
+        )
+
+    def suffixes(self, field: str) -> List[str]:
+        """The static texts following a field in the prompts, e.g. to find where an embedded diff ends."""
+        with self.lock:
+            templates = list(self.templates.values())
+        return list(
+            dict.fromkeys(
+                segment
+                for template in templates
+                for name, segment in zip(template.fields, template.segments[1:])
+                if name == field and segment
+            )
+        )
+
+    def costs(self, locale: str = DEFAULT_LOCALE) -> Dict[PromptId, int]:
+        """The estimated tokens of every prompt, without the fields, e.g. to compare their cost per diff."""
+        return {
+            prompt_id: self.get(prompt_id, locale).static_tokens
+            for prompt_id in self.ids()
+        }
+
+
+registry = PromptRegistry()
+
+
+def get_prompt(prompt_id: PromptId, locale: str = DEFAULT_LOCALE) -> PromptTemplate:
+    """
+    The get_prompt function returns the compiled template of a prompt, in the variant of a locale.
+
+    :param prompt_id:PromptId: Used to Select the prompt, 1 to 5, "summarize" or "reduce".
+    :param locale:str: Used to Select the language of the commit messages, from the `locale` config.
+    :return: A PromptTemplate, rendered with its render method.
+
+    :doc-author: coderj001
+    """
+    return registry.get(prompt_id, locale)
+
+
+registry.register(
+    PromptTemplate(
+        1,
+        ("diff", "num_of_commit_message"),
+        """
             Here is the output of the `git diff --staged`:
 
                     {diff}
@@ -20,10 +174,14 @@ prompts = [
             }}
             The response MUST ONLY contains the json, and no other text. For example, if you print the json, do NOT include "Output:", "Response:" or anything similar to those two before it.
         """,
-    },
-    {
-        "id": 2,
-        "prompt": lambda diff, num_of_commit_message: f"""
+    )
+)
+
+registry.register(
+    PromptTemplate(
+        2,
+        ("diff", "num_of_commit_message"),
+        """
         Here is the output of the `git diff --staged`:
 
             {diff}
@@ -40,10 +198,14 @@ prompts = [
         }}
         The response MUST ONLY contain the JSON and no other text. For example, if you print the JSON object, do NOT include "Output:", "Response:" or anything similar to those two before it.
         """,
-    },
-    {
-        "id": 3,
-        "prompt": lambda diff, num_of_commit_message: f"""
+    )
+)
+
+registry.register(
+    PromptTemplate(
+        3,
+        ("diff", "num_of_commit_message"),
+        """
         Here is the output of the `git diff --staged`:
 
             {diff}
@@ -60,10 +222,14 @@ prompts = [
         }}
         The response MUST ONLY contains the json, and no other text. For example, if you print the json, do NOT include "Output:", "Response:" or anything similar to those two before it.
         """,
-    },
-    {
-        "id": 4,
-        "prompt": lambda diff, num_of_commit_message: f"""
+    )
+)
+
+registry.register(
+    PromptTemplate(
+        4,
+        ("diff", "num_of_commit_message"),
+        """
         Here is the output of the `git diff --staged`:
 
             {diff}
@@ -90,29 +256,33 @@ prompts = [
         Please provide a response in the form of a valid JSON and do not include "Output:", "Response:" or anything similar to those two before it, in the following format:
         {{
             "commit_messages": [
-                {
+                {{
                     "id": 1,
                     "subject": "<type>(<scope>): <subject>",
                     "body": "<BODY (bullet points)>"
-                },
-                {
+                }},
+                {{
                     "id": 2,
                     "subject": "<type>(<scope>): <subject>",
                     "body": "<BODY (bullet points)>"
-                },
+                }},
                 ...
-                {
+                {{
                     "id": n,
                     "subject": "<type>(<scope>): <subject>",
                     "body": "<BODY (bullet points)>"
-                }
+                }}
             ]
         }}
         """,
-    },
-    {
-        "id": 5,
-        "prompt": lambda diff, num_of_commit_message: f"""
+    )
+)
+
+registry.register(
+    PromptTemplate(
+        5,
+        ("diff", "num_of_commit_message"),
+        """
         Here is the output of the `git diff --staged`:
         
             {diff}
@@ -172,5 +342,56 @@ prompts = [
             ]
         }}
         """,
-    },
-]
+    )
+)
+
+summarize_prompt = registry.register(
+    PromptTemplate(
+        "summarize",
+        ("name", "diff"),
+        """
+        Here is the part of the output of the `git diff --staged` for `{name}`:
+
+            {diff}
+
+        Summarize the changes made in this part of the `git diff --staged` output in 1 to 3 bullet points.
+        Each bullet point MUST start with "- ", use the imperative mood and be under 100 characters.
+        The response MUST ONLY contain the bullet points, and no other text.
+        """,
+    )
+)
+
+reduce_prompt = registry.register(
+    PromptTemplate(
+        "reduce",
+        ("summaries", "num_of_commit_message"),
+        """
+        Here are the summaries of the changes of a `git diff --staged` output, grouped by path:
+
+            {summaries}
+
+        Here are some best practices for writing commit messages:
+        - Use feat, fix, docs, refactor, perf, test, build, ci or none as type.
+        - Use the imperative mood, e.g. "Add feature" instead of "Added feature".
+        - Limit the subject line to 72 characters or less, and do not end it with a period.
+        - Describe the change as a whole in the subject line, not the change of a single path.
+        - Use the body of the message, 2 to 9 bullet points of 120 characters or less, for the details.
+
+        Write {num_of_commit_message} commit messages that accurately summarize all the changes above, following the best practices listed above.
+        Please provide a response in the form of a valid JSON and do not include \"Output:\", \"Response:\" or anything similar to those two before it, in the following format:
+        {{
+            "commit_messages": [
+                {{
+                    "id": 1,
+                    "subject": "<type>(<scope>): <subject>",
+                    "body": [
+                        "<BODY bullet point 1>",
+                        ...
+                        "<BODY bullet point n>"
+                    ]
+                }}
+            ]
+        }}
+        """,
+    )
+)
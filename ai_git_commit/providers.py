@@ -0,0 +1,397 @@
+import asyncio
+import http.client
+import json
+import posixpath
+import re
+import threading
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from ai_git_commit.client import (
+    DEFAULT_MAX_CONNECTIONS,
+    DEFAULT_TIMEOUT,
+    HTTPClient,
+    HTTPStream,
+    PoolTimeout,
+    aiter_thread,
+    shared_client,
+)
+from ai_git_commit.diff import DiffFile, parse_diff
+from ai_git_commit.prompts import registry
+
+DEFAULT_API_BASE = "https://api.openai.com/v1"
+
+
+class ProviderError(Exception):
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Provider:
+    """
+    A backend able to complete a prompt. Subclasses implement `complete`.
+
+    Backends able to stream the completion also override `astream`, which otherwise yields the whole
+    completion at once.
+    """
+
+    name = ""
+
+    def complete(
+        self, prompt: str, model: str, max_tokens: int, temperature: float = 0.35
+    ) -> str:
+        raise NotImplementedError
+
+    async def acomplete(
+        self, prompt: str, model: str, max_tokens: int, temperature: float = 0.35
+    ) -> str:
+        return await asyncio.to_thread(
+            self.complete, prompt, model, max_tokens, temperature
+        )
+
+    async def astream(
+        self, prompt: str, model: str, max_tokens: int, temperature: float = 0.35
+    ) -> AsyncIterator[str]:
+        yield await self.acomplete(prompt, model, max_tokens, temperature)
+
+
+def status_error(status: int, reason: str, headers: Mapping[str, str]) -> ProviderError:
+    retry_after = headers.get("retry-after")
+    return ProviderError(
+        f"{status} {reason}",
+        status=status,
+        retry_after=float(retry_after)
+        if retry_after and retry_after.replace(".", "", 1).isdigit()
+        else None,
+    )
+
+
+class OpenAIProvider(Provider):
+    """
+    Completions through the `/completions` endpoint of an OpenAI compatible HTTP API.
+
+    The requests go through an HTTPClient, so the connections are kept alive and shared by the threads
+    running concurrent completions. Pass the same client to several providers to share its pool.
+    `astream` asks for a streamed completion and yields its text while the model writes it.
+    """
+
+    name = "openai"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        api_base: str = DEFAULT_API_BASE,
+        timeout: float = DEFAULT_TIMEOUT,
+        client: Optional[HTTPClient] = None,
+    ) -> None:
+        self.api_key = api_key
+        self.api_base = api_base.rstrip("/")
+        self.timeout = timeout
+        if client is None:
+            client = shared_client(timeout=timeout)
+        self.client = client
+
+    def request_body(
+        self,
+        prompt: str,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        stream: bool = False,
+    ) -> Tuple[bytes, Dict[str, str]]:
+        payload: Dict[str, Any] = {
+            "model": model,
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+        if stream:
+            payload["stream"] = True
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return json.dumps(payload).encode("utf-8"), headers
+
+    def complete(
+        self, prompt: str, model: str, max_tokens: int, temperature: float = 0.35
+    ) -> str:
+        body, headers = self.request_body(prompt, model, max_tokens, temperature)
+        try:
+            response = self.client.request(
+                "POST", f"{self.api_base}/completions", body=body, headers=headers
+            )
+        except (OSError, http.client.HTTPException, PoolTimeout) as error:
+            raise ProviderError(str(error) or type(error).__name__) from error
+        if response.status >= 400:
+            raise status_error(response.status, response.reason, response.headers)
+        try:
+            data = response.json()
+            return data["choices"][0]["text"]
+        except (ValueError, KeyError, IndexError, TypeError) as error:
+            raise ProviderError(
+                f"Invalid completion response: {response.data[:200]!r}"
+            ) from error
+
+    def stream(
+        self,
+        prompt: str,
+        model: str,
+        max_tokens: int,
+        temperature: float = 0.35,
+        on_open: Optional[Callable[[HTTPStream], None]] = None,
+    ) -> Iterator[str]:
+        # The completion is streamed as server-sent events, one `data: {...}` line per token batch,
+        # until `data: [DONE]`. on_open receives the response, e.g. to abort it from another thread.
+        body, headers = self.request_body(
+            prompt, model, max_tokens, temperature, stream=True
+        )
+        try:
+            with self.client.stream(
+                "POST", f"{self.api_base}/completions", body=body, headers=headers
+            ) as response:
+                if on_open is not None:
+                    on_open(response)
+                if response.status >= 400:
+                    response.body.read()
+                    raise status_error(
+                        response.status, response.reason, response.headers
+                    )
+                for line in response.lines():
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        # Drain the end of the body so the connection can be reused.
+                        response.body.read()
+                        return
+                    try:
+                        text = json.loads(data)["choices"][0].get("text")
+                    except (ValueError, KeyError, IndexError, TypeError) as error:
+                        raise ProviderError(
+                            f"Invalid completion event: {data[:200]!r}"
+                        ) from error
+                    if text:
+                        yield text
+        except (OSError, http.client.HTTPException, PoolTimeout) as error:
+            raise ProviderError(str(error) or type(error).__name__) from error
+
+    async def astream(
+        self, prompt: str, model: str, max_tokens: int, temperature: float = 0.35
+    ) -> AsyncIterator[str]:
+        # Cancelling the consumer shuts the connection down, instead of waiting for the next event of a
+        # stalled stream or the read timeout.
+        opened: List[HTTPStream] = []
+        aborted = threading.Event()
+
+        def on_open(response: HTTPStream) -> None:
+            opened.append(response)
+            if aborted.is_set():
+                response.abort()
+
+        def abort() -> None:
+            aborted.set()
+            for response in opened:
+                response.abort()
+
+        texts = aiter_thread(
+            lambda: self.stream(prompt, model, max_tokens, temperature, on_open),
+            abort,
+        )
+        try:
+            async for text in texts:
+                yield text
+        finally:
+            await texts.aclose()
+
+    def close(self) -> None:
+        self.client.close()
+
+
+DOCS_EXTENSIONS = (".md", ".rst", ".txt", ".adoc")
+BUILD_FILES = (
+    "pyproject.toml",
+    "setup.py",
+    "setup.cfg",
+    "requirements.txt",
+    "Makefile",
+    "Dockerfile",
+    "package.json",
+    "poetry.lock",
+)
+
+
+def file_stats(file: DiffFile) -> Tuple[int, int]:
+    added = removed = 0
+    for hunk in file.hunks:
+        hunk_added, hunk_removed = hunk.stats()
+        added += hunk_added
+        removed += hunk_removed
+    return added, removed
+
+
+def file_status(file: DiffFile) -> str:
+    for line in file.header:
+        if line.startswith("new file mode"):
+            return "A"
+        if line.startswith("deleted file mode"):
+            return "D"
+        if line.startswith("rename to "):
+            return "R"
+    return "M"
+
+
+def commit_type(paths: List[str], statuses: List[str], changed: int) -> str:
+    names = [posixpath.basename(path) for path in paths]
+    if all("test" in path.lower() for path in paths):
+        return "test"
+    if all(
+        path.lower().endswith(DOCS_EXTENSIONS) or path.startswith("docs/")
+        for path in paths
+    ):
+        return "docs"
+    if all(path.startswith(".github/") for path in paths):
+        return "ci"
+    if all(name in BUILD_FILES for name in names):
+        return "build"
+    if "A" in statuses:
+        return "feat"
+    return "fix" if changed <= 10 else "refactor"
+
+
+def commit_scope(paths: List[str]) -> str:
+    if len(paths) == 1:
+        return posixpath.splitext(posixpath.basename(paths[0]))[0]
+    common = posixpath.commonpath(paths) if all("/" in path for path in paths) else ""
+    return posixpath.basename(common)
+
+
+def diff_end(prompt: str, start: int) -> int:
+    # The diff embedded in a prompt ends where the text of its template resumes.
+    ends = [prompt.find(suffix, start) for suffix in registry.suffixes("diff")]
+    return min((end for end in ends if end != -1), default=len(prompt))
+
+
+class LocalProvider(Provider):
+    """
+    A deterministic, offline stand-in for a model.
+
+    It reads the diff (or the per-file summaries) embedded in the prompt, derives the type, scope and subject
+    of the commit message from the paths and hunk stats, and answers in the format the prompt asks for.
+    """
+
+    name = "local"
+
+    def complete(
+        self, prompt: str, model: str, max_tokens: int, temperature: float = 0.35
+    ) -> str:
+        start = prompt.find("diff --git ")
+        files = (
+            list(parse_diff(prompt[start : diff_end(prompt, start)].splitlines(True)))
+            if start != -1
+            else []
+        )
+        if "commit_messages" not in prompt:
+            return "\n".join(self.describe(files)) + "\n"
+
+        if files:
+            paths = [file.path for file in files]
+            statuses = [file_status(file) for file in files]
+            stats = [file_stats(file) for file in files]
+        else:
+            # The reduce prompt lists the summaries of the files as `<path>:` lines.
+            paths = re.findall(r"^\s*(\S+):\s*$", prompt, re.M) or ["changes"]
+            statuses = ["M"] * len(paths)
+            stats = [(0, 0)] * len(paths)
+
+        changed = sum(added + removed for added, removed in stats)
+        type_ = commit_type(paths, statuses, changed)
+        scope = commit_scope(paths)
+        verb = {"A": "Add", "D": "Remove", "R": "Rename"}.get(
+            statuses[0] if len(set(statuses)) == 1 else "M", "Update"
+        )
+        target = (
+            posixpath.basename(paths[0])
+            if len(paths) == 1
+            else f"{len(paths)} files in {scope or 'the project'}"
+        )
+        body = [
+            f"{path}: +{added} -{removed}"
+            for path, (added, removed) in list(zip(paths, stats))[:9]
+        ]
+        names = ", ".join(posixpath.basename(path) for path in paths[:3])
+        subjects = list(
+            dict.fromkeys(
+                [
+                    f"{type_}({scope}): {verb} {target}"
+                    if scope
+                    else f"{type_}: {verb} {target}",
+                    f"{type_}: {verb} {target}",
+                    f"{type_}: {verb} {names}",
+                ]
+            )
+        )
+        count = re.search(r"(?:Write|containing) (\d+) commit messages", prompt)
+        num_of_commit_messages = int(count.group(1)) if count else 1
+        commit_messages = [
+            {
+                "id": index + 1,
+                "subject": subjects[index % len(subjects)],
+                "body": body,
+            }
+            for index in range(num_of_commit_messages)
+        ]
+        return json.dumps({"commit_messages": commit_messages})
+
+    @staticmethod
+    def describe(files: List[DiffFile]) -> List[str]:
+        lines = []
+        for file in files:
+            added, removed = file_stats(file)
+            verb = {"A": "Add", "D": "Remove", "R": "Rename"}.get(
+                file_status(file), "Update"
+            )
+            lines.append(f"- {verb} {file.path} (+{added} -{removed})")
+        return lines or ["- Update files"]
+
+
+providers = {"openai": OpenAIProvider, "local": LocalProvider}
+
+
+def get_provider(config: Mapping[str, Any]) -> Provider:
+    """
+    The get_provider function builds the provider selected by the `provider` config value.
+
+    :param config:Mapping[str, Any]: Used to Pass the parsed config, usually from get_config.
+    :return: A Provider instance.
+
+    :doc-author: coderj001
+    """
+    name = config.get("provider") or "openai"
+    if name not in providers:
+        raise ValueError(f"Unknown provider: {name}")
+    if name == "openai":
+        return OpenAIProvider(
+            api_key=config.get("OPENAI_KEY"),
+            api_base=config.get("api_base") or DEFAULT_API_BASE,
+            client=shared_client(
+                config.get("max_connections") or DEFAULT_MAX_CONNECTIONS,
+                config.get("request_timeout") or DEFAULT_TIMEOUT,
+            ),
+        )
+    return providers[name]()
@@ -0,0 +1,437 @@
+import contextlib
+import mmap
+import os
+import subprocess
+import tempfile
+from itertools import chain
+from pathlib import Path
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from ai_git_commit.config import ICommitMessage
+from ai_git_commit.diff import DiffFile, parse_diff, parse_diff_buffer
+from ai_git_commit.trace import tracer
+
+if TYPE_CHECKING:
+    from ai_git_commit.objects import NativeRepository
+
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+READ_SIZE = 64 * 1024
+STAGED_DIFF_COMMAND = [
+    "git",
+    "diff",
+    "--staged",
+    "--full-index",
+    "--no-abbrev",
+    "--raw",
+    "-z",
+    "--patch",
+    "--no-color",
+    "--no-ext-diff",
+]
+
+# Every commit starts with a NUL byte, which can not appear at the start of a diff line.
+LOG_DIFF_COMMAND = [
+    "git",
+    "log",
+    "--reverse",
+    "--diff-merges=first-parent",
+    "--patch",
+    "--no-color",
+    "--no-ext-diff",
+    "--format=%x00%H %s",
+]
+
+
+class FileStatus(NamedTuple):
+    """An entry of `git status --porcelain`: the index and worktree status letters of a path."""
+
+    index: str
+    worktree: str
+    path: str
+    orig_path: Optional[str] = None
+
+    def short(self) -> str:
+        path = f"{self.orig_path} -> {self.path}" if self.orig_path else self.path
+        return f"{self.index}{self.worktree} {path}"
+
+
+class StagedFile(NamedTuple):
+    """An entry of `git diff --staged --raw`: the modes, blob ids and status of a staged path."""
+
+    status: str
+    path: str
+    old_mode: str
+    new_mode: str
+    old_blob: str
+    new_blob: str
+    old_path: Optional[str] = None
+
+
+class CommitDiff(NamedTuple):
+    """A commit of `git log --patch`: its id, the subject of its message and its diff."""
+
+    commit: str
+    subject: str
+    diff: str
+
+
+def find_git_dir(start: Path) -> Optional[Tuple[Path, Path]]:
+    """
+    The find_git_dir function looks for the `.git` entry of the work tree containing start, without running git.
+
+    Both `.git` directories and the `.git` files git writes for worktrees and submodules (`gitdir: <path>`)
+    are supported.
+
+    :param start:Path: Used to Pass the directory to start the search from.
+    :return: A (work tree, git directory) tuple, or None if start is not inside a work tree.
+
+    :doc-author: coderj001
+    """
+    for directory in (start, *start.parents):
+        dot_git = directory / ".git"
+        if dot_git.is_dir() and (dot_git / "HEAD").is_file():
+            return directory, dot_git
+        if dot_git.is_file():
+            content = dot_git.read_text(encoding="utf-8", errors="replace").strip()
+            if content.startswith("gitdir:"):
+                git_dir = Path(content[len("gitdir:") :].strip())
+                return directory, (directory / git_dir).resolve()
+    return None
+
+
+def parse_status(output: bytes) -> List[FileStatus]:
+    fields = output.decode("utf-8", errors="replace").split("\0")
+    entries = []
+    index = 0
+    while index < len(fields):
+        field = fields[index]
+        index += 1
+        if len(field) < 4:
+            continue
+        orig_path = None
+        if field[0] in "RC":
+            orig_path = fields[index]
+            index += 1
+        entries.append(FileStatus(field[0], field[1], field[3:], orig_path))
+    return entries
+
+
+def parse_raw(output: bytes) -> List[StagedFile]:
+    fields = output.decode("utf-8", errors="replace").split("\0")
+    entries = []
+    index = 0
+    while index < len(fields):
+        field = fields[index]
+        index += 1
+        if not field.startswith(":"):
+            continue
+        old_mode, new_mode, old_blob, new_blob, status = field[1:].split()
+        path = fields[index]
+        index += 1
+        old_path = None
+        if status[0] in "RC":
+            old_path, path = path, fields[index]
+            index += 1
+        entries.append(
+            StagedFile(
+                status[0], path, old_mode, new_mode, old_blob, new_blob, old_path
+            )
+        )
+    return entries
+
+
+def iter_lines(head: bytes, stream: IO[bytes]) -> Iterator[str]:
+    """Decode the lines of `head` followed by the rest of `stream`."""
+    lines = head.splitlines(keepends=True)
+    partial = lines.pop() if lines and not lines[-1].endswith(b"\n") else b""
+    for line in lines:
+        yield line.decode("utf-8", errors="replace")
+    for line in stream:
+        if partial:
+            line, partial = partial + line, b""
+        yield line.decode("utf-8", errors="replace")
+    if partial:
+        yield partial.decode("utf-8", errors="replace")
+
+
+def commit_diff(header: str, lines: List[str]) -> CommitDiff:
+    commit, _, subject = header.partition(" ")
+    return CommitDiff(commit, subject, "".join(lines).lstrip("\n"))
+
+
+class GitRepository:
+    """
+    A session on the git repository containing the current directory.
+
+    The repository is discovered once without running git, and the results of the git commands are kept
+    for the whole session, so a commit run forks git only for the status, the staged diff and the commit.
+
+    With `native=True`, the status, the staged files and the staged diff are read from the index and the
+    object database by ai_git_commit.objects instead, and git is only run when the repository uses a
+    feature that reader does not support.
+    """
+
+    def __init__(self, worktree: Path, git_dir: Path, native: bool = False) -> None:
+        self.worktree = worktree
+        self.git_dir = git_dir
+        self.native = native
+        self._status: Optional[List[FileStatus]] = None
+        self._staged: Optional[List[StagedFile]] = None
+        self._reader: Optional["NativeRepository"] = None
+
+    @classmethod
+    def discover(
+        cls, path: Optional[str] = None, native: bool = False
+    ) -> Optional["GitRepository"]:
+        start = Path(path or os.getcwd()).resolve()
+        if "GIT_DIR" not in os.environ:
+            with tracer.span("repository.discover", "git"):
+                found = find_git_dir(start)
+            return cls(*found, native=native) if found is not None else None
+        # GIT_DIR and friends change how git finds the repository, so let git resolve it.
+        with tracer.span("git rev-parse", "git"):
+            result = subprocess.run(
+                ["git", "rev-parse", "--show-toplevel", "--absolute-git-dir"],
+                cwd=start,
+                capture_output=True,
+                text=True,
+            )
+        if result.returncode != 0:
+            return None
+        worktree, git_dir = result.stdout.splitlines()[:2]
+        return cls(Path(worktree), Path(git_dir), native=native)
+
+    def reader(self) -> Optional["NativeRepository"]:
+        if not self.native:
+            return None
+        if self._reader is None:
+            from ai_git_commit.objects import NativeRepository, UnsupportedRepository
+
+            try:
+                self._reader = NativeRepository(self.worktree, self.git_dir)
+            except UnsupportedRepository:
+                self.native = False
+                return None
+        return self._reader
+
+    def run(self, args: Sequence[str]) -> bytes:
+        with tracer.span(f"git {args[0]}", "git", args=" ".join(args[1:])):
+            result = subprocess.run(
+                ["git", *args], cwd=self.worktree, capture_output=True
+            )
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(
+                result.returncode, ["git", *args], result.stdout, result.stderr
+            )
+        return result.stdout
+
+    def status(self) -> List[FileStatus]:
+        if self._status is None:
+            self._status = self.try_native("status")
+        if self._status is None:
+            self._status = parse_status(
+                self.run(["status", "--porcelain=v1", "-z", "--untracked-files=no"])
+            )
+        return self._status
+
+    def status_short(self) -> str:
+        return "".join(f"{entry.short()}\n" for entry in self.status())
+
+    def staged_files(self) -> List[StagedFile]:
+        if self._staged is None:
+            self._staged = self.try_native("staged_files")
+        if self._staged is None:
+            self._staged = parse_raw(
+                self.run(["diff", "--staged", "--raw", "-z", "--no-abbrev"])
+            )
+        return self._staged
+
+    def iter_staged_diff(self) -> Iterator[DiffFile]:
+        """
+        Stream the staged diff as DiffFile records.
+
+        The raw listing and the patch are read from a single `git diff --staged --raw -z --patch` command:
+        the NUL separated raw records come first and fill staged_files, then the patch is streamed.
+        """
+        lines = self.try_native("iter_staged_diff_lines")
+        if lines is not None:
+            self._staged = self.try_native("staged_files")
+            yield from parse_diff(lines)
+            return
+
+        command = STAGED_DIFF_COMMAND
+        # The span lasts as long as the diff is streamed, the parsing by the consumer included.
+        with tracer.span("git diff --staged", "git"):
+            process = subprocess.Popen(
+                command,
+                cwd=self.worktree,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            assert process.stdout is not None
+            completed = False
+            try:
+                buffer = b""
+                while True:
+                    separator = buffer.find(b"\0\0")
+                    if separator != -1:
+                        raw, head = buffer[: separator + 1], buffer[separator + 2 :]
+                        break
+                    chunk = process.stdout.read1(READ_SIZE)  # type: ignore[attr-defined]
+                    if not chunk:
+                        raw, head = buffer, b""
+                        break
+                    buffer += chunk
+                self._staged = parse_raw(raw)
+                yield from parse_diff(iter_lines(head, process.stdout))
+                completed = True
+            finally:
+                if not completed:
+                    process.kill()
+                stderr = process.stderr.read() if process.stderr is not None else b""
+                process.wait()
+                process.stdout.close()
+                if process.stderr is not None:
+                    process.stderr.close()
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(
+                    process.returncode, command, stderr=stderr
+                )
+
+    @contextlib.contextmanager
+    def map_staged_diff(self) -> Iterator[Iterator[DiffFile]]:
+        """
+        Parse the staged diff from a memory-mapped file instead of a stream of lines.
+
+        git writes the output of `git diff --staged --raw -z --patch` to a temporary file, which is mapped
+        in memory and parsed by parse_diff_buffer, so the records hold offsets into the mapping instead of
+        copies of the lines. The records must not be used after the block exits.
+        """
+        lines = self.try_native("iter_staged_diff_lines")
+        if lines is not None:
+            self._staged = self.try_native("staged_files")
+            yield parse_diff(lines)
+            return
+
+        with tempfile.TemporaryFile() as output:
+            with tracer.span("git diff --staged", "git"):
+                result = subprocess.run(
+                    STAGED_DIFF_COMMAND,
+                    cwd=self.worktree,
+                    stdout=output,
+                    stderr=subprocess.PIPE,
+                )
+            if result.returncode != 0:
+                raise subprocess.CalledProcessError(
+                    result.returncode, STAGED_DIFF_COMMAND, stderr=result.stderr
+                )
+            if output.seek(0, os.SEEK_END) == 0:
+                self._staged = []
+                yield iter(())
+                return
+            with mmap.mmap(output.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                separator = buffer.find(b"\0\0")
+                self._staged = parse_raw(buffer[: separator + 1])
+                yield parse_diff_buffer(buffer, separator + 2)
+
+    def staged_tree_key(self) -> Optional[str]:
+        """
+        Identify the staged changes with the object ids git already computed.
+
+        `git write-tree` returns the id of the tree the index would commit, and `HEAD^{tree}` the id of the
+        tree of the last commit. Together they identify the staged diff without generating it, so a cache
+        lookup never has to run `git diff --staged`. None is returned if the index can not be written as a tree.
+        """
+        native_key = self.try_native("staged_tree_key")
+        if native_key is not None:
+            return native_key
+        try:
+            index_tree = self.run(["write-tree"]).decode().strip()
+        except subprocess.CalledProcessError:
+            return None
+        try:
+            head_tree = self.run(["rev-parse", "--verify", "--quiet", "HEAD^{tree}"])
+            base = head_tree.decode().strip()
+        except subprocess.CalledProcessError:
+            base = EMPTY_TREE
+        return f"{base}..{index_tree}"
+
+    def try_native(self, method: str) -> Any:
+        """Call a method of the native reader, or return None if it is disabled or unsupported here."""
+        reader = self.reader()
+        if reader is None:
+            return None
+        from ai_git_commit.objects import UnsupportedRepository
+
+        try:
+            result = getattr(reader, method)()
+            # Generators are primed so that an unsupported feature is reported before the first line.
+            return (
+                chain([next(result)], result)
+                if isinstance(result, Iterator)
+                else result
+            )
+        except StopIteration:
+            return iter(())
+        except UnsupportedRepository:
+            return None
+
+    def iter_commit_diffs(self, rev_range: str) -> Iterator[CommitDiff]:
+        """
+        Stream the diffs of the commits of a revision range, oldest first.
+
+        All the diffs are read from a single `git log --patch` process, merges being diffed against their
+        first parent, so a range of any length costs one fork and only one diff is in memory at a time.
+        """
+        command = [*LOG_DIFF_COMMAND, rev_range, "--"]
+        process = subprocess.Popen(
+            command, cwd=self.worktree, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        assert process.stdout is not None
+        completed = False
+        try:
+            header: Optional[str] = None
+            lines: List[str] = []
+            for line in iter_lines(b"", process.stdout):
+                if line.startswith("\0"):
+                    if header is not None:
+                        yield commit_diff(header, lines)
+                    header, lines = line[1:].rstrip("\n"), []
+                else:
+                    lines.append(line)
+            if header is not None:
+                yield commit_diff(header, lines)
+            completed = True
+        finally:
+            if not completed:
+                process.kill()
+            stderr = process.stderr.read() if process.stderr is not None else b""
+            process.wait()
+            process.stdout.close()
+            if process.stderr is not None:
+                process.stderr.close()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(
+                process.returncode, command, stderr=stderr
+            )
+
+    def commit(self, commit_message: ICommitMessage) -> None:
+        message_path = self.git_dir / "COMMIT_EDITMSG"
+        with open(message_path, "w") as f:
+            f.write(f"{commit_message['subject']}\n\n")
+            for line in commit_message["body"]:
+                f.write(f" - {line}\n")
+        with tracer.span("git commit", "git"):
+            subprocess.check_output(
+                ["git", "commit", "-F", str(message_path)], cwd=self.worktree
+            )
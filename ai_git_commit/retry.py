@@ -0,0 +1,275 @@
+import asyncio
+import random
+import threading
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    TypeVar,
+)
+
+from ai_git_commit.providers import ProviderError
+
+T = TypeVar("T")
+
+# 408 timeout, 409 conflict, 425 too early, 429 rate limited and the transient server errors.
+RETRYABLE_STATUSES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+
+
+class AttemptTimeout(ProviderError):
+    """Raised when an attempt does not complete before its deadline."""
+
+
+class BudgetExhausted(ProviderError):
+    """Raised when the shared RequestBudget does not allow another request."""
+
+
+class RetryPolicy(NamedTuple):
+    """How many times and how long to wait before trying a failed request again."""
+
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    attempt_timeout: Optional[float] = None
+    max_retry_after: float = 120.0
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    The is_retryable function tells if a failed request may succeed when sent again.
+
+    Connection errors and timeouts (which have no status) are retried, as well as the rate limit and
+    transient server errors listed in RETRYABLE_STATUSES. Other client errors, like a wrong API key, are not.
+
+    :param error:BaseException: Used to Pass the error raised by the attempt.
+    :return: True if the request should be retried.
+
+    :doc-author: coderj001
+    """
+    if isinstance(error, BudgetExhausted):
+        return False
+    if isinstance(error, ProviderError):
+        return error.status is None or error.status in RETRYABLE_STATUSES
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+def backoff_delay(
+    policy: RetryPolicy,
+    attempt: int,
+    error: Optional[BaseException] = None,
+    rng: Optional[random.Random] = None,
+) -> float:
+    """
+    The backoff_delay function computes how long to wait before the next attempt.
+
+    The delay grows exponentially with the attempt and is drawn uniformly below that bound ("full jitter"),
+    so the clients rate limited together do not retry together. A `Retry-After` sent by the server is a
+    lower bound of the delay.
+
+    :param policy:RetryPolicy: Used to Pass the base and maximum delays.
+    :param attempt:int: Used to Pass the number of the failed attempt, starting at 0.
+    :param error:Optional[BaseException]: Used to Pass the error, to honor its Retry-After.
+    :param rng:Optional[random.Random]: Used to Draw the jitter, mostly for tests.
+    :return: The delay in seconds.
+
+    :doc-author: coderj001
+    """
+    bound = min(policy.max_delay, policy.base_delay * 2**attempt)
+    delay = (rng or random).uniform(0, bound)
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, policy.max_retry_after))
+    return delay
+
+
+class RateLimiter:
+    """
+    A token bucket shared by the concurrent requests of a run.
+
+    Every request reserves a token, and waits for it if the bucket is empty, so the requests are spread at
+    `rate` per second with bursts of up to `capacity`. When the server answers 429, `pause` holds all the
+    requests until its Retry-After instead of letting each of them hit the limit again. Reservations are
+    computed under a lock and waited outside of it, so threads and coroutines can share a limiter.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate or 1, 1)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it."""
+        with self.lock:
+            now = self.clock()
+            wait = max(self.paused_until - now, 0.0)
+            if self.rate is None:
+                return wait
+            elapsed = max(now - self.updated, 0.0)
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = max(self.updated, now)
+            self.tokens -= 1
+            if self.tokens < 0:
+                # The bucket refills from `updated`, which is the end of a pause when there is one.
+                wait = max(wait, self.updated - now - self.tokens / self.rate)
+            return wait
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            now = self.clock()
+            self.paused_until = max(self.paused_until, now + seconds)
+            # The tokens saved up while paused would all be spent at once when it ends.
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = max(self.updated, self.paused_until)
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RequestBudget:
+    """A thread-safe count of the requests, retries included, a run is allowed to send."""
+
+    def __init__(self, max_requests: int) -> None:
+        self.max_requests = max_requests
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def spend(self) -> None:
+        with self.lock:
+            if self.used >= self.max_requests:
+                raise BudgetExhausted(
+                    f"Request budget of {self.max_requests} requests exhausted"
+                )
+            self.used += 1
+
+
+class Retrier:
+    """
+    Runs a request with the retries of a RetryPolicy, behind a shared RateLimiter and RequestBudget.
+
+    The same Retrier can be used by many threads and coroutines at once: the limiter and the budget are the
+    only state, and both are thread-safe.
+    """
+
+    def __init__(
+        self,
+        policy: RetryPolicy = RetryPolicy(),
+        limiter: Optional[RateLimiter] = None,
+        budget: Optional[RequestBudget] = None,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.policy = policy
+        self.limiter = limiter or RateLimiter()
+        self.budget = budget
+        self.rng = rng
+
+    def before_attempt(self) -> float:
+        if self.budget is not None:
+            self.budget.spend()
+        return self.limiter.reserve()
+
+    def after_failure(self, error: BaseException, attempt: int) -> float:
+        if not is_retryable(error) or attempt + 1 >= self.policy.max_attempts:
+            raise error
+        retry_after = getattr(error, "retry_after", None)
+        if getattr(error, "status", None) == 429 and retry_after is not None:
+            self.limiter.pause(min(retry_after, self.policy.max_retry_after))
+        return backoff_delay(self.policy, attempt, error, self.rng)
+
+    def call(self, function: Callable[[], T]) -> T:
+        for attempt in range(self.policy.max_attempts):
+            wait = self.before_attempt()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                return run_with_deadline(function, self.policy.attempt_timeout)
+            except Exception as error:
+                time.sleep(self.after_failure(error, attempt))
+        raise AssertionError("unreachable")
+
+    async def acall(self, function: Callable[[], Awaitable[T]]) -> T:
+        for attempt in range(self.policy.max_attempts):
+            wait = self.before_attempt()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                if self.policy.attempt_timeout is None:
+                    return await function()
+                try:
+                    return await asyncio.wait_for(
+                        function(), self.policy.attempt_timeout
+                    )
+                except asyncio.TimeoutError as error:
+                    raise AttemptTimeout(
+                        f"Attempt timed out after {self.policy.attempt_timeout}s"
+                    ) from error
+            except Exception as error:
+                await asyncio.sleep(self.after_failure(error, attempt))
+        raise AssertionError("unreachable")
+
+
+def get_retrier(config: Mapping[str, Any]) -> Retrier:
+    """
+    The get_retrier function builds the Retrier of a run from the `max_retries`, `requests_per_minute`,
+    `attempt_timeout` and `max_requests` config.
+
+    :param config:Mapping[str, Any]: Used to Pass the parsed config, usually from get_config.
+    :return: A Retrier, with a RateLimiter at the configured rate or an unlimited one, and a RequestBudget
+        when `max_requests` is set.
+
+    :doc-author: coderj001
+    """
+    requests_per_minute = config.get("requests_per_minute") or 0
+    max_requests = config.get("max_requests") or 0
+    return Retrier(
+        RetryPolicy(
+            max_attempts=1 + (config.get("max_retries") or 0),
+            attempt_timeout=config.get("attempt_timeout") or None,
+        ),
+        RateLimiter(requests_per_minute / 60 if requests_per_minute else None),
+        RequestBudget(max_requests) if max_requests else None,
+    )
+
+
+def run_with_deadline(function: Callable[[], T], timeout: Optional[float]) -> T:
+    # A blocking call cannot be interrupted, so it runs in a daemon thread that is abandoned at the
+    # deadline; the pooled connection it holds is closed by its own socket timeout.
+    if timeout is None:
+        return function()
+    results: List[T] = []
+    errors: List[BaseException] = []
+
+    def target() -> None:
+        try:
+            results.append(function())
+        except BaseException as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise AttemptTimeout(f"Attempt timed out after {timeout}s")
+    if errors:
+        raise errors[0]
+    return results[0]
@@ -0,0 +1,124 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import IO, Any, Dict, Iterator, List, NamedTuple
+
+
+class Span(NamedTuple):
+    """A timed section of a run, in seconds from the start of the trace."""
+
+    name: str
+    category: str
+    start: float
+    duration: float
+    lane: int
+    args: Dict[str, Any]
+
+
+def current_lane() -> int:
+    # Concurrent asyncio tasks overlap on one thread, so each of them gets its own lane in the trace.
+    # asyncio is only looked up when a command already imported it, to keep the startup light.
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is not None:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            return id(task)
+    return threading.get_ident()
+
+
+class Tracer:
+    """
+    Records the spans of a run, for `--profile` and `--trace`.
+
+    Tracing is disabled until `enable` is called, and a disabled span only costs a context manager, so the
+    spans are left in the code paths they measure. Spans are recorded from any thread or task.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+
+    def enable(self) -> None:
+        with self.lock:
+            self.enabled = True
+            self.origin = time.perf_counter()
+            self.spans = []
+
+    @contextlib.contextmanager
+    def span(
+        self, name: str, category: str = "app", **args: Any
+    ) -> Iterator[Dict[str, Any]]:
+        """Time the block; the yielded args can be completed inside it, e.g. with token counts."""
+        if not self.enabled:
+            yield args
+            return
+        start = time.perf_counter()
+        try:
+            yield args
+        except BaseException as error:
+            args["error"] = type(error).__name__
+            raise
+        finally:
+            end = time.perf_counter()
+            span = Span(
+                name, category, start - self.origin, end - start, current_lane(), args
+            )
+            with self.lock:
+                self.spans.append(span)
+
+    def summary(self) -> str:
+        with self.lock:
+            spans = list(self.spans)
+        wall = time.perf_counter() - self.origin
+        totals: Dict[str, List[float]] = {}
+        for span in spans:
+            totals.setdefault(span.name, []).append(span.duration)
+        lines = [
+            f"{'span':<32} {'count':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'% wall':>7}"
+        ]
+        for name, durations in sorted(totals.items(), key=lambda item: -sum(item[1])):
+            total = sum(durations)
+            lines.append(
+                f"{name:<32} {len(durations):>6} {total * 1000:>10.1f} "
+                f"{total * 1000 / len(durations):>9.1f} {max(durations) * 1000:>9.1f} "
+                f"{total * 100 / wall if wall > 0 else 0:>6.1f}%"
+            )
+        lines.append(f"{'wall':<32} {'':>6} {wall * 1000:>10.1f}")
+        return "\n".join(lines) + "\n"
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """The spans in the Chrome trace event format, for chrome://tracing or Perfetto."""
+        with self.lock:
+            spans = list(self.spans)
+        pid = os.getpid()
+        return {
+            "displayTimeUnit": "ms",
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": round(span.start * 1_000_000, 3),
+                    "dur": round(span.duration * 1_000_000, 3),
+                    "pid": pid,
+                    "tid": span.lane,
+                    "args": span.args,
+                }
+                for span in spans
+            ],
+        }
+
+    def write_chrome_trace(self, output: IO[str]) -> None:
+        json.dump(self.chrome_trace(), output, default=str)
+        output.write("\n")
+
+
+tracer = Tracer()
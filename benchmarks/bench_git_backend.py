@@ -0,0 +1,94 @@
+"""
+Compare the git subprocess backend with the pure-Python object reader on synthetic repositories.
+
+    python benchmarks/bench_git_backend.py --files 2000 --staged 20 --repeat 10
+
+Each run opens a new GitRepository session and reads the status, the staged files, the staged diff
+and the staged tree key, which is what a commit run (or a pre-commit hook) asks for.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ai_git_commit.repository import GitRepository  # noqa: E402
+
+
+def git(cwd: Path, *args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+def make_repository(root: Path, files: int, staged: int, packed: bool) -> Path:
+    git(root, "init", "-q")
+    for index in range(files):
+        path = root / f"pkg{index % 20}" / f"module{index}.py"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(
+            "".join(
+                f"def func{n}(value):\n    return value + {n}\n\n" for n in range(30)
+            )
+        )
+    git(root, "add", "-A")
+    git(root, "commit", "-q", "-m", "init")
+    if packed:
+        git(root, "gc", "-q")
+    for index in range(staged):
+        path = root / f"pkg{index % 20}" / f"module{index}.py"
+        path.write_text(path.read_text().replace("value + 7", "value * 7"))
+    git(root, "add", "-A")
+    return root
+
+
+def session(root: Path, native: bool) -> int:
+    repository = GitRepository(root, root / ".git", native=native)
+    repository.status()
+    repository.staged_tree_key()
+    lines = sum(
+        len(hunk.lines) for f in repository.iter_staged_diff() for hunk in f.hunks
+    )
+    repository.staged_files()
+    return lines
+
+
+def measure(root: Path, native: bool, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        session(root, native)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--staged", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'repository':<12} {'backend':<8} {'median ms':>10} {'min ms':>8}")
+    for packed in (False, True):
+        with tempfile.TemporaryDirectory() as directory:
+            root = make_repository(Path(directory), args.files, args.staged, packed)
+            assert session(root, True) == session(root, False)
+            for native in (False, True):
+                timings = measure(root, native, args.repeat)
+                print(
+                    f"{'packed' if packed else 'loose':<12} "
+                    f"{'native' if native else 'git':<8} "
+                    f"{statistics.median(timings):>10.1f} {min(timings):>8.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
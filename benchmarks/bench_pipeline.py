@@ -0,0 +1,283 @@
+"""
+Measure every stage of the commit pipeline on synthetic repositories, against a local fake model server.
+
+    python benchmarks/bench_pipeline.py --sizes small,medium --repeat 20 --format json > bench.json
+
+The stages are the ones of a commit run: repository detection, status, staged diff, compaction, prompt
+build, generation (streamed from a fake OpenAI compatible server on localhost, so the network and the
+model do not add noise) and commit. Each stage is timed `--repeat` times and reported as p50/p90/p99
+latencies, then run once more under tracemalloc for its peak memory. `--format json` prints a single
+document with the environment and the results, to be stored and compared over time.
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ai_git_commit.compact import compact_diff  # noqa: E402
+from ai_git_commit.config import ICommitMessage  # noqa: E402
+from ai_git_commit.openai import agenerate_commit_messages  # noqa: E402
+from ai_git_commit.prompts import get_prompt  # noqa: E402
+from ai_git_commit.providers import LocalProvider, OpenAIProvider  # noqa: E402
+from ai_git_commit.repository import GitRepository  # noqa: E402
+
+STAGES = ("detect", "status", "diff", "compact", "prompt", "generate", "commit")
+TOKEN_BUDGET = 3000
+
+
+class RepositorySize(NamedTuple):
+    files: int
+    staged: int
+    hunks: int
+    binaries: int
+
+
+SIZES = {
+    "small": RepositorySize(files=50, staged=3, hunks=2, binaries=0),
+    "medium": RepositorySize(files=1000, staged=30, hunks=5, binaries=5),
+    "large": RepositorySize(files=10000, staged=200, hunks=10, binaries=20),
+}
+
+
+def git(cwd: Path, *args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+def make_repository(root: Path, size: RepositorySize) -> Path:
+    git(root, "init", "-q")
+    # The commit stage runs `git commit` through GitRepository, without the `-c` of this helper.
+    git(root, "config", "user.name", "bench")
+    git(root, "config", "user.email", "bench@example.com")
+    for index in range(size.files):
+        path = root / f"pkg{index % 50}" / f"module{index}.py"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(
+            "".join(
+                f"def func{n}(value):\n    return value + {n}\n\n" for n in range(40)
+            )
+        )
+    for index in range(size.binaries):
+        (root / "assets").mkdir(exist_ok=True)
+        (root / "assets" / f"blob{index}.bin").write_bytes(bytes(range(256)) * 64)
+    git(root, "add", "-A")
+    git(root, "commit", "-q", "-m", "init")
+    for index in range(size.staged):
+        path = root / f"pkg{index % 50}" / f"module{index}.py"
+        text = path.read_text()
+        # The changed functions are far enough apart to be separate hunks.
+        for hunk in range(size.hunks):
+            n = hunk * 40 // size.hunks
+            text = text.replace(f"value + {n}\n", f"value * {n} + {index}\n")
+        path.write_text(text)
+    for index in range(size.binaries):
+        path = root / "assets" / f"blob{index}.bin"
+        path.write_bytes(path.read_bytes()[::-1])
+    git(root, "add", "-A")
+    return root
+
+
+def fake_model_server(latency: float) -> ThreadingHTTPServer:
+    """An OpenAI compatible `/completions` endpoint streaming the answers of LocalProvider."""
+    local = LocalProvider()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            text = local.complete(body["prompt"], body["model"], body["max_tokens"])
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            events = [text[start : start + 16] for start in range(0, len(text), 16)]
+            for part in events:
+                event = json.dumps({"choices": [{"text": part}]})
+                self.write_chunk(f"data: {event}\n\n".encode())
+            self.write_chunk(b"data: [DONE]\n\n")
+            self.write_chunk(b"")
+
+        def write_chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Pipeline:
+    """One commit run, split in stages that pass their results to the next one."""
+
+    def __init__(self, root: Path, provider: OpenAIProvider) -> None:
+        self.root = root
+        self.provider = provider
+        self.state: Dict[str, Any] = {}
+
+    def detect(self) -> None:
+        self.state["repository"] = GitRepository.discover(str(self.root))
+
+    def status(self) -> None:
+        self.state["repository"].status()
+
+    def diff(self) -> None:
+        self.state["files"] = list(self.state["repository"].iter_staged_diff())
+
+    def compact(self) -> None:
+        self.state["diff"] = compact_diff(iter(self.state["files"]), TOKEN_BUDGET)
+
+    def prompt(self) -> None:
+        self.state["prompt"] = get_prompt(5).render(self.state["diff"], 2)
+
+    def generate(self) -> None:
+        async def collect() -> List[ICommitMessage]:
+            return [
+                message
+                async for message in agenerate_commit_messages(
+                    self.state["diff"],
+                    variants=((5, "bench"), (4, "bench")),
+                    num_of_commit_messages=2,
+                    provider=self.provider,
+                )
+            ]
+
+        self.state["messages"] = asyncio.run(collect())
+
+    def commit(self) -> None:
+        self.state["repository"].commit(self.state["messages"][0])
+
+    def undo_commit(self) -> None:
+        git(self.root, "reset", "-q", "--soft", "HEAD~1")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def run_stages(pipeline: Pipeline, timings: Dict[str, List[float]]) -> None:
+    for stage in STAGES:
+        start = time.perf_counter()
+        getattr(pipeline, stage)()
+        timings[stage].append((time.perf_counter() - start) * 1000)
+    pipeline.undo_commit()
+
+
+def peak_memory(pipeline: Pipeline) -> Dict[str, int]:
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for stage in STAGES:
+            tracemalloc.reset_peak()
+            getattr(pipeline, stage)()
+            peaks[stage] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    pipeline.undo_commit()
+    return peaks
+
+
+def benchmark(
+    name: str, size: RepositorySize, repeat: int, provider: OpenAIProvider
+) -> List[Dict[str, Any]]:
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline = Pipeline(make_repository(Path(directory), size), provider)
+        timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        run_stages(pipeline, {stage: [] for stage in STAGES})  # warm up
+        for _ in range(repeat):
+            run_stages(pipeline, timings)
+        peaks = peak_memory(pipeline)
+    return [
+        {
+            "repository": name,
+            **size._asdict(),
+            "stage": stage,
+            "runs": len(timings[stage]),
+            "p50_ms": round(percentile(timings[stage], 0.5), 3),
+            "p90_ms": round(percentile(timings[stage], 0.9), 3),
+            "p99_ms": round(percentile(timings[stage], 0.99), 3),
+            "peak_kib": round(peaks[stage] / 1024, 1),
+        }
+        for stage in STAGES
+    ]
+
+
+def print_table(results: List[Dict[str, Any]], write: Callable[[str], Any]) -> None:
+    write(
+        f"{'repository':<12} {'stage':<10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'peak KiB':>10}\n"
+    )
+    for row in results:
+        write(
+            f"{row['repository']:<12} {row['stage']:<10} {row['p50_ms']:>9.2f} "
+            f"{row['p90_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['peak_kib']:>10.1f}\n"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="small,medium")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--model-latency",
+        type=float,
+        default=0.0,
+        help="Seconds the fake model server waits before answering.",
+    )
+    parser.add_argument("--format", choices=("table", "json"), default="table")
+    args = parser.parse_args()
+
+    server = fake_model_server(args.model_latency)
+    provider = OpenAIProvider(
+        api_key="sk-bench", api_base=f"http://127.0.0.1:{server.server_port}/v1"
+    )
+    results = []
+    try:
+        for name in args.sizes.split(","):
+            results.extend(benchmark(name, SIZES[name], args.repeat, provider))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if args.format == "table":
+        print_table(results, sys.stdout.write)
+        return
+    git_version = subprocess.run(
+        ["git", "--version"], capture_output=True, text=True
+    ).stdout.strip()
+    document = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "git": git_version,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "results": results,
+    }
+    json.dump(document, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Measure the time to the first prompt of the interactive commit message and the completion latency per keystroke.
+
+    python benchmarks/bench_ui.py --repeat 50
+
+The prompts read their keys from a pipe and render to a dummy output, so the figures are the cost of
+building and running the prompts, not of a terminal. The first run builds the shared PromptSession, its
+style, lexer and completion index; the next ones reuse them. The completion latency is the time to list
+the commit types for each prefix typed, with the TypeCompleter index and with a linear scan of the types.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from prompt_toolkit.application import create_app_session  # noqa: E402
+from prompt_toolkit.document import Document  # noqa: E402
+from prompt_toolkit.input import create_pipe_input  # noqa: E402
+from prompt_toolkit.output import DummyOutput  # noqa: E402
+
+from ai_git_commit.git import (  # noqa: E402
+    COMMIT_TYPES,
+    TypeCompleter,
+    git_user_commit_message,
+)
+
+KEYSTROKES = ["", "f", "fe", "fea", "feat", "r", "re", "ref", "rfc", "mon", "x"]
+
+
+def import_time() -> float:
+    code = (
+        "import time; start = time.perf_counter(); import ai_git_commit.git; "
+        "print(time.perf_counter() - start)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).resolve().parent.parent,
+    )
+    return float(result.stdout)
+
+
+def run_prompts() -> float:
+    with create_pipe_input() as pipe_input:
+        with create_app_session(input=pipe_input, output=DummyOutput()):
+            pipe_input.send_text("feat\rAdd the benchmark\r\r")
+            start = time.perf_counter()
+            git_user_commit_message()
+            return time.perf_counter() - start
+
+
+def linear_matches(word: str) -> List[str]:
+    # The scan of the types git_user_commit_message did on every keystroke before the index.
+    return [option.value for option in COMMIT_TYPES if option.value.startswith(word)]
+
+
+def keystroke_latency(match: Callable[[str], object], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for word in KEYSTROKES:
+            match(word)
+    return (time.perf_counter() - start) / (repeat * len(KEYSTROKES))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    imports = min(import_time() for _ in range(3))
+    first = run_prompts()
+    warm = [run_prompts() for _ in range(args.repeat)]
+    print(f"import ai_git_commit.git:      {imports * 1000:8.2f} ms")
+    print(f"first run (builds the session): {first * 1000:8.2f} ms")
+    print(f"next runs (median):             {statistics.median(warm) * 1000:8.2f} ms")
+
+    completer = TypeCompleter()
+    repeat = args.repeat * 100
+    indexed = keystroke_latency(completer.matches, repeat)
+    completions = keystroke_latency(
+        lambda word: list(completer.get_completions(Document(word), None)), repeat
+    )
+    linear = keystroke_latency(linear_matches, repeat)
+    print(f"keystroke, index (with fuzzy):  {indexed * 1e6:8.2f} us")
+    print(f"keystroke, Completion objects:  {completions * 1e6:8.2f} us")
+    print(f"keystroke, linear prefix scan:  {linear * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import shutil
+import subprocess
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from ai_git_commit.providers import Provider
+from ai_git_commit.repository import CommitDiff
+
+
+def run_git(cwd, *args):
+    return subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    ).stdout
+
+
+@pytest.fixture
+def git():
+    if shutil.which("git") is None:
+        pytest.skip("needs git")
+    return run_git
+
+
+@pytest.fixture
+def make_history(git):
+    def make(path):
+        git(path, "init", "-q")
+        for index in range(4):
+            (path / f"module{index}.py").write_text(f"value = {index}\n")
+            git(path, "add", "-A")
+            git(path, "commit", "-q", "-m", f"wip {index}")
+        git(path, "commit", "-q", "--allow-empty", "-m", "empty")
+
+    return make
+
+
+@pytest.fixture
+def commit_diff():
+    def make(index):
+        return CommitDiff(
+            f"{index:040x}",
+            f"wip {index}",
+            f"diff --git a/m{index}.py b/m{index}.py\n@@ -1 +1 @@\n-a\n+b{index}\n",
+        )
+
+    return make
+
+
+class FakeProvider(Provider):
+    name = "fake"
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.prompts = []
+
+    def complete(self, prompt, model, max_tokens, temperature=0.35):
+        self.prompts.append(prompt)
+        return self.respond(prompt, model)
+
+    async def acomplete(self, prompt, model, max_tokens, temperature=0.35):
+        self.prompts.append(prompt)
+        result = self.respond(prompt, model)
+        return await result if asyncio.iscoroutine(result) else result
+
+
+class StreamingProvider(FakeProvider):
+    async def astream(self, prompt, model, max_tokens, temperature=0.35):
+        text = self.respond(prompt, model)
+        for start in range(0, len(text), 8):
+            await asyncio.sleep(0.001)
+            yield text[start : start + 8]
+
+
+@pytest.fixture
+def fake_provider():
+    return FakeProvider
+
+
+@pytest.fixture
+def streaming_provider():
+    return StreamingProvider
+
+
+@pytest.fixture
+def completion():
+    def make(*subjects):
+        return json.dumps(
+            {
+                "commit_messages": [
+                    {"subject": subject, "body": []} for subject in subjects
+                ]
+            }
+        )
+
+    return make
+
+
+@pytest.fixture
+def http_server():
+    servers = []
+
+    def start(handler):
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        httpd.daemon_threads = True
+        httpd.handle_error = lambda request, client_address: None
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return f"http://127.0.0.1:{httpd.server_port}"
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
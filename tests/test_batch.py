@@ -0,0 +1,84 @@
+import asyncio
+import json
+import subprocess
+
+import pytest
+from click.testing import CliRunner
+
+from ai_git_commit import main
+from ai_git_commit.batch import BatchStats, agenerate_batch
+from ai_git_commit.repository import GitRepository
+
+
+def test_agenerate_batch_keeps_order_and_bounds_concurrency(
+    completion, fake_provider, commit_diff
+):
+    running = []
+    peak = []
+
+    async def respond(prompt, model):
+        index = int(prompt.split("+b")[1].split()[0])
+        running.append(index)
+        peak.append(len(running))
+        await asyncio.sleep(0.02 if index % 2 else 0.001)
+        running.remove(index)
+        if index == 3:
+            raise ValueError("model error")
+        return completion(f"feat: Commit {index}")
+
+    async def collect():
+        return [
+            result
+            async for result in agenerate_batch(
+                iter([commit_diff(index) for index in range(8)]),
+                jobs=3,
+                provider=fake_provider(respond),
+            )
+        ]
+
+    results = asyncio.run(collect())
+    assert [result.original_subject for result in results] == [
+        f"wip {index}" for index in range(8)
+    ]
+    assert results[0].message["subject"] == "feat: Commit 0"
+    assert results[3].message is None
+    assert results[3].error == "model error"
+    assert max(peak) <= 3
+
+
+def test_iter_commit_diffs(tmp_path, make_history):
+    make_history(tmp_path)
+    repository = GitRepository(tmp_path, tmp_path / ".git")
+    commits = list(repository.iter_commit_diffs("HEAD~3..HEAD"))
+    assert [commit.subject for commit in commits] == ["wip 2", "wip 3", "empty"]
+    assert commits[0].diff.startswith("diff --git a/module2.py b/module2.py\n")
+    assert "+value = 3\n" in commits[1].diff
+    assert commits[2].diff == ""
+    with pytest.raises(subprocess.CalledProcessError):
+        list(repository.iter_commit_diffs("unknown..HEAD"))
+
+
+def test_batch_command(tmp_path, monkeypatch, make_history):
+    make_history(tmp_path)
+    (tmp_path / ".env").write_text("provider=local\n")
+    monkeypatch.chdir(tmp_path)
+    result = CliRunner().invoke(main, ["--no-cache", "batch", "HEAD~4..HEAD"])
+    assert result.exit_code == 0, result.output
+    lines = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [line["original_subject"] for line in lines] == [
+        "wip 1",
+        "wip 2",
+        "wip 3",
+        "empty",
+    ]
+    assert lines[0]["subject"] == "feat(module1): Add module1.py"
+    assert lines[3]["error"] == "No diff provided"
+    assert "commits/s" in result.stderr
+
+
+def test_batch_stats_report():
+    stats = BatchStats(commits=10, failed=1, seconds=4)
+    assert stats.commits_per_second == 2.5
+    assert stats.report() == (
+        "Generated 9 commit messages for 10 commits (1 failed) in 4.0s: 2.50 commits/s"
+    )
@@ -0,0 +1,75 @@
+import os
+import time
+from unittest.mock import patch
+
+from ai_git_commit.cache import DiskCache, cache_key, get_cache_dir, normalize_diff
+
+
+def test_get_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert get_cache_dir() == tmp_path / "ai-git-commit"
+
+
+def test_normalize_diff():
+    assert normalize_diff("+a  \r\n-b\n\n") == normalize_diff("+a\n-b")
+
+
+def test_cache_key():
+    assert cache_key("diff", 5, "model") == cache_key("diff", 5, "model")
+    assert cache_key("diff", 5, "model") != cache_key("diff", 5, "other")
+    assert cache_key("ab", "c") != cache_key("a", "bc")
+
+
+def test_disk_cache_get_set(tmp_path):
+    cache = DiskCache(tmp_path)
+    assert cache.get("abc") is None
+    cache.set("abc", "message")
+    assert cache.get("abc") == "message"
+    assert (tmp_path / "ab" / "abc").is_file()
+
+
+def test_disk_cache_max_age(tmp_path):
+    cache = DiskCache(tmp_path, max_age=60)
+    cache.set("abc", "message")
+    past = time.time() - 120
+    os.utime(cache.entry_path("abc"), (past, past))
+    assert cache.get("abc") is None
+    assert not cache.entry_path("abc").exists()
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(tmp_path, max_size=20)
+    cache.set("aaa", "x" * 8)
+    cache.set("bbb", "x" * 8)
+    past = time.time() - 10
+    os.utime(cache.entry_path("aaa"), (past, past))
+    os.utime(cache.entry_path("bbb"), (past - 5, past - 5))
+    cache.get("bbb")
+    cache.set("ccc", "x" * 8)
+    assert cache.get("aaa") is None
+    assert cache.get("bbb") == "x" * 8
+    assert cache.get("ccc") == "x" * 8
+
+
+def test_disk_cache_scans_entries_only_when_needed(tmp_path):
+    cache = DiskCache(tmp_path, max_size=100, scan_every=50)
+    with patch.object(cache, "entries", wraps=cache.entries) as entries:
+        for index in range(10):
+            cache.set(f"{index:03}", "x" * 8)
+        # The first write scans the cache, the next ones keep a running size.
+        assert entries.call_count == 1
+        assert cache.size == 80
+        cache.set("003", "x" * 4)
+        assert cache.size == 76
+        for index in range(10, 14):
+            cache.set(f"{index:03}", "x" * 8)
+        # Over max_size, the least recently used entries are evicted.
+        assert entries.call_count == 2
+        assert cache.size <= 100
+
+
+def test_disk_cache_clear(tmp_path):
+    cache = DiskCache(tmp_path)
+    cache.set("abc", "message")
+    cache.clear()
+    assert cache.get("abc") is None
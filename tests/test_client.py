@@ -0,0 +1,202 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from ai_git_commit.client import HTTPClient, PoolTimeout, aiter_thread
+from ai_git_commit.providers import OpenAIProvider
+
+
+@pytest.fixture
+def server(http_server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        peers = []
+        delay = 0.0
+        disconnected = threading.Event()
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            Handler.peers.append(self.client_address[1])
+            if self.path.startswith("/stall"):
+                # One event, then nothing until the client goes away.
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                event = json.dumps({"choices": [{"text": "first"}]})
+                self.wfile.write(f"data: {event}\n\n".encode())
+                self.wfile.flush()
+                self.rfile.read(1)
+                Handler.disconnected.set()
+                return
+            time.sleep(Handler.delay)
+            data = json.dumps({"choices": [{"text": body.decode()}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if self.path == "/close":
+                self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return http_server(Handler), Handler
+
+
+def test_requests_reuse_connection(server):
+    url, handler = server
+    with HTTPClient() as client:
+        for index in range(5):
+            response = client.request("POST", f"{url}/v1", body=str(index).encode())
+            assert response.status == 200
+            assert response.json()["choices"][0]["text"] == str(index)
+    assert len(handler.peers) == 5
+    assert len(set(handler.peers)) == 1
+
+
+def test_connection_close_opens_new_connection(server):
+    url, handler = server
+    with HTTPClient() as client:
+        client.request("POST", f"{url}/close", body=b"a")
+        client.request("POST", f"{url}/close", body=b"b")
+    assert len(set(handler.peers)) == 2
+
+
+def test_concurrent_requests_are_bounded_by_pool_size(server):
+    url, handler = server
+    handler.delay = 0.02
+    with HTTPClient(max_connections=3) as client:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            texts = list(
+                executor.map(
+                    lambda index: client.request(
+                        "POST", f"{url}/v1", body=str(index).encode()
+                    ).json()["choices"][0]["text"],
+                    range(24),
+                )
+            )
+        pool = next(iter(client.pools.values()))
+    assert texts == [str(index) for index in range(24)]
+    assert len(set(handler.peers)) <= 3
+    assert pool.created <= 3
+
+
+def test_pool_timeout(server):
+    url, handler = server
+    handler.delay = 0.3
+    with HTTPClient(max_connections=1, pool_timeout=0.05) as client:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(client.request, "POST", url, b"a")
+            time.sleep(0.05)
+            with pytest.raises(PoolTimeout):
+                client.request("POST", url, b"b")
+            assert first.result().status == 200
+
+
+def test_stale_connection_is_replaced(server):
+    url, handler = server
+    with HTTPClient() as client:
+        client.request("POST", url, b"a")
+        pool = next(iter(client.pools.values()))
+        # Simulate the server closing the idle connection.
+        idle = pool.idle.get_nowait()
+        idle.sock.shutdown(socket.SHUT_RDWR)
+        pool.idle.put(idle)
+        assert client.request("POST", url, b"b").json()["choices"][0]["text"] == "b"
+    assert len(set(handler.peers)) == 2
+
+
+def test_read_timeout(server):
+    url, handler = server
+    handler.delay = 0.5
+    with HTTPClient(timeout=0.1) as client:
+        with pytest.raises(socket.timeout):
+            client.request("POST", url, b"a")
+
+
+def test_arequest_from_many_tasks(server):
+    url, handler = server
+
+    async def run(client):
+        responses = await asyncio.gather(
+            *(client.arequest("POST", url, str(i).encode()) for i in range(10))
+        )
+        return [response.json()["choices"][0]["text"] for response in responses]
+
+    with HTTPClient(max_connections=2) as client:
+        assert asyncio.run(run(client)) == [str(i) for i in range(10)]
+    assert len(set(handler.peers)) <= 2
+
+
+def test_openai_provider_shares_client(server):
+    url, handler = server
+    with HTTPClient() as client:
+        first = OpenAIProvider(api_base=f"{url}/v1", client=client)
+        second = OpenAIProvider(api_base=f"{url}/v1", client=client)
+        assert json.loads(first.complete("prompt", "model", 16))["prompt"] == "prompt"
+        second.complete("prompt", "model", 16)
+    assert len(set(handler.peers)) == 1
+
+
+def test_stream_releases_connection_once_read(server):
+    url, handler = server
+    with HTTPClient() as client:
+        with client.stream("POST", url, b"a") as response:
+            assert response.status == 200
+            assert b"".join(response.lines()) == b'{"choices": [{"text": "a"}]}'
+        with client.stream("POST", url, b"b") as response:
+            # Leaving before the end of the body closes the connection.
+            assert response.body.read(2) == b'{"'
+        client.request("POST", url, b"c")
+    assert handler.peers[0] == handler.peers[1] != handler.peers[2]
+
+
+def test_aiter_thread():
+    async def collect(factory, limit=None):
+        items = []
+        async for item in aiter_thread(factory):
+            items.append(item)
+            if len(items) == limit:
+                break
+        return items
+
+    closed = threading.Event()
+
+    def numbers():
+        try:
+            yield from range(1000)
+        finally:
+            closed.set()
+
+    assert asyncio.run(collect(lambda: iter("abc"))) == ["a", "b", "c"]
+    assert asyncio.run(collect(numbers, limit=2)) == [0, 1]
+    assert closed.wait(1)
+
+    def failing():
+        yield 1
+        raise ValueError("broken")
+
+    with pytest.raises(ValueError):
+        asyncio.run(collect(failing))
+
+
+def test_closing_a_stalled_stream_shuts_its_connection_down(server):
+    url, handler = server
+    provider = OpenAIProvider(api_base=f"{url}/stall", client=HTTPClient(timeout=30))
+
+    async def first():
+        texts = provider.astream("prompt", "model", 16)
+        text = await texts.__anext__()
+        await texts.aclose()
+        return text
+
+    assert asyncio.run(first()) == "first"
+    # Well before the read timeout of the client.
+    assert handler.disconnected.wait(5)
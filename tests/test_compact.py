@@ -0,0 +1,105 @@
+from ai_git_commit.compact import (
+    compact_diff,
+    estimate_tokens,
+    is_ignored_file,
+    is_whitespace_only,
+    split_diff,
+    trim_context,
+)
+from ai_git_commit.diff import DiffFile, DiffHunk, parse_diff
+
+
+def make_file(path: str, *hunks: DiffHunk) -> DiffFile:
+    file = DiffFile(path, [f"diff --git a/{path} b/{path}\n"])
+    file.hunks.extend(hunks)
+    return file
+
+
+def test_estimate_tokens() -> None:
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_is_ignored_file() -> None:
+    assert is_ignored_file(make_file("poetry.lock"))
+    assert is_ignored_file(make_file("web/package-lock.json"))
+    assert is_ignored_file(make_file("node_modules/left-pad/index.js"))
+    assert is_ignored_file(make_file("static/app.min.js"))
+    assert not is_ignored_file(make_file("ai_git_commit/git.py"))
+    binary = make_file("logo.png")
+    binary.binary = True
+    assert is_ignored_file(binary)
+
+
+def test_is_whitespace_only() -> None:
+    assert is_whitespace_only(DiffHunk("@@ -1 +1 @@\n", ["-a  =  1\n", "+a = 1\n"]))
+    assert not is_whitespace_only(DiffHunk("@@ -1 +1 @@\n", ["-a = 1\n", "+a = 2\n"]))
+
+
+def test_trim_context() -> None:
+    lines = [" 1\n", " 2\n", " 3\n", "-4\n", "+four\n", " 5\n", " 6\n", " 7\n"]
+    lines += [" 8\n", "+nine\n", " 10\n"]
+    hunks = trim_context(DiffHunk("@@ -1,10 +1,11 @@ def f():\n", lines), context=1)
+    assert [hunk.header for hunk in hunks] == [
+        "@@ -3,3 +3,3 @@ def f():\n",
+        "@@ -8,2 +8,3 @@ def f():\n",
+    ]
+    assert hunks[0].lines == [" 3\n", "-4\n", "+four\n", " 5\n"]
+    assert hunks[1].lines == [" 8\n", "+nine\n", " 10\n"]
+
+
+def test_compact_diff_drops_ignored_files() -> None:
+    diff = "".join(
+        [
+            "diff --git a/poetry.lock b/poetry.lock\n",
+            "@@ -1 +1 @@\n",
+            "-a\n" * 1000,
+            "diff --git a/app.py b/app.py\n",
+            "@@ -1 +1 @@\n",
+            "-a = 1\n",
+            "+a = 2\n",
+        ]
+    )
+    compacted = compact_diff(parse_diff(diff.splitlines(keepends=True)), 100)
+    assert "-a = 1\n+a = 2\n" in compacted
+    assert "# poetry.lock: binary or generated file changed\n" in compacted
+    assert "-a\n" not in compacted
+
+
+def test_compact_diff_keeps_important_hunks_within_budget() -> None:
+    small = DiffHunk("@@ -1 +1 @@\n", ["-x\n", "+y\n"])
+    large = DiffHunk("@@ -10 +10,20 @@\n", [f"+line {i}\n" for i in range(20)])
+    files = [make_file("a.py", small), make_file("b.py", large)]
+    compacted = compact_diff(files, 64)
+    assert estimate_tokens(compacted) <= 64
+    assert "+line 19\n" in compacted
+    assert "# a.py: 1 hunks omitted\n" in compacted
+
+
+def test_split_diff_by_file() -> None:
+    files = [
+        make_file("src/a.py", DiffHunk("@@ -1 +1 @@\n", ["-a\n", "+b\n"])),
+        make_file("src/b.py", DiffHunk("@@ -1 +1 @@\n", ["-c\n", "+d\n"])),
+    ]
+    chunks = split_diff(files)
+    assert [name for name, _ in chunks] == ["src/a.py", "src/b.py"]
+    assert "+b\n" in chunks[0][1] and "+d\n" in chunks[1][1]
+
+
+def test_split_diff_by_directory() -> None:
+    files = [
+        make_file("README.md", DiffHunk("@@ -1 +1 @@\n", ["-a\n", "+b\n"])),
+        make_file("src/a.py", DiffHunk("@@ -1 +1 @@\n", ["-a\n", "+b\n"])),
+        make_file("src/sub/c.py", DiffHunk("@@ -1 +1 @@\n", ["-a\n", "+b\n"])),
+        make_file("src/b.py", DiffHunk("@@ -1 +1 @@\n", ["-c\n", "+d\n"])),
+    ]
+    chunks = split_diff(files, group_by="directory")
+    assert [name for name, _ in chunks] == ["./", "src/", "src/sub/"]
+    assert "src/a.py" in chunks[1][1] and "src/b.py" in chunks[1][1]
+
+
+def test_split_diff_compacts_chunks() -> None:
+    large = DiffHunk("@@ -1 +1,200 @@\n", [f"+line {i}\n" for i in range(200)])
+    chunks = split_diff([make_file("a.py", large)], max_chunk_tokens=100)
+    assert estimate_tokens(chunks[0][1]) <= 100
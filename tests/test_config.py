@@ -1,13 +1,26 @@
 import os
+import stat
+from unittest.mock import patch
 
+import ini
 import pytest
 
 from ai_git_commit.config import (
+    ConfigStore,
     KnownError,
+    attempt_timeout,
     get_config,
+    git_backend,
     locale,
+    max_connections,
+    max_diff_tokens,
+    max_requests,
+    max_retries,
     openai_key,
+    provider,
     read_config_file,
+    request_timeout,
+    requests_per_minute,
     set_configs,
 )
 
@@ -79,9 +92,138 @@ def test_get_config(cleanup_config):
     with open(config_path, "w") as f:
         f.write("OPENAI_KEY=sk-abc123\n")
 
-    expected = {"OPENAI_KEY": "sk-abc123", "locale": "en"}
+    expected = {
+        "OPENAI_KEY": "sk-abc123",
+        "locale": "en",
+        "max_diff_tokens": 3000,
+        "provider": "openai",
+        "model": "text-davinci-002",
+        "api_base": "https://api.openai.com/v1",
+        "max_connections": 10,
+        "request_timeout": 60.0,
+        "max_retries": 3,
+        "requests_per_minute": 0,
+        "attempt_timeout": 0.0,
+        "max_requests": 0,
+        "git_backend": "git",
+    }
     assert get_config() == expected
 
-    expected = {"OPENAI_KEY": "sk-xyz456", "locale": "en"}
+    expected = {
+        "OPENAI_KEY": "sk-xyz456",
+        "locale": "en",
+        "max_diff_tokens": 3000,
+        "provider": "openai",
+        "model": "text-davinci-002",
+        "api_base": "https://api.openai.com/v1",
+        "max_connections": 10,
+        "request_timeout": 60.0,
+        "max_retries": 3,
+        "requests_per_minute": 0,
+        "attempt_timeout": 0.0,
+        "max_requests": 0,
+        "git_backend": "git",
+    }
     cli_config = {"OPENAI_KEY": "sk-xyz456"}
     assert get_config(cli_config) == expected
+
+
+def test_max_diff_tokens():
+    assert max_diff_tokens(None) == 3000
+    assert max_diff_tokens("1200") == 1200
+    assert max_diff_tokens(1200) == 1200
+    with pytest.raises(KnownError, match=r"Must be a positive integer"):
+        max_diff_tokens("lots")
+
+
+def test_provider():
+    assert provider(None) == "openai"
+    assert provider("local") == "local"
+    with pytest.raises(KnownError, match=r'Must be "openai" or "local"'):
+        provider("other")
+
+
+def test_get_config_local_provider_without_key(cleanup_config):
+    config_path = os.path.join(os.path.expanduser("~"), ".ai-git-commit")
+    with open(config_path, "w") as f:
+        f.write("provider=local\n")
+
+    config = get_config()
+    assert config["provider"] == "local"
+    assert config["OPENAI_KEY"] == ""
+
+
+def test_git_backend():
+    assert git_backend(None) == "git"
+    assert git_backend("native") == "native"
+    with pytest.raises(KnownError, match=r'Must be "git" or "native"'):
+        git_backend("libgit2")
+
+
+def test_connection_settings():
+    assert max_connections(None) == 10
+    assert max_connections("4") == 4
+    assert request_timeout(None) == 60.0
+    assert request_timeout("2.5") == 2.5
+    with pytest.raises(KnownError, match=r"Must be a positive number of seconds"):
+        request_timeout("soon")
+
+
+def test_retry_settings():
+    assert max_retries(None) == 3
+    assert max_retries("0") == 0
+    assert requests_per_minute(None) == 0
+    assert requests_per_minute("120") == 120
+    with pytest.raises(KnownError, match=r"Must be a non-negative integer"):
+        max_retries("-1")
+    assert attempt_timeout(None) == 0.0
+    assert attempt_timeout("7.5") == 7.5
+    with pytest.raises(KnownError, match=r"Must be a non-negative number of seconds"):
+        attempt_timeout("-1")
+    assert max_requests(None) == 0
+    assert max_requests("50") == 50
+    with pytest.raises(KnownError, match=r"Must be a non-negative integer"):
+        max_requests("many")
+
+
+ini_parse = ini.parse
+
+
+def test_config_store_parses_once(tmp_path):
+    (tmp_path / ".env").write_text("provider=local\nlocale=fr\n")
+    store = ConfigStore()
+    with patch("ini.parse", wraps=ini_parse) as parse:
+        first = store.get(directory=str(tmp_path))
+        second = store.get(directory=str(tmp_path))
+        assert first == second
+        assert first is not second
+        assert parse.call_count == 1
+
+        (tmp_path / ".env").write_text("provider=local\nlocale=de-ch\n")
+        assert store.get(directory=str(tmp_path))["locale"] == "de-ch"
+        assert parse.call_count == 2
+
+
+def test_config_store_layers(tmp_path, monkeypatch):
+    (tmp_path / ".env").write_text("provider=local\nlocale=fr\nmodel=file-model\n")
+    store = ConfigStore()
+    monkeypatch.setenv("AI_GIT_COMMIT_LOCALE", "de")
+    monkeypatch.setenv("AI_GIT_COMMIT_MAX_DIFF_TOKENS", "1200")
+    config = store.get({"locale": "es"}, directory=str(tmp_path))
+    assert config["locale"] == "es"
+    assert config["max_diff_tokens"] == 1200
+    assert config["model"] == "file-model"
+    assert store.get(directory=str(tmp_path))["locale"] == "de"
+    monkeypatch.setenv("AI_GIT_COMMIT_MAX_DIFF_TOKENS", "lots")
+    with pytest.raises(KnownError, match="max_diff_tokens"):
+        store.get(directory=str(tmp_path))
+
+
+def test_config_store_write_is_atomic(tmp_path):
+    store = ConfigStore()
+    path = str(tmp_path / ".ai-git-commit")
+    assert store.read(path) == {}
+    store.write(path, {"OPENAI_KEY": "sk-abc123"})
+    assert store.read(path) == {"OPENAI_KEY": "sk-abc123"}
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert os.listdir(tmp_path) == [".ai-git-commit"]
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from ai_git_commit.daemon import (
+    Daemon,
+    DaemonUnavailable,
+    adaemon_commit_candidates,
+    request_daemon,
+    run_daemon,
+)
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.delenv("GIT_DIR", raising=False)
+    path = tmp_path / "daemon.sock"
+    thread = threading.Thread(target=run_daemon, args=(path, 60), daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            list(request_daemon("ping", path))
+            break
+        except DaemonUnavailable:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    yield path
+    list(request_daemon("stop", path))
+    thread.join(5)
+    assert not path.exists()
+
+
+@pytest.fixture
+def repository(tmp_path, git):
+    root = tmp_path / "repository"
+    root.mkdir()
+    git(root, "init", "-q")
+    (root / ".env").write_text("provider=local\n")
+    (root / "app.py").write_text("value = 1\n")
+    git(root, "add", "app.py")
+    git(root, "commit", "-q", "-m", "wip")
+    return root
+
+
+def test_ping_and_protocol_version(daemon):
+    assert list(request_daemon("ping", daemon))[-1]["pid"] > 0
+    with socket.socket(socket.AF_UNIX) as client:
+        client.connect(str(daemon))
+        client.sendall(json.dumps({"version": 0, "command": "ping"}).encode() + b"\n")
+        answer = json.loads(client.makefile("rb").readline())
+    assert answer["event"] == "unsupported"
+
+
+def test_unavailable(tmp_path):
+    with pytest.raises(DaemonUnavailable):
+        list(request_daemon("ping", tmp_path / "missing.sock"))
+
+
+def test_batch_through_daemon(daemon, repository, monkeypatch):
+    monkeypatch.chdir(repository)
+    events = list(request_daemon("batch", daemon, rev_range="HEAD", cache=False))
+    result = json.loads(events[0]["line"])
+    assert result["original_subject"] == "wip"
+    assert result["subject"] == "feat(app): Add app.py"
+    assert "commits/s" in events[-1]["report"]
+
+
+def test_generate_through_daemon(daemon, repository, monkeypatch, git):
+    monkeypatch.chdir(repository)
+
+    async def collect():
+        candidates = await adaemon_commit_candidates(False, {}, daemon)
+        return [candidate["subject"] async for candidate in candidates]
+
+    with pytest.raises(ValueError, match="No staged changes"):
+        asyncio.run(collect())
+    (repository / "app.py").write_text("value = 2\n")
+    git(repository, "add", "app.py")
+    assert asyncio.run(collect())[0] == "fix(app): Update app.py"
+
+
+def test_config_follows_file_and_client_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    (tmp_path / ".env").write_text("provider=local\nlocale=fr\n")
+    server = Daemon(tmp_path / "daemon.sock")
+    request = {"cwd": str(tmp_path)}
+    config = server.config(request)
+    assert config["locale"] == "fr"
+    (tmp_path / ".env").write_text("provider=local\nlocale=de\n")
+    assert server.config(request)["locale"] == "de"
+    request["env"] = {"AI_GIT_COMMIT_LOCALE": "es"}
+    assert server.config(request)["locale"] == "es"
+    assert server.provider(config) is server.provider(dict(config))
+
+
+def test_retrier_shares_limiter_with_a_budget_per_run(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    (tmp_path / ".env").write_text(
+        "provider=local\nrequests_per_minute=60\nmax_requests=5\n"
+    )
+    server = Daemon(tmp_path / "daemon.sock")
+    config = server.config({"cwd": str(tmp_path)})
+    first, second = server.retrier(config), server.retrier(config)
+    assert first.limiter is second.limiter
+    assert first.budget is not second.budget
+    assert first.budget.max_requests == 5
@@ -0,0 +1,99 @@
+import mmap
+
+import pytest
+
+from ai_git_commit.diff import (
+    DiffFile,
+    DiffHunkView,
+    parse_diff,
+    parse_diff_buffer,
+    parse_diff_path,
+)
+
+DIFF = """diff --git a/bin.dat b/bin.dat
+new file mode 100644
+index 0000000..bdc955b
+Binary files /dev/null and b/bin.dat differ
+diff --git a/f.txt b/f.txt
+index de98044..7be73ce 100644
+--- a/f.txt
++++ b/f.txt
+@@ -1,3 +1,3 @@
+ a
+-b
++B
+ c
+@@ -10,2 +10,2 @@
+-x
++y
+"""
+
+
+def test_parse_diff_path() -> None:
+    assert parse_diff_path("diff --git a/src/a.py b/src/a.py\n") == "src/a.py"
+
+
+def test_parse_diff() -> None:
+    files = list(parse_diff(DIFF.splitlines(keepends=True)))
+    assert [file.path for file in files] == ["bin.dat", "f.txt"]
+    assert files[0].binary is True
+    assert files[0].hunks == []
+    assert files[1].binary is False
+    assert [hunk.header for hunk in files[1].hunks] == [
+        "@@ -1,3 +1,3 @@\n",
+        "@@ -10,2 +10,2 @@\n",
+    ]
+    assert files[1].hunks[0].lines == [" a\n", "-b\n", "+B\n", " c\n"]
+    assert "".join(file.text() for file in files) == DIFF
+
+
+def test_parse_diff_is_lazy() -> None:
+    def lines():
+        yield from DIFF.splitlines(keepends=True)[:5]
+        raise AssertionError("the second file should not be read")
+
+    files = parse_diff(lines())
+    assert next(files).path == "bin.dat"
+
+
+def test_diff_file_blob_ids() -> None:
+    files = list(parse_diff(DIFF.splitlines(keepends=True)))
+    assert files[0].blob_ids() == ("0000000", "bdc955b")
+    assert files[1].blob_ids() == ("de98044", "7be73ce")
+    assert DiffFile("a.py").blob_ids() is None
+
+
+def records(files):
+    return [
+        (
+            file.path,
+            file.binary,
+            file.header,
+            file.blob_ids(),
+            [(hunk.header, hunk.lines, hunk.stats()) for hunk in file.hunks],
+        )
+        for file in files
+    ]
+
+
+@pytest.mark.parametrize("wrap", [bytes, memoryview])
+def test_parse_diff_buffer(wrap) -> None:
+    buffer = wrap(DIFF.encode())
+    files = list(parse_diff_buffer(buffer))
+    assert records(files) == records(parse_diff(DIFF.splitlines(keepends=True)))
+    assert "".join(file.text() for file in files) == DIFF
+    hunk = files[1].hunks[1]
+    assert isinstance(hunk, DiffHunkView)
+    assert hunk.buffer is buffer
+    assert hunk.stats() == (1, 1)
+
+
+def test_parse_diff_buffer_mmap(tmp_path) -> None:
+    path = tmp_path / "staged.diff"
+    path.write_bytes(b"raw listing\0\0" + DIFF.encode())
+    with open(path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buffer:
+        files = list(parse_diff_buffer(buffer, buffer.find(b"\0\0") + 2))
+        assert [file.path for file in files] == ["bin.dat", "f.txt"]
+        assert files[1].hunks[0].lines == [" a\n", "-b\n", "+B\n", " c\n"]
@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from ai_git_commit import main
+from ai_git_commit.evaluate import (
+    Evaluation,
+    aevaluate_prompts,
+    is_conventional,
+    percentile,
+    score_evaluations,
+    subject_overlap,
+)
+
+
+def test_is_conventional():
+    assert is_conventional("feat: Add the evaluate command")
+    assert is_conventional("fix(cli)!: Exit with 1 on errors")
+    assert not is_conventional("Add the evaluate command")
+    assert not is_conventional("feature: Add the evaluate command")
+    assert not is_conventional("feat: Add the evaluate command.")
+    assert not is_conventional("feat:Add")
+
+
+def test_subject_overlap():
+    assert subject_overlap("feat: Add cache", "feat(cache): add cache") == 1.0
+    assert subject_overlap("fix: Retry requests", "Add cache") == 0.0
+    assert subject_overlap("docs: Add page", "Add a page") == pytest.approx(2 / 3)
+
+
+def evaluation(prompt_id, subjects, error=None, seconds=1.0):
+    return Evaluation(
+        prompt_id,
+        "0" * 40,
+        "feat: Add cache",
+        [{"id": 1, "subject": subject, "body": []} for subject in subjects],
+        error,
+        seconds,
+        100,
+        20,
+    )
+
+
+def test_percentile_nearest_rank():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([2.0, 1.0], 0.5) == 1.0
+    assert percentile([6.0, 5.0, 4.0, 3.0, 2.0, 1.0], 0.5) == 3.0
+    assert percentile([6.0, 5.0, 4.0, 3.0, 2.0, 1.0], 0.9) == 6.0
+    assert percentile([1.0], 0.9) == 1.0
+
+
+def test_score_evaluations():
+    four, five = score_evaluations(
+        [
+            evaluation(4, ["feat: Add cache", "Add the cache"], seconds=2.0),
+            evaluation(5, ["feat: Add cache"]),
+            evaluation(4, [], error="timeout", seconds=9.0),
+        ]
+    )
+    assert four.prompt_id == 4
+    assert (four.commits, four.failed, four.messages) == (2, 1, 2)
+    assert four.conventional_rate == 0.5
+    assert four.within_limit_rate == 1.0
+    assert four.latency_p50 == 2.0
+    assert four.tokens_per_valid_message == 240
+    assert five.overlap == 1.0
+    assert five.tokens_per_valid_message == 120
+
+
+def test_aevaluate_prompts_replays_commits_against_every_prompt(
+    fake_provider, completion, commit_diff
+):
+    def respond(prompt, model):
+        index = prompt.split("+b")[1].split()[0]
+        if index == "1" and "Use a hyphen" in prompt:
+            raise ValueError("model error")
+        return completion(f"feat: Commit {index}")
+
+    provider = fake_provider(respond)
+
+    async def collect():
+        return [
+            evaluation
+            async for evaluation in aevaluate_prompts(
+                iter([commit_diff(0), commit_diff(1)]),
+                prompt_ids=(4, 5),
+                jobs=2,
+                provider=provider,
+            )
+        ]
+
+    evaluations = asyncio.run(collect())
+    assert [(run.prompt_id, run.commit[-1]) for run in evaluations] == [
+        (4, "0"),
+        (5, "0"),
+        (4, "1"),
+        (5, "1"),
+    ]
+    assert evaluations[0].messages[0]["subject"] == "feat: Commit 0"
+    assert evaluations[0].prompt_tokens > 0 and evaluations[0].completion_tokens > 0
+    failed = [run for run in evaluations if run.error is not None]
+    assert [(run.prompt_id, run.error) for run in failed] == [(4, "model error")]
+
+
+def test_evaluate_command(tmp_path, monkeypatch, make_history):
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    repository = tmp_path / "repository"
+    repository.mkdir()
+    make_history(repository)
+    monkeypatch.chdir(repository)
+    results = tmp_path / "results.jsonl"
+
+    result = CliRunner().invoke(
+        main,
+        [
+            "evaluate",
+            "HEAD~3..HEAD",
+            "--provider",
+            "local",
+            "-p",
+            "4",
+            "-p",
+            "5",
+            "--format",
+            "json",
+            "--results",
+            str(results),
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    scores = json.loads(result.stdout)
+    assert [score["prompt_id"] for score in scores] == [4, 5]
+    # The empty commit has no diff to replay.
+    assert [score["commits"] for score in scores] == [2, 2]
+    assert all(score["conventional_rate"] == 1.0 for score in scores)
+    assert len(results.read_text().splitlines()) == 4
@@ -1,7 +1,32 @@
+import asyncio
+import io
 import subprocess
+import time
 from unittest.mock import MagicMock, patch
 
-from ai_git_commit.git import get_git_diff_output
+from prompt_toolkit.application import create_app_session
+from prompt_toolkit.document import Document
+from prompt_toolkit.input import create_pipe_input
+from prompt_toolkit.output import DummyOutput
+
+from ai_git_commit.config import ICommitMessage, RawConfig, get_config
+from ai_git_commit.git import (
+    COMMIT_TYPES,
+    SuggestionCompleter,
+    TypeCompleter,
+    aselect_commit_message,
+    configure_session,
+    get_compact_git_diff,
+    get_git_diff_output,
+    get_prompt_session,
+    get_staged_tree_key,
+    git_user_commit_message,
+    iter_git_diff,
+    iter_git_diff_lines,
+    read_git_diff,
+    run_command_git_commit,
+)
+from ai_git_commit.repository import GitRepository
 
 
 # TODO: Some Explanation require use ChatGPT and Google Search before moving forward.
@@ -40,3 +65,175 @@ def test_get_git_diff_output_invalid() -> None:
         mock_run.assert_called_once_with(
             ["git", "diff", "--staged"], capture_output=True, text=True
         )
+
+
+def test_iter_git_diff_lines_valid() -> None:
+    diff = "diff --git a/f.txt b/f.txt\n@@ -1 +1 @@\n-a\n+b\n"
+    with patch("subprocess.Popen") as mock_popen:
+        process = mock_popen.return_value
+        process.stdout = io.StringIO(diff)
+        process.stderr = io.StringIO("")
+        process.returncode = 0
+        files = list(iter_git_diff(["--staged"]))
+        assert [file.path for file in files] == ["f.txt"]
+        assert files[0].hunks[0].lines == ["-a\n", "+b\n"]
+        assert mock_popen.call_args.args[0] == ["git", "diff", "--staged"]
+        process.kill.assert_not_called()
+
+
+def test_iter_git_diff_lines_invalid() -> None:
+    with patch("subprocess.Popen") as mock_popen:
+        process = mock_popen.return_value
+        process.stdout = io.StringIO("")
+        process.stderr = io.StringIO("fatal: not a git repository")
+        process.returncode = 128
+        try:
+            list(iter_git_diff_lines())
+            assert False
+        except subprocess.CalledProcessError as e:
+            assert e.returncode == 128
+            assert e.stderr == "fatal: not a git repository"
+
+
+def test_read_git_diff_stops_early() -> None:
+    with patch("subprocess.Popen") as mock_popen:
+        process = mock_popen.return_value
+        process.stdout = io.StringIO("a" * 10 + "\n" + "b" * 10 + "\n")
+        process.stderr = io.StringIO("")
+        process.returncode = -9
+        assert read_git_diff(max_length=15) == "a" * 10 + "\nbbbb"
+        process.kill.assert_called_once()
+
+
+def test_get_staged_tree_key(tmp_path, monkeypatch, make_history, git) -> None:
+    make_history(tmp_path)
+    (tmp_path / "module0.py").write_text("value = 10\n")
+    git(tmp_path, "add", "module0.py")
+    monkeypatch.chdir(tmp_path)
+    repository = GitRepository(tmp_path, tmp_path / ".git")
+    assert get_staged_tree_key() == repository.staged_tree_key()
+
+
+def test_get_staged_tree_key_outside_repository() -> None:
+    with patch.object(GitRepository, "discover", return_value=None):
+        assert get_staged_tree_key() is None
+
+
+def test_iter_git_diff_reads_staged_diff_from_repository(
+    tmp_path, monkeypatch, make_history, git
+) -> None:
+    make_history(tmp_path)
+    (tmp_path / "module0.py").write_text("value = 10\n")
+    git(tmp_path, "add", "module0.py")
+    monkeypatch.chdir(tmp_path)
+    files = list(iter_git_diff())
+    assert [file.path for file in files] == ["module0.py"]
+    assert files[0].hunks[0].lines == ["-value = 0\n", "+value = 10\n"]
+    assert get_compact_git_diff(1000).count("+value = 10") == 1
+
+
+def test_aselect_commit_message() -> None:
+    async def candidates():
+        yield ICommitMessage(id=1, subject="feat: Add cache", body=["Add DiskCache"])
+        yield ICommitMessage(id=2, subject="fix: Fix cache key", body=[])
+        await asyncio.sleep(10)
+
+    async def select():
+        with create_pipe_input() as pipe_input:
+            with create_app_session(input=pipe_input, output=DummyOutput()):
+                task = asyncio.ensure_future(aselect_commit_message(candidates()))
+                await asyncio.sleep(0.1)
+                pipe_input.send_text("2\r")
+                return await asyncio.wait_for(task, 5)
+
+    assert asyncio.run(select())["subject"] == "fix: Fix cache key"
+
+
+def test_suggestion_completer() -> None:
+    suggestions = [
+        ICommitMessage(id=1, subject="feat(cache): Add disk cache", body=[]),
+        ICommitMessage(id=2, subject="fix: Fix cache key", body=[]),
+    ]
+    completer = SuggestionCompleter(lambda: suggestions)
+    completions = list(completer.get_completions(Document("add"), None))
+    assert [completion.text for completion in completions] == ["Add disk cache"]
+    assert len(list(completer.get_completions(Document(""), None))) == 2
+
+
+def test_type_completer_prefix_then_fuzzy() -> None:
+    completer = TypeCompleter()
+    assert [option.value for option in completer.matches("")] == [
+        option.value for option in COMMIT_TYPES
+    ]
+    assert [option.value for option in completer.matches("fe")] == ["feat"]
+    assert [option.value for option in completer.matches("Re")][:3] == [
+        "refactor",
+        "revert",
+        "release",
+    ]
+    # No type starts with "rfc", "refactor" has its letters in order.
+    assert [option.value for option in completer.matches("rfc")] == ["refactor"]
+    assert completer.matches("xyz") == []
+
+    completions = list(completer.get_completions(Document("fi"), None))
+    assert completions[0].text == "fix"
+    assert completions[0].start_position == -2
+
+
+def test_git_user_commit_message_reuses_one_session() -> None:
+    with create_pipe_input() as pipe_input:
+        with create_app_session(input=pipe_input, output=DummyOutput()):
+            pipe_input.send_text("fix\rHandle the cache key\rStrip the diff\r\r")
+            message = git_user_commit_message()
+            session = get_prompt_session()
+            pipe_input.send_text("docs\rAdd a page\r\r")
+            second = git_user_commit_message()
+            assert get_prompt_session() is session
+            assert session.completer is None
+
+    assert message == ICommitMessage(
+        id=0,
+        subject="🐞 Bug Fixes: Handle the cache key",
+        body=["Strip the diff"],
+    )
+    assert second["subject"] == "📝 Documentation: Add a page"
+
+
+def test_run_command_git_commit_offers_prefetched_suggestions(
+    tmp_path, monkeypatch, make_history, git
+) -> None:
+    make_history(tmp_path)
+    (tmp_path / "cache.py").write_text("value = 1\n")
+    git(tmp_path, "add", "cache.py")
+    monkeypatch.chdir(tmp_path)
+    # No daemon listens in an empty runtime directory, so the suggestions are generated in-process.
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    config = get_config(RawConfig({"provider": "local"}), str(tmp_path))
+
+    offered = []
+
+    def spy_configure_session(**options):
+        completer = options.get("completer")
+        if isinstance(completer, SuggestionCompleter):
+            deadline = time.monotonic() + 10
+            while not offered and time.monotonic() < deadline:
+                offered.extend(
+                    completion.display_meta_text
+                    for completion in completer.get_completions(Document(""), None)
+                )
+                time.sleep(0.01)
+        return configure_session(**options)
+
+    committed = []
+    monkeypatch.setattr("ai_git_commit.git.configure_session", spy_configure_session)
+    monkeypatch.setattr(
+        "ai_git_commit.git.confirm_git_commit",
+        lambda message, repository: committed.append(message),
+    )
+    with create_pipe_input() as pipe_input:
+        with create_app_session(input=pipe_input, output=DummyOutput()):
+            pipe_input.send_text("feat\rAdd the cache\r\r")
+            run_command_git_commit(config=config, cache=False)
+
+    assert "feat(cache): Add cache.py" in offered
+    assert committed[0]["subject"] == "✨ Features: Add the cache"
@@ -0,0 +1,137 @@
+import os
+
+import pytest
+
+from ai_git_commit.objects import (
+    NativeRepository,
+    UnsupportedRepository,
+    apply_delta,
+    tree_id,
+    unified_diff,
+)
+from ai_git_commit.repository import GitRepository, parse_raw, parse_status
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch, git):
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "home" / ".config"))
+    monkeypatch.setenv("GIT_CONFIG_NOSYSTEM", "1")
+    worktree = tmp_path / "repo"
+    worktree.mkdir()
+    git(worktree, "init", "-q")
+    (worktree / "src").mkdir()
+    (worktree / "src" / "app.py").write_text(
+        "".join(f"def f{i}():\n    return {i}\n\n" for i in range(40))
+    )
+    (worktree / "README.md").write_text("# Title\n")
+    (worktree / "old.txt").write_text("moved content\n")
+    (worktree / "gone.txt").write_text("bye\n")
+    git(worktree, "add", ".")
+    git(worktree, "commit", "-q", "-m", "init")
+    return worktree
+
+
+def stage_changes(git, worktree, delete=False):
+    app = worktree / "src" / "app.py"
+    app.write_text(app.read_text().replace("return 20", "return 21"))
+    (worktree / "README.md").write_text("# Title\n\nMore text")
+    (worktree / "old.txt").rename(worktree / "new.txt")
+    if delete:
+        (worktree / "gone.txt").unlink()
+    else:
+        (worktree / "image.bin").write_bytes(b"\0\1\2")
+        (worktree / "empty").write_text("")
+    git(worktree, "add", "-A")
+
+
+def native(worktree):
+    return NativeRepository(worktree, worktree / ".git")
+
+
+def test_tree_id_matches_write_tree(repo, git):
+    stage_changes(git, repo)
+    reader = native(repo)
+    index_tree = git(repo, "write-tree").decode().strip()
+    assert tree_id((e.path, e.mode, e.sha) for e in reader.index()) == index_tree
+    head_tree = git(repo, "rev-parse", "HEAD^{tree}").decode().strip()
+    assert reader.staged_tree_key() == f"{head_tree}..{index_tree}"
+
+
+@pytest.mark.parametrize("packed,delete", [(False, False), (True, True)])
+def test_staged_diff_matches_git(repo, packed, delete, git):
+    if packed:
+        git(repo, "gc", "-q", "--aggressive")
+        assert not any(
+            path.name not in ("pack", "info")
+            for path in (repo / ".git" / "objects").iterdir()
+        )
+    stage_changes(git, repo, delete)
+    reader = native(repo)
+    assert reader.staged_files() == parse_raw(
+        git(repo, "diff", "--staged", "--raw", "-z", "--no-abbrev")
+    )
+    assert "".join(reader.iter_staged_diff_lines()) == (
+        git(repo, "diff", "--staged", "--full-index").decode()
+    )
+
+
+def test_status_matches_git(repo, git):
+    stage_changes(git, repo)
+    (repo / "README.md").write_text("# Changed again\n")
+    os.chmod(repo / "src" / "app.py", 0o755)
+    expected = parse_status(
+        git(repo, "status", "--porcelain=v1", "-z", "--untracked-files=no")
+    )
+    assert native(repo).status() == expected
+
+
+def test_delta_objects(repo, git):
+    app = repo / "src" / "app.py"
+    for version in range(3):
+        app.write_text(app.read_text() + f"# version {version}\n")
+        git(repo, "commit", "-q", "-am", f"version {version}")
+    git(repo, "gc", "-q", "--aggressive")
+    blob = git(repo, "rev-parse", "HEAD~2:src/app.py").decode().strip()
+    assert native(repo).store.read(blob) == (
+        "blob",
+        git(repo, "cat-file", "blob", blob),
+    )
+
+
+def test_unsupported_features_fall_back_to_git(repo, git):
+    stage_changes(git, repo)
+    git(repo, "update-index", "--index-version", "4")
+    with pytest.raises(UnsupportedRepository, match="Index version 4"):
+        native(repo).staged_files()
+
+    repository = GitRepository.discover(str(repo), native=True)
+    files = [file.path for file in repository.iter_staged_diff()]
+    assert files == [
+        file.path for file in GitRepository(repo, repo / ".git").iter_staged_diff()
+    ]
+    assert "new.txt" in files
+
+
+def test_inexact_renames_are_unsupported(repo, git):
+    (repo / "old.txt").rename(repo / "new.txt")
+    (repo / "new.txt").write_text("moved content\nand more\n")
+    git(repo, "add", "-A")
+    with pytest.raises(UnsupportedRepository, match="renames"):
+        native(repo).staged_files()
+
+
+def test_apply_delta():
+    base = b"hello world"
+    # source size 11, target size 12, copy 6 bytes at 0, insert "there!"
+    delta = bytes([11, 12, 0x91, 0, 6, 6]) + b"there!"
+    assert apply_delta(base, delta) == b"hello there!"
+
+
+def test_unified_diff_no_newline_at_end():
+    assert list(unified_diff(b"a\nb", b"a\nc")) == [
+        "@@ -1,2 +1,2 @@\n",
+        " a\n",
+        "-b\n\\ No newline at end of file\n",
+        "+c\n\\ No newline at end of file\n",
+    ]
@@ -0,0 +1,411 @@
+import asyncio
+import contextlib
+import json
+from unittest.mock import patch
+
+import pytest
+
+from ai_git_commit.cache import DiskCache
+from ai_git_commit.diff import parse_diff
+from ai_git_commit.openai import (
+    CommitMessageParser,
+    agenerate_commit_messages,
+    agenerate_hierarchical_commit_messages,
+    asummarize_diff_chunks,
+    generate_commit_messages,
+    parse_commit_messages,
+    repair_json,
+    staged_commit_candidates,
+)
+from ai_git_commit.providers import ProviderError
+from ai_git_commit.repository import GitRepository
+from ai_git_commit.retry import Retrier, RetryPolicy
+
+DIFF = "diff --git a/a.py b/a.py\n@@ -1 +1 @@\n-a = 1\n+a = 2\n"
+
+
+def test_generate_commit_messages_no_diff():
+    with pytest.raises(ValueError, match="No diff provided"):
+        generate_commit_messages("")
+
+
+def test_generate_commit_messages_cache(tmp_path, fake_provider):
+    cache = DiskCache(tmp_path)
+    provider = fake_provider(lambda prompt, model: '{"commit_messages": []}')
+    first = generate_commit_messages(DIFF, cache=cache, provider=provider)
+    second = generate_commit_messages(DIFF + "\n", cache=cache, provider=provider)
+    assert first == second == '{"commit_messages": []}'
+    assert len(provider.prompts) == 1
+    generate_commit_messages(DIFF, cache=cache, locale="fr", provider=provider)
+    assert len(provider.prompts) == 2
+
+
+def test_staged_commit_candidates_skips_diff_on_cache_hit(
+    tmp_path, fake_provider, completion
+):
+    cache = DiskCache(tmp_path)
+    provider = fake_provider(lambda prompt, model: completion("feat: Bump a"))
+    repository = GitRepository(tmp_path, tmp_path / ".git")
+    config = {"model": "model", "locale": "en", "max_diff_tokens": 2000}
+
+    async def collect():
+        return [
+            message["subject"]
+            async for message in staged_commit_candidates(
+                repository, config, cache=cache, provider=provider
+            )
+        ]
+
+    with patch.object(
+        repository, "staged_tree_key", return_value="aaaa..bbbb"
+    ), patch.object(
+        repository,
+        "map_staged_diff",
+        side_effect=lambda: contextlib.nullcontext(
+            parse_diff(DIFF.splitlines(keepends=True))
+        ),
+    ) as mock_diff, patch.object(
+        cache, "set", wraps=cache.set
+    ) as mock_set:
+        for _ in range(2):
+            assert asyncio.run(collect()) == ["feat: Bump a", "feat: Bump a"]
+        mock_diff.assert_called_once()
+        assert len(provider.prompts) == 2
+        # One entry per prompt variant, under the tree key only.
+        assert mock_set.call_count == 2
+
+
+def test_staged_commit_candidates_skips_diff_on_hierarchical_cache_hit(
+    tmp_path, fake_provider, completion
+):
+    cache = DiskCache(tmp_path)
+
+    def respond(prompt, model):
+        if "Summarize the changes made in this part" in prompt:
+            return "- Change things\n"
+        return completion("feat: Change everything")
+
+    provider = fake_provider(respond)
+    repository = GitRepository(tmp_path, tmp_path / ".git")
+    # A budget too small for a single prompt takes the summarize then reduce path.
+    config = {"model": "model", "locale": "en", "max_diff_tokens": 10}
+    diff = DIFF + DIFF.replace("a.py", "b.py")
+
+    async def collect():
+        return [
+            message["subject"]
+            async for message in staged_commit_candidates(
+                repository, config, cache=cache, provider=provider
+            )
+        ]
+
+    with patch.object(
+        repository, "staged_tree_key", return_value="aaaa..bbbb"
+    ), patch.object(
+        repository,
+        "map_staged_diff",
+        side_effect=lambda: contextlib.nullcontext(
+            parse_diff(diff.splitlines(keepends=True))
+        ),
+    ) as mock_diff:
+        for _ in range(2):
+            assert asyncio.run(collect()) == ["feat: Change everything"]
+        mock_diff.assert_called_once()
+        assert len(provider.prompts) == 3
+
+
+def test_parse_commit_messages():
+    text = json.dumps(
+        {
+            "commit_messages": [
+                {"id": 1, "subject": "feat: Add cache", "body": ["Add DiskCache"]},
+                {"id": 2, "subject": "fix: Fix key", "body": "- one\n- two"},
+                "docs: Update readme",
+                {"id": 4},
+            ]
+        }
+    )
+    assert parse_commit_messages(text) == [
+        {"id": 1, "subject": "feat: Add cache", "body": ["Add DiskCache"]},
+        {"id": 2, "subject": "fix: Fix key", "body": ["one", "two"]},
+        {"id": 3, "subject": "docs: Update readme", "body": []},
+    ]
+    assert parse_commit_messages("not json") == []
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": [1, 2,],}', '{"a": [1, 2]}'),
+        ('Output:\n```json\n{"a": "b"}\n```\nDone.', '{"a": "b"}'),
+        ('Here [1] are:\n[{"a": 1}]', '[{"a": 1}]'),
+        ('{"a": "line\nbreak"}', '{"a": "line\\nbreak"}'),
+        ('{"a": [{"b": 1}, {"b": "cut', '{"a": [{"b": 1}]}'),
+        ('{"a": ["x", "y', '{"a": ["x"]}'),
+        ('{"a": "cut', ""),
+        ("no json", ""),
+    ],
+)
+def test_repair_json(text, expected):
+    assert repair_json(text) == expected
+
+
+def test_parse_commit_messages_repairs_model_output():
+    text = """Sure, here are the commit messages:
+    ```json
+    {
+        "commit_messages": [
+            {
+                "id": 1,
+                "subject": "feat: Add cache",
+                "body": [
+                    "Add DiskCache",
+                    "Key by diff",
+                ]
+            },
+            {
+                "id": 2,
+                "subject": "fix: Handle a cut resp"""
+    assert parse_commit_messages(text) == [
+        {
+            "id": 1,
+            "subject": "feat: Add cache",
+            "body": ["Add DiskCache", "Key by diff"],
+        }
+    ]
+    assert parse_commit_messages('["feat: Add cache", "fix: Fix key",]') == [
+        {"id": 1, "subject": "feat: Add cache", "body": []},
+        {"id": 2, "subject": "fix: Fix key", "body": []},
+    ]
+
+
+def test_commit_message_parser_tolerates_prose_and_trailing_commas():
+    text = (
+        'Output: {"commit_messages": [{"subject": "feat: Add cache", "body": ["a",],},'
+        ' "docs: Update readme",]}'
+    )
+    parser = CommitMessageParser()
+    completed = [message for char in text for message in parser.feed(char)]
+    assert completed == [
+        {"id": 1, "subject": "feat: Add cache", "body": ["a"]},
+        {"id": 2, "subject": "docs: Update readme", "body": []},
+    ]
+    assert completed == parse_commit_messages(text)
+
+
+def test_commit_message_parser_is_incremental():
+    text = json.dumps(
+        {
+            "commit_messages": [
+                {"id": 1, "subject": 'feat: Add "stream" {x}', "body": ["a", "b"]},
+                {"id": 2, "subject": "fix: Handle \u00e9 \\ ]", "body": "- c"},
+            ]
+        }
+    )
+    parser = CommitMessageParser()
+    completed = []
+    partials = set()
+    for char in text:
+        completed.extend((len(parser.text), message) for message in parser.feed(char))
+        partials.add(parser.partial_subject())
+    assert [message for _, message in completed] == parse_commit_messages(text)
+    # The first message is complete before the second one starts.
+    assert completed[0][0] < text.index("fix:")
+    assert 'feat: Add "str' in partials
+    assert "fix: Handle \u00e9" in partials
+    assert parser.partial_subject() == ""
+
+
+def test_agenerate_commit_messages_streams_candidates(streaming_provider, completion):
+    partials = []
+    seen = []
+
+    async def collect():
+        messages = agenerate_commit_messages(
+            DIFF,
+            num_of_commit_messages=2,
+            provider=streaming_provider(
+                lambda prompt, model: completion("feat: First", "fix: Second")
+            ),
+            on_partial=lambda index, subject: partials.append((index, subject)),
+        )
+        async for message in messages:
+            # The first candidate arrives while the second is still streamed.
+            seen.append((message["id"], message["subject"], list(partials)))
+
+    asyncio.run(collect())
+    assert [(id_, subject) for id_, subject, _ in seen] == [
+        (1, "feat: First"),
+        (2, "fix: Second"),
+    ]
+    assert (0, "fix: Se") not in seen[0][2]
+    assert (0, "fix: Second") in partials
+    assert partials[-1] == (0, "")
+
+
+def test_agenerate_commit_messages_retry_matches_emitted_subjects(
+    tmp_path, fake_provider, completion
+):
+    cache = DiskCache(tmp_path)
+    answers = [
+        completion("feat: First", "fix: Second")[:60],
+        completion("fix: Other", "feat: First"),
+    ]
+
+    class DroppedProvider(fake_provider):
+        async def astream(self, prompt, model, max_tokens, temperature=0.35):
+            text = answers.pop(0)
+            yield text
+            if answers:
+                raise ProviderError("connection reset")
+
+    async def collect():
+        return [
+            message["subject"]
+            async for message in agenerate_commit_messages(
+                DIFF,
+                num_of_commit_messages=2,
+                cache=cache,
+                provider=DroppedProvider(None),
+                retrier=Retrier(RetryPolicy(base_delay=0)),
+            )
+        ]
+
+    # The first attempt emitted "feat: First" before failing; the retry is a new sample.
+    assert asyncio.run(collect()) == ["feat: First", "fix: Other"]
+    assert asyncio.run(collect()) == ["feat: First", "fix: Other"]
+
+
+def test_agenerate_commit_messages_yields_first_result_first(completion, fake_provider):
+    async def respond(prompt, model):
+        await asyncio.sleep(0.05 if model == "slow" else 0)
+        return completion(f"feat: From {model}")
+
+    async def collect():
+        return [
+            message["subject"]
+            async for message in agenerate_commit_messages(
+                DIFF,
+                variants=((5, "slow"), (5, "fast")),
+                provider=fake_provider(respond),
+            )
+        ]
+
+    assert asyncio.run(collect()) == ["feat: From fast", "feat: From slow"]
+
+
+def test_agenerate_commit_messages_cancels_stragglers(completion, fake_provider):
+    started = []
+    cancelled = []
+
+    async def respond(prompt, model):
+        started.append(model)
+        if model == "slow":
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(model)
+                raise
+        return completion(f"feat: From {model}")
+
+    async def first():
+        candidates = agenerate_commit_messages(
+            DIFF,
+            variants=((5, "slow"), (5, "fast")),
+            concurrency=2,
+            provider=fake_provider(respond),
+        )
+        message = await candidates.__anext__()
+        await candidates.aclose()
+        # The straggler has unwound by the time aclose returns.
+        assert cancelled == ["slow"]
+        return message["subject"]
+
+    assert asyncio.run(first()) == "feat: From fast"
+    assert started == ["slow", "fast"]
+    assert cancelled == ["slow"]
+
+
+def test_agenerate_commit_messages_bounded_concurrency(completion, fake_provider):
+    running = []
+    peak = []
+
+    async def respond(prompt, model):
+        running.append(model)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(model)
+        return completion(f"feat: From {model}")
+
+    async def collect():
+        variants = [(5, f"model-{index}") for index in range(6)]
+        return [
+            message
+            async for message in agenerate_commit_messages(
+                DIFF, variants=variants, concurrency=2, provider=fake_provider(respond)
+            )
+        ]
+
+    messages = asyncio.run(collect())
+    assert [message["id"] for message in messages] == [1, 2, 3, 4, 5, 6]
+    assert max(peak) == 2
+
+
+def test_agenerate_hierarchical_commit_messages(tmp_path, fake_provider, completion):
+    cache = DiskCache(tmp_path)
+
+    def respond(prompt, model):
+        if "Summarize the changes made in this part" in prompt:
+            return "- Change things\n"
+        return completion("feat: Change everything")
+
+    provider = fake_provider(respond)
+
+    async def collect():
+        chunks = [("src/", DIFF), ("docs/", DIFF.replace("a.py", "b.md"))]
+        return [
+            message["subject"]
+            async for message in agenerate_hierarchical_commit_messages(
+                chunks, cache=cache, provider=provider
+            )
+        ]
+
+    assert asyncio.run(collect()) == ["feat: Change everything"]
+    assert len(provider.prompts) == 3
+    assert "src/:\n- Change things\ndocs/:\n- Change things" in provider.prompts[-1]
+    assert asyncio.run(collect()) == ["feat: Change everything"]
+    assert len(provider.prompts) == 3
+
+
+def file_diff(path, old, new, line):
+    return (
+        f"diff --git a/{path} b/{path}\n"
+        f"index {old}..{new} 100644\n"
+        f"--- a/{path}\n+++ b/{path}\n"
+        f"@@ -1 +1 @@\n-old\n+{line}\n"
+    )
+
+
+def test_asummarize_diff_chunks_reuses_file_summaries(tmp_path, fake_provider):
+    cache = DiskCache(tmp_path)
+    provider = fake_provider(lambda prompt, model: "- Change a line\n")
+    summarized = provider.prompts
+
+    first = [("a.py", file_diff("a.py", "1111", "2222", "new"))]
+    second = [
+        ("a.py", file_diff("a.py", "1111", "2222", "new") + " (compacted)\n"),
+        ("b.py", file_diff("b.py", "3333", "4444", "new")),
+        ("logo.png", "# logo.png: binary or generated file changed\n"),
+    ]
+    asyncio.run(asummarize_diff_chunks(first, cache=cache, provider=provider))
+    assert len(summarized) == 1
+    summaries = asyncio.run(
+        asummarize_diff_chunks(second, cache=cache, provider=provider)
+    )
+    assert len(summarized) == 2
+    assert "b.py" in summarized[-1]
+    assert summaries == [
+        ("a.py", "- Change a line"),
+        ("b.py", "- Change a line"),
+        ("logo.png", "- logo.png: binary or generated file changed"),
+    ]
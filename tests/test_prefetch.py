@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+from ai_git_commit.config import ICommitMessage
+from ai_git_commit.prefetch import Prefetch
+
+
+def test_prefetch_collects_candidates():
+    async def start():
+        async def candidates():
+            for index in range(3):
+                await asyncio.sleep(0)
+                yield ICommitMessage(id=index, subject=f"feat: {index}", body=[])
+
+        return candidates()
+
+    prefetch = Prefetch(start)
+    assert [c["subject"] for c in prefetch.wait(5)] == ["feat: 0", "feat: 1", "feat: 2"]
+    assert prefetch.error is None
+
+
+def test_prefetch_cancel_closes_generation():
+    started = threading.Event()
+    closed = threading.Event()
+
+    async def start():
+        async def candidates():
+            try:
+                yield ICommitMessage(id=1, subject="feat: First", body=[])
+                started.set()
+                await asyncio.sleep(60)
+                yield ICommitMessage(id=2, subject="feat: Never", body=[])
+            finally:
+                closed.set()
+
+        return candidates()
+
+    prefetch = Prefetch(start)
+    assert started.wait(5)
+    prefetch.cancel()
+    assert prefetch.done.wait(5)
+    assert closed.is_set()
+    assert [c["subject"] for c in prefetch.ready()] == ["feat: First"]
+    prefetch.cancel()
+
+
+def test_prefetch_records_error():
+    async def start():
+        raise ValueError("No staged changes to commit.")
+
+    prefetch = Prefetch(start)
+    assert prefetch.wait(5) == []
+    assert isinstance(prefetch.error, ValueError)
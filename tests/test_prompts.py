@@ -0,0 +1,78 @@
+import pytest
+
+from ai_git_commit.compact import estimate_tokens
+from ai_git_commit.prompts import (
+    DEFAULT_PROMPT_ID,
+    PromptRegistry,
+    PromptTemplate,
+    get_prompt,
+    registry,
+)
+
+DIFF = "diff --git a/a.py b/a.py\n@@ -1 +1 @@\n-a\n+b\n"
+
+
+def test_template_is_dedented_and_split_around_fields() -> None:
+    template = PromptTemplate(
+        "t",
+        ("diff", "count"),
+        """
+        Here is the diff:
+
+            {diff}
+
+        Write {count} messages as {{"messages": []}}.
+        """,
+    )
+    assert template.text.startswith("Here is the diff:\n")
+    assert template.fields == ["diff", "count"]
+    assert template.segments == [
+        "Here is the diff:\n\n    ",
+        "\n\nWrite ",
+        ' messages as {"messages": []}.\n',
+    ]
+    assert template.render(DIFF, 2) == template.render(diff=DIFF, count=2)
+    assert template.render("x", 2) == (
+        'Here is the diff:\n\n    x\n\nWrite 2 messages as {"messages": []}.\n'
+    )
+
+
+def test_template_validates_its_fields() -> None:
+    with pytest.raises(ValueError):
+        PromptTemplate("t", ("diff",), "{diff} {unknown}")
+    with pytest.raises(ValueError):
+        PromptTemplate("t", ("diff", "count"), "{diff}")
+    with pytest.raises(ValueError):
+        PromptTemplate("t", ("diff",), "{diff!r}")
+
+
+def test_token_estimate_matches_the_rendered_prompt() -> None:
+    template = get_prompt(DEFAULT_PROMPT_ID)
+    rendered = template.render(DIFF, 2)
+    assert template.static_tokens > 0
+    assert abs(template.estimate_tokens(DIFF, 2) - estimate_tokens(rendered)) <= 2
+
+
+def test_registry_locale_variants() -> None:
+    assert get_prompt(5, "en-us") is get_prompt(5)
+    french = get_prompt(5, "fr")
+    assert french is get_prompt(5, "fr")
+    assert french.id == 5
+    assert "`fr`" in french.render(DIFF, 1)
+    assert "`fr`" not in get_prompt(5).render(DIFF, 1)
+
+    local = PromptRegistry()
+    local.register(PromptTemplate(1, ("diff",), "Diff: {diff}"))
+    german = local.register(PromptTemplate(1, ("diff",), "Änderungen: {diff}", "de"))
+    assert local.get(1, "de") is german
+    with pytest.raises(ValueError):
+        local.register(PromptTemplate(1, ("diff",), "Diff: {diff}"))
+    with pytest.raises(ValueError):
+        local.get(2)
+
+
+def test_registry_costs() -> None:
+    costs = registry.costs()
+    assert set(costs) == {1, 2, 3, 4, 5, "summarize", "reduce"}
+    assert costs[5] == get_prompt(5).static_tokens
+    assert costs[5] > costs[1]
@@ -0,0 +1,155 @@
+import asyncio
+import json
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from ai_git_commit.prompts import get_prompt, reduce_prompt, summarize_prompt
+from ai_git_commit.providers import (
+    LocalProvider,
+    OpenAIProvider,
+    ProviderError,
+    get_provider,
+)
+
+DIFF = """diff --git a/ai_git_commit/cache.py b/ai_git_commit/cache.py
+new file mode 100644
+index 0000000..1111111
+--- /dev/null
++++ b/ai_git_commit/cache.py
+@@ -0,0 +1,2 @@
++import os
++import time
+diff --git a/ai_git_commit/openai.py b/ai_git_commit/openai.py
+index 2222222..3333333 100644
+--- a/ai_git_commit/openai.py
++++ b/ai_git_commit/openai.py
+@@ -1 +1 @@
+-a = 1
++a = 2
+"""
+
+
+@pytest.fixture
+def server(http_server):
+    class Handler(BaseHTTPRequestHandler):
+        requests = []
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            Handler.requests.append((self.path, dict(self.headers), body))
+            if body["model"] == "limited":
+                self.send_response(429)
+                self.send_header("Retry-After", "2")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for text in ("comp", "let", "ed"):
+                    event = json.dumps({"choices": [{"text": text}]})
+                    self.wfile.write(f"data: {event}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                return
+            data = json.dumps({"choices": [{"text": "completed"}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return http_server(Handler), Handler.requests
+
+
+def test_openai_provider_complete(server):
+    url, requests = server
+    provider = OpenAIProvider(api_key="sk-abc123", api_base=f"{url}/v1/")
+    assert provider.complete("prompt", "model", 16) == "completed"
+    path, headers, body = requests[0]
+    assert path == "/v1/completions"
+    assert headers["Authorization"] == "Bearer sk-abc123"
+    assert body == {
+        "model": "model",
+        "prompt": "prompt",
+        "max_tokens": 16,
+        "temperature": 0.35,
+    }
+
+
+def test_openai_provider_rate_limited(server):
+    url, _ = server
+    provider = OpenAIProvider(api_base=f"{url}/v1")
+    with pytest.raises(ProviderError) as error:
+        provider.complete("prompt", "limited", 16)
+    assert error.value.status == 429
+    assert error.value.retry_after == 2
+
+
+def test_openai_provider_stream(server):
+    url, requests = server
+    provider = OpenAIProvider(api_base=f"{url}/v1")
+    assert list(provider.stream("prompt", "model", 16)) == ["comp", "let", "ed"]
+    assert requests[0][2]["stream"] is True
+
+    async def collect():
+        return [text async for text in provider.astream("prompt", "model", 16)]
+
+    assert asyncio.run(collect()) == ["comp", "let", "ed"]
+    with pytest.raises(ProviderError) as error:
+        list(provider.stream("prompt", "limited", 16))
+    assert error.value.retry_after == 2
+
+
+def test_local_provider_commit_messages():
+    prompt = get_prompt(5).render(DIFF, 2)
+    data = json.loads(LocalProvider().complete(prompt, "local", 1024))
+    assert data["commit_messages"] == [
+        {
+            "id": 1,
+            "subject": "feat(ai_git_commit): Update 2 files in ai_git_commit",
+            "body": ["ai_git_commit/cache.py: +2 -0", "ai_git_commit/openai.py: +1 -1"],
+        },
+        {
+            "id": 2,
+            "subject": "feat: Update 2 files in ai_git_commit",
+            "body": ["ai_git_commit/cache.py: +2 -0", "ai_git_commit/openai.py: +1 -1"],
+        },
+    ]
+
+
+def test_local_provider_summary_and_reduce():
+    provider = LocalProvider()
+    summary = provider.complete(summarize_prompt.render("a", DIFF), "local", 256)
+    assert summary == (
+        "- Add ai_git_commit/cache.py (+2 -0)\n"
+        "- Update ai_git_commit/openai.py (+1 -1)\n"
+    )
+    reduced = provider.complete(
+        reduce_prompt.render("docs/index.md:\n- Add page", 1), "local", 1024
+    )
+    assert json.loads(reduced)["commit_messages"][0]["subject"] == (
+        "docs(index): Update index.md"
+    )
+
+
+def test_get_provider():
+    assert isinstance(get_provider({"provider": "local"}), LocalProvider)
+    provider = get_provider({"OPENAI_KEY": "sk-abc123"})
+    assert isinstance(provider, OpenAIProvider)
+    assert provider.api_key == "sk-abc123"
+    with pytest.raises(ValueError):
+        get_provider({"provider": "unknown"})
+
+
+def test_get_provider_shares_client_per_settings():
+    config = {"OPENAI_KEY": "sk-abc123", "max_connections": 3, "request_timeout": 5.0}
+    client = get_provider(config).client
+    assert get_provider(dict(config)).client is client
+    assert client.max_connections == 3 and client.timeout == 5.0
+    assert get_provider({**config, "request_timeout": 9.0}).client is not client
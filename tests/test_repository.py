@@ -0,0 +1,126 @@
+import io
+import subprocess
+
+from ai_git_commit.repository import (
+    EMPTY_TREE,
+    FileStatus,
+    GitRepository,
+    StagedFile,
+    find_git_dir,
+    iter_lines,
+    parse_raw,
+    parse_status,
+)
+
+
+def test_find_git_dir(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    (tmp_path / "src" / "pkg").mkdir(parents=True)
+    assert find_git_dir(tmp_path / "src" / "pkg") == (tmp_path, tmp_path / ".git")
+
+
+def test_find_git_dir_gitfile(tmp_path):
+    (tmp_path / "worktree").mkdir()
+    (tmp_path / "worktree" / ".git").write_text("gitdir: ../main.git/worktrees/wt\n")
+    assert find_git_dir(tmp_path / "worktree") == (
+        tmp_path / "worktree",
+        (tmp_path / "main.git" / "worktrees" / "wt").resolve(),
+    )
+
+
+def test_parse_status():
+    output = b"M  a.py\0 M b.py\0R  new.py\0old.py\0"
+    assert parse_status(output) == [
+        FileStatus("M", " ", "a.py"),
+        FileStatus(" ", "M", "b.py"),
+        FileStatus("R", " ", "new.py", "old.py"),
+    ]
+    assert FileStatus("R", " ", "new.py", "old.py").short() == "R  old.py -> new.py"
+
+
+def test_parse_raw():
+    output = (
+        b":100644 100644 1111 2222 M\0a.py\0"
+        b":100644 100644 3333 3333 R100\0old.py\0new.py\0"
+    )
+    assert parse_raw(output) == [
+        StagedFile("M", "a.py", "100644", "100644", "1111", "2222"),
+        StagedFile("R", "new.py", "100644", "100644", "3333", "3333", "old.py"),
+    ]
+
+
+def test_iter_lines_joins_partial_head():
+    stream = io.BytesIO(b"second line\nthird\n")
+    assert list(iter_lines(b"first\npartial ", stream)) == [
+        "first\n",
+        "partial second line\n",
+        "third\n",
+    ]
+
+
+def test_git_repository_session(tmp_path, git):
+    git(tmp_path, "init", "-q")
+    (tmp_path / "a.py").write_text("a = 1\n")
+    git(tmp_path, "add", "a.py")
+    git(tmp_path, "commit", "-q", "-m", "init")
+    (tmp_path / "a.py").write_text("a = 2\n")
+    (tmp_path / "b.py").write_text("b = 1\n")
+    git(tmp_path, "add", "a.py", "b.py")
+
+    repository = GitRepository.discover(str(tmp_path))
+    assert repository is not None
+    assert repository.status_short() == "M  a.py\nA  b.py\n"
+    files = list(repository.iter_staged_diff())
+    assert [file.path for file in files] == ["a.py", "b.py"]
+    assert files[0].hunks[0].lines == ["-a = 1\n", "+a = 2\n"]
+    assert [(entry.status, entry.path) for entry in repository.staged_files()] == [
+        ("M", "a.py"),
+        ("A", "b.py"),
+    ]
+    assert files[0].blob_ids() == (
+        repository.staged_files()[0].old_blob,
+        repository.staged_files()[0].new_blob,
+    )
+    assert repository.staged_tree_key().count("..") == 1
+
+    with repository.map_staged_diff() as mapped:
+        assert [file.text() for file in mapped] == [file.text() for file in files]
+
+
+def test_staged_diff_ignores_color_and_external_diff_config(tmp_path, git):
+    git(tmp_path, "init", "-q")
+    git(tmp_path, "config", "color.diff", "always")
+    git(tmp_path, "config", "diff.external", "false")
+    (tmp_path / "a.py").write_text("a = 1\n")
+    git(tmp_path, "add", "a.py")
+
+    repository = GitRepository(tmp_path, tmp_path / ".git")
+    files = list(repository.iter_staged_diff())
+    assert [file.path for file in files] == ["a.py"]
+    assert files[0].hunks[0].lines == ["+a = 1\n"]
+    with repository.map_staged_diff() as mapped:
+        assert [file.text() for file in mapped] == [files[0].text()]
+
+
+def test_git_repository_discover_outside_repository(tmp_path, monkeypatch):
+    monkeypatch.delenv("GIT_DIR", raising=False)
+    assert GitRepository.discover(str(tmp_path)) is None
+
+
+def test_staged_tree_key_without_head(tmp_path, git):
+    git(tmp_path, "init", "-q")
+    (tmp_path / "a.py").write_text("a = 1\n")
+    git(tmp_path, "add", "a.py")
+    repository = GitRepository(tmp_path, tmp_path / ".git")
+    assert repository.staged_tree_key().startswith(f"{EMPTY_TREE}..")
+
+
+def test_staged_tree_key_unmerged_index(tmp_path, monkeypatch):
+    repository = GitRepository(tmp_path, tmp_path / ".git")
+
+    def run(args):
+        raise subprocess.CalledProcessError(128, ["git", *args])
+
+    monkeypatch.setattr(repository, "run", run)
+    assert repository.staged_tree_key() is None
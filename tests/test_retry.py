@@ -0,0 +1,182 @@
+import asyncio
+import random
+import time
+from unittest.mock import patch
+
+import pytest
+
+from ai_git_commit.openai import generate_commit_messages
+from ai_git_commit.providers import Provider, ProviderError
+from ai_git_commit.retry import (
+    AttemptTimeout,
+    BudgetExhausted,
+    RateLimiter,
+    RequestBudget,
+    Retrier,
+    RetryPolicy,
+    backoff_delay,
+    get_retrier,
+    is_retryable,
+)
+
+
+class Flaky:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "done"
+
+
+def test_is_retryable():
+    assert is_retryable(ProviderError("rate limited", status=429))
+    assert is_retryable(ProviderError("bad gateway", status=502))
+    assert is_retryable(ProviderError("connection reset"))
+    assert is_retryable(ConnectionResetError())
+    assert not is_retryable(ProviderError("unauthorized", status=401))
+    assert not is_retryable(BudgetExhausted("no budget"))
+    assert not is_retryable(ValueError())
+
+
+def test_backoff_delay():
+    policy = RetryPolicy(base_delay=1, max_delay=4)
+    rng = random.Random(0)
+    delays = [backoff_delay(policy, attempt, rng=rng) for attempt in range(6)]
+    assert all(
+        0 <= delay <= min(4, 2**attempt) for attempt, delay in enumerate(delays)
+    )
+    error = ProviderError("rate limited", status=429, retry_after=10)
+    assert backoff_delay(policy, 0, error, rng) == 10
+    assert backoff_delay(policy._replace(max_retry_after=5), 0, error, rng) == 5
+
+
+def test_retrier_call_retries_transient_errors():
+    function = Flaky(ProviderError("busy", status=503), ConnectionResetError())
+    with patch("ai_git_commit.retry.time.sleep") as sleep:
+        assert Retrier(RetryPolicy(max_attempts=3)).call(function) == "done"
+    assert function.calls == 3
+    assert sleep.call_count == 2
+
+
+def test_retrier_call_gives_up():
+    unauthorized = ProviderError("unauthorized", status=401)
+    function = Flaky(unauthorized)
+    with pytest.raises(ProviderError) as error:
+        Retrier().call(function)
+    assert error.value is unauthorized
+    assert function.calls == 1
+
+    function = Flaky(*[ProviderError("busy", status=503)] * 3)
+    with patch("ai_git_commit.retry.time.sleep"), pytest.raises(ProviderError):
+        Retrier(RetryPolicy(max_attempts=3)).call(function)
+    assert function.calls == 3
+
+
+def test_retrier_pauses_shared_limiter_on_retry_after():
+    clock = [100.0]
+    limiter = RateLimiter(clock=lambda: clock[0])
+    retrier = Retrier(RetryPolicy(max_attempts=2), limiter)
+    sleeps = []
+    function = Flaky(ProviderError("rate limited", status=429, retry_after=7))
+    with patch("ai_git_commit.retry.time.sleep", side_effect=sleeps.append):
+        assert retrier.call(function) == "done"
+    assert sleeps[0] >= 7
+    # Another request sharing the limiter waits for the end of the pause.
+    assert limiter.reserve() == 7
+
+
+def test_retrier_attempt_timeout():
+    def slow():
+        time.sleep(0.3)
+        return "late"
+
+    retrier = Retrier(RetryPolicy(max_attempts=2, base_delay=0, attempt_timeout=0.05))
+    started = time.monotonic()
+    with pytest.raises(AttemptTimeout):
+        retrier.call(slow)
+    assert time.monotonic() - started < 0.25
+
+
+def test_retrier_acall():
+    attempts = []
+
+    async def request():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            await asyncio.sleep(1)
+        return "done"
+
+    retrier = Retrier(RetryPolicy(max_attempts=2, base_delay=0, attempt_timeout=0.05))
+    assert asyncio.run(retrier.acall(request)) == "done"
+    assert attempts == [0, 1]
+
+
+def test_request_budget_is_shared():
+    budget = RequestBudget(3)
+    retrier = Retrier(RetryPolicy(max_attempts=5, base_delay=0), budget=budget)
+    function = Flaky(*[ProviderError("busy", status=503)] * 5)
+    with pytest.raises(BudgetExhausted):
+        retrier.call(function)
+    assert function.calls == 3
+    with pytest.raises(BudgetExhausted):
+        Retrier(budget=budget).call(lambda: "never")
+
+
+def test_rate_limiter_spreads_requests():
+    clock = [0.0]
+    limiter = RateLimiter(rate=2, capacity=2, clock=lambda: clock[0])
+    assert [limiter.reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+    clock[0] = 10.0
+    assert limiter.reserve() == 0
+    limiter.pause(3)
+    assert limiter.reserve() == pytest.approx(3.5)
+
+
+def test_get_retrier():
+    retrier = get_retrier({"max_retries": 2, "requests_per_minute": 120})
+    assert retrier.policy.max_attempts == 3
+    assert retrier.limiter.rate == 2
+    assert get_retrier({}).limiter.rate is None
+    assert get_retrier({}).policy.attempt_timeout is None
+    assert get_retrier({}).budget is None
+    retrier = get_retrier({"attempt_timeout": 7.5, "max_requests": 50})
+    assert retrier.policy.attempt_timeout == 7.5
+    assert retrier.budget.max_requests == 50
+
+
+def test_generate_commit_messages_retries():
+    class LimitedProvider(Provider):
+        name = "limited"
+        calls = 0
+
+        def complete(self, prompt, model, max_tokens, temperature=0.35):
+            LimitedProvider.calls += 1
+            if LimitedProvider.calls == 1:
+                raise ProviderError("rate limited", status=429, retry_after=0.01)
+            return "message"
+
+    diff = "diff --git a/a.py b/a.py\n@@ -1 +1 @@\n-a\n+b\n"
+    assert generate_commit_messages(diff, provider=LimitedProvider()) == "message"
+    assert LimitedProvider.calls == 2
+
+
+def test_generate_commit_messages_max_retries_counts_retries():
+    class DownProvider(Provider):
+        name = "down"
+        calls = 0
+
+        def complete(self, prompt, model, max_tokens, temperature=0.35):
+            DownProvider.calls += 1
+            raise ProviderError("unavailable", status=503)
+
+    diff = "diff --git a/a.py b/a.py\n@@ -1 +1 @@\n-a\n+b\n"
+    with pytest.raises(ProviderError):
+        generate_commit_messages(
+            diff, max_retries=2, retry_delay=0, provider=DownProvider()
+        )
+    # The first attempt, then max_retries retries, as with get_retrier.
+    assert DownProvider.calls == 3
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Cumulative import time budget of `ai_git_commit`, in microseconds.
+STARTUP_BUDGET_US = 150_000
+HEAVY_MODULES = (
+    "prompt_toolkit",
+    "pygments_markdown_lexer",
+    "openai",
+    "asyncio",
+    "urllib.request",
+    "ai_git_commit.git",
+    "ai_git_commit.providers",
+)
+
+
+def import_times(code: str, env: Dict[str, str]) -> Dict[str, int]:
+    """Run `code` in a fresh interpreter and return the cumulative import time of each module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        env=env,
+    )
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_config_get_does_not_import_heavy_dependencies(tmp_path) -> None:
+    (tmp_path / ".ai-git-commit").write_text("OPENAI_KEY=sk-abc123\n")
+    env = {**os.environ, "HOME": str(tmp_path)}
+    code = (
+        "from ai_git_commit import main\n"
+        "main(['config', 'get', 'locale'], standalone_mode=False)\n"
+    )
+    times = import_times(code, env)
+    assert "ai_git_commit.config" in times
+    assert [name for name in HEAVY_MODULES if name in times] == []
+
+
+def test_import_time_budget(tmp_path) -> None:
+    env = {**os.environ, "HOME": str(tmp_path)}
+    # Best of three runs, so a busy machine does not make the benchmark flaky.
+    best = min(
+        import_times("import ai_git_commit", env)["ai_git_commit"] for _ in range(3)
+    )
+    assert best < STARTUP_BUDGET_US, f"importing ai_git_commit took {best}us"
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from ai_git_commit import main
+from ai_git_commit.trace import Tracer
+
+
+def test_disabled_tracer_records_nothing() -> None:
+    tracer = Tracer()
+    with tracer.span("git status", "git") as span:
+        span["files"] = 3
+    assert tracer.spans == []
+
+
+def test_span_records_args_and_errors() -> None:
+    tracer = Tracer()
+    tracer.enable()
+    with tracer.span("model.attempt", "model", model="m") as span:
+        span["completion_tokens"] = 12
+    with pytest.raises(ValueError):
+        with tracer.span("config.load", "config"):
+            raise ValueError("invalid")
+
+    attempt, load = tracer.spans
+    assert attempt.name == "model.attempt"
+    assert attempt.category == "model"
+    assert attempt.args == {"model": "m", "completion_tokens": 12}
+    assert attempt.duration >= 0
+    assert load.args == {"error": "ValueError"}
+
+
+def test_concurrent_tasks_get_their_own_lane() -> None:
+    tracer = Tracer()
+    tracer.enable()
+
+    async def attempt() -> None:
+        with tracer.span("model.attempt"):
+            await asyncio.sleep(0.01)
+
+    async def run() -> None:
+        await asyncio.gather(attempt(), attempt())
+
+    asyncio.run(run())
+    first, second = tracer.spans
+    assert first.lane != second.lane
+
+
+def test_summary_aggregates_spans_by_name() -> None:
+    tracer = Tracer()
+    tracer.enable()
+    for _ in range(3):
+        with tracer.span("git diff"):
+            pass
+    with tracer.span("ui.confirm", "ui"):
+        pass
+
+    header, *rows, wall = tracer.summary().splitlines()
+    assert header.split()[:2] == ["span", "count"]
+    counts = {row[:32].strip(): row[32:].split()[0] for row in rows}
+    assert counts == {"git diff": "3", "ui.confirm": "1"}
+    assert wall.startswith("wall")
+
+
+def test_chrome_trace_events() -> None:
+    tracer = Tracer()
+    tracer.enable()
+    with tracer.span("prompt.build", "prompt", prompt_id=5):
+        pass
+
+    (event,) = tracer.chrome_trace()["traceEvents"]
+    assert event["name"] == "prompt.build"
+    assert event["cat"] == "prompt"
+    assert event["ph"] == "X"
+    assert event["dur"] >= 0
+    assert event["args"] == {"prompt_id": 5}
+
+
+def test_profile_and_trace_options(tmp_path, monkeypatch) -> None:
+    (tmp_path / ".ai-git-commit").write_text("OPENAI_KEY=sk-abc123\n")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    trace_path = tmp_path / "trace.json"
+
+    result = CliRunner().invoke(
+        main, ["--profile", "--trace", str(trace_path), "config", "get", "locale"]
+    )
+
+    assert result.exit_code == 0
+    assert "config.load" in result.stderr
+    assert result.stdout == "en\n"
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    assert [event["name"] for event in events] == ["config.load"]